@@ -0,0 +1,20 @@
+"""
+ASGI config for clustering project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+to be served by an ASGI server, e.g.:
+    uvicorn clustering.asgi:application
+
+Views waiting for the geocoder run as coroutines, the other views in threads (see map/asgi.py).
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'clustering.settings')
+django.setup(set_prefix=False)
+
+from map.asgi import Application  # noqa: E402  (needs the apps to be loaded)
+
+application = Application()
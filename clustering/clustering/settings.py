@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'map.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -120,3 +121,187 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Logging
+# Requests are logged at INFO with their duration, stages, counts and cache lookups (pruned forecast
+# candidates too). Only warnings are shown by default, MAP_LOG_LEVEL=INFO in the environment shows every request
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'default': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'default'},
+    },
+    'loggers': {
+        'map': {'handlers': ['console'], 'level': os.environ.get('MAP_LOG_LEVEL', 'WARNING')},
+    },
+}
+
+# Requests run under cProfile, and the profile of requests slower than the threshold
+# (in seconds) is written in PROFILE_DIR. Profiling slows requests down, keep it off in production
+
+PROFILE_SLOW_REQUESTS = False
+
+PROFILE_SLOW_THRESHOLD = 1.0
+
+PROFILE_DIR = os.path.join(BASE_DIR, 'cache', 'profiles')
+
+
+# Datasets
+# One database hosts the points of several regions (see map.models.Dataset). Views and APIs
+# read the dataset given by its slug in the query string (dataset=...), or this one
+
+DEFAULT_DATASET = 'brussels'
+
+
+# Geocoding
+# Nominatim server used to find addresses and municipalities. Its usage policy allows one request per second
+
+GEOCODER_DOMAIN = 'nominatim.openstreetmap.org'
+
+GEOCODER_SCHEME = 'https'
+
+GEOCODER_USER_AGENT = 'CovidClusteringLocator'
+
+GEOCODER_MIN_DELAY = 1
+
+# With the ASGI application (clustering/asgi.py), views waiting for the geocoder run as coroutines.
+# At most GEOCODER_MAX_CONCURRENCY geocoding requests are in progress at a time (GEOCODER_MIN_DELAY still
+# separates any two of them), and the other views run in ASGI_THREADS threads
+GEOCODER_MAX_CONCURRENCY = 4
+
+ASGI_THREADS = 16
+
+
+# Time window
+# Map views show the points of the WINDOW_DAYS days before the requested date.
+# APIs accept another length with the window parameter, up to MAX_WINDOW_DAYS
+
+WINDOW_DAYS = 10
+
+MAX_WINDOW_DAYS = 31
+
+
+# Point states
+# Map views, APIs and their cached results only use the points of the states given in the query string
+# (states=positive,recovered, or states=all), DEFAULT_STATES otherwise: negative tests are not cases
+
+DEFAULT_STATES = ['positive']
+
+
+# Points and cluster results can be shared by the processes of the server (e.g. gunicorn workers)
+# in shared memory, instead of one copy per process. The manifest of the segments is in SHARED_MEMORY_DIR
+
+SHARED_MEMORY_STORE = False
+
+SHARED_MEMORY_DIR = os.path.join(BASE_DIR, 'cache', 'shared')
+
+SHARED_MEMORY_PREFIX = 'stc'
+
+
+# Maximum number of rows of a CSV file sent to /api/points/upload
+
+UPLOAD_MAX_ROWS = 100000
+
+# Tokens of the clients allowed to upload points, sent as an "Authorization: Token <token>" header.
+# Uploads are refused while the list is empty
+
+UPLOAD_TOKENS = []
+
+
+# Maximum number of days of /api/export/clusters, whose days are clustered during the request.
+# Longer ranges are exported with the export_data command
+
+EXPORT_CLUSTERS_MAX_DAYS = 62
+
+
+# Map tiles
+# Below TILE_POINTS_ZOOM, points are counted in a TILE_GRID_SIZE x TILE_GRID_SIZE grid per tile
+
+TILE_GRID_SIZE = 16
+
+TILE_POINTS_ZOOM = 16
+
+TILE_MAX_ZOOM = 20
+
+# Tiles are cached per date and tile coordinates, for this number of seconds
+TILE_CACHE_TIMEOUT = 300
+
+
+# Heatmap
+# Density of the points of each window on a grid of HEATMAP_GRID_SIZE cells along its longest side,
+# over HEATMAP_BBOX[slug] (min_lng, min_lat, max_lng, max_lat), or around the municipalities of the dataset.
+# Grids are kept with the clusters, and cut into tiles of HEATMAP_TILE_SIZE pixels
+
+HEATMAP_GRID_SIZE = 256
+
+HEATMAP_BBOX = {}
+
+HEATMAP_TILE_SIZE = 256
+
+
+# Clusters
+# Clusters of each day are cached per window version, so they never go stale.
+# A shared cache backend lets processes reuse each other's clusters
+
+CLUSTER_CACHE_TIMEOUT = 24 * 3600
+
+# Processes used to cluster the missing days of a timeline
+CLUSTER_WORKERS = 4
+
+TIMELINE_MAX_DAYS = 92
+
+
+# Hotspots
+# Space-time scan statistic of the points against the official figures, with cylinders of up to
+# HOTSPOT_MAX_DAYS days and HOTSPOT_MAX_POPULATION of the expected cases, over at most HOTSPOT_MAX_RANGE days.
+# p-values come from HOTSPOT_REPLICATES Monte Carlo replicates, run by HOTSPOT_WORKERS processes
+
+HOTSPOT_MAX_DAYS = 7
+
+HOTSPOT_MAX_POPULATION = 0.5
+
+HOTSPOT_MAX_RANGE = 62
+
+HOTSPOT_REPLICATES = 999
+
+HOTSPOT_WORKERS = 4
+
+HOTSPOT_ALPHA = 0.05
+
+
+# Results of the benchmark command, one JSON file per commit, and the baseline of this machine
+
+BENCHMARK_DIR = os.path.join(BASE_DIR, 'cache', 'benchmarks')
+
+
+# Forecasting
+# Fitted models are pickled in this directory (one subdirectory per dataset), and reused until the data changes
+
+FORECAST_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'forecasts')
+
+FORECAST_WORKERS = 4
+
+# Orders selected per series of each dataset by the select_orders command. Default orders are used without it
+FORECAST_ORDERS_FILE = os.path.join(BASE_DIR, 'cache', 'orders', 'selected-{dataset}.json')
+
+FORECAST_ORDERS_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'orders')
+
+FORECAST_MAX_DAYS = 60
+
+# New days are applied to the cached models without estimating their parameters again,
+# unless the parameters are older than this number of days...
+FORECAST_REFIT_EVERY = 7
+
+# ...or the mean absolute standardized forecast error of the new days exceeds this threshold
+FORECAST_DRIFT_THRESHOLD = 3.0
+
+
+# Server workers import the clustering and forecasting libraries in a background thread right after fork
+# (see gunicorn.conf.py), instead of during their first request
+
+WARM_UP_AFTER_FORK = True
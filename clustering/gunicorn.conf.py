@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration, read from the current directory:
+    gunicorn clustering.wsgi
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:8000")
+
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# The application is loaded once in the master process and shared by the workers.
+# It imports no scientific library, so the master stays small and starts fast
+preload_app = True
+
+
+def post_fork(server, worker):
+    """
+    Import the algorithms in the worker, in the background.
+    Not in the master: the thread pools of numpy and scikit-learn do not survive a fork
+    """
+    from django.conf import settings
+    from map import algorithms
+
+    if settings.WARM_UP_AFTER_FORK:
+        algorithms.warm_up_in_background()
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from map.models import Point
+from map.models import Dataset, Point
 
 # Register your models here.
+admin.site.register(Dataset)
 admin.site.register(Point)
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+Clustering, generation and forecasting algorithms.
+
+The algorithms depend on heavy libraries (scikit-learn, pandas, statsmodels),
+so their modules are only imported when one of their names is first used:
+    from map import algorithms
+    algorithms.DBSCANClustering(points)
+Processes that never cluster or forecast never load these libraries.
+warm_up imports them ahead of time, e.g. in a server worker right after fork.
+"""
+import importlib
+import threading
+
+# Module of each name of the facade
+_NAMES = {"PointColumns": "columns",
+          "EPOCH": "columns",
+          "DBSCANClustering": "dbscan",
+          "PointGenerator": "generate_points",
+          "BulkPointGenerator": "generate_points",
+          "load_municipality_data": "generate_points",
+          "cases_for_date": "generate_points",
+          "SyntheticDataset": "synthetic",
+          "MunicipalityLocator": "municipalities",
+          "SpaceTimeKDE": "kde",
+          "SpaceTimeScan": "scan",
+          "scan_statistic": "scan",
+          "ForecastCache": "forecasting",
+          "TOTAL": "forecasting",
+          "ORDER": "forecasting",
+          "SEASONAL_ORDER": "forecasting",
+          "fit_series": "forecasting",
+          "forecast": "forecasting",
+          "new_state": "forecasting",
+          "series_version": "forecasting",
+          "update_state": "forecasting"}
+
+# Modules imported by warm_up: the ones used to serve requests
+WARM_UP_MODULES = ("dbscan", "generate_points", "forecasting", "kde")
+
+__all__ = sorted(_NAMES) + ["warm_up", "warm_up_in_background"]
+
+
+def __getattr__(name):
+    if name not in _NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(f"{__name__}.{_NAMES[name]}"), name)
+    globals()[name] = value  # Next accesses do not go through __getattr__
+    return value
+
+
+def __dir__():
+    return __all__
+
+
+def warm_up(modules=WARM_UP_MODULES):
+    """
+    Import the algorithms (and their libraries) now, instead of at the first request using them
+    """
+    for module in modules:
+        importlib.import_module(f"{__name__}.{module}")
+
+
+def warm_up_in_background(modules=WARM_UP_MODULES):
+    """
+    Import the algorithms in a background thread, so that the process can serve
+    requests that do not need them in the meantime.
+    Call it after fork (e.g. in a gunicorn post_fork hook): a fork during an import
+    could leave the child with a held import lock
+
+    Returns
+    -------
+        thread : Thread
+            thread importing the modules
+    """
+    thread = threading.Thread(target=warm_up, args=(modules,), name="algorithms-warm-up", daemon=True)
+    thread.start()
+    return thread
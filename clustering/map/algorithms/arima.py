@@ -1,13 +1,21 @@
+import os
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from statsmodels.tsa.statespace.sarimax import SARIMAX
 
+# Directory of the data files (map/data), wherever the script is run from
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
 
-def read_data():
+
+def read_data(path=os.path.join(DATA_DIR, "data_all_cleaned.csv")):
     """
     Read January data and put in dictionary indexed by date
 
+    Parameters
+    ----------
+        path : str
+            csv file with the date, latitude and longitude of each case of the dataset
 
     Returns
     -------
@@ -15,7 +23,7 @@ def read_data():
             dictionary with cases indexed by date
     """
     data = {}
-    with open("../data/data_all_cleaned.csv") as f:
+    with open(path) as f:
         f.readline()
         for line in f.readlines():
             line = line.split(",")
@@ -27,16 +35,21 @@ def read_data():
     return data
 
 
-def reformat_data():
+def reformat_data(path=os.path.join(DATA_DIR, "data_all_cleaned.csv")):
     """
     Returns array with number of cases per day
 
+    Parameters
+    ----------
+        path : str
+            csv file read by read_data
+
     Returns
     -------
         cases : list
             number of cases per day
     """
-    data = read_data()
+    data = read_data(path)
     cases = []
     for date in data:
         cases_date = len(data[date])
@@ -47,7 +60,7 @@ def reformat_data():
     return cases
 
 
-def get_real(days):
+def get_real(days, path=os.path.join(DATA_DIR, "february.csv")):
     """
     Read real data of February
 
@@ -55,13 +68,15 @@ def get_real(days):
     ----------
         days : int
             number of days for which to get data
+        path : str
+            csv file with the number of cases per day and per municipality of the dataset
 
     Returns
     -------
         values : numpy array
             Real number of cases per day for given days
     """
-    data = pd.read_csv("../data/february.csv", sep=";")
+    data = pd.read_csv(path, sep=";")
 
     by_date = {}
 
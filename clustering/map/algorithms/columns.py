@@ -0,0 +1,110 @@
+import datetime
+import numpy as np
+
+# Days are stored as number of days since this date
+EPOCH = datetime.date(1970, 1, 1)
+
+
+class PointColumns():
+    """
+    Columnar representation of points: one numpy array per attribute,
+    instead of one object per point
+    """
+
+    def __init__(self, latitude, longitude, day, state):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            latitude : numpy array
+                latitudes of the points
+            longitude : numpy array
+                longitudes of the points
+            day : numpy array
+                dates of the points, as number of days since EPOCH
+            state : numpy array
+                states of the points
+        """
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.day = np.asarray(day, dtype=np.int32)
+        self.state = np.asarray(state, dtype=np.int8)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build the columns from (latitude, longitude, date, state) rows
+
+        Parameters
+        ----------
+            rows : iterable
+                rows of the points, dates being Python dates
+
+        Returns
+        -------
+            columns : PointColumns
+                points as columns
+        """
+        rows = list(rows)
+        if len(rows) == 0:
+            return cls([], [], [], [])
+
+        latitude, longitude, dates, state = zip(*rows)
+        day = [(date - EPOCH).days for date in dates]
+
+        return cls(latitude, longitude, day, state)
+
+    def __len__(self):
+        return len(self.day)
+
+    def take(self, index):
+        """
+        Select some of the points
+
+        Parameters
+        ----------
+            index : numpy array or slice
+                boolean mask, indexes, or slice of the points to keep
+
+        Returns
+        -------
+            columns : PointColumns
+                selected points
+        """
+        return PointColumns(self.latitude[index], self.longitude[index], self.day[index], self.state[index])
+
+    def within(self, min_lng, min_lat, max_lng, max_lat):
+        """
+        Select the points inside a bounding box
+
+        Returns
+        -------
+            columns : PointColumns
+                points inside the box
+        """
+        mask = ((self.longitude >= min_lng) & (self.longitude <= max_lng)
+                & (self.latitude >= min_lat) & (self.latitude <= max_lat))
+        return self.take(mask)
+
+    def with_states(self, states):
+        """
+        Select the points whose state is one of the given states
+
+        Returns
+        -------
+            columns : PointColumns
+                points of these states
+        """
+        return self.take(np.isin(self.state, list(states)))
+
+    def dates(self):
+        """
+        Dates of the points as ISO strings
+
+        Returns
+        -------
+            dates : numpy array
+                dates of the points
+        """
+        return np.datetime_as_string(self.day.astype("datetime64[D]"), unit="D")
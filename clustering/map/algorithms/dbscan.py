@@ -1,6 +1,15 @@
+from contextlib import nullcontext
 import numpy as np
 from sklearn.cluster import DBSCAN
 from sklearn.metrics.pairwise import haversine_distances
+from map.algorithms.columns import PointColumns
+
+
+def no_timer(stage):
+    """
+    Timer of DBSCANClustering that measures nothing
+    """
+    return nullcontext()
 
 
 class DBSCANClustering:
@@ -9,16 +18,26 @@ class DBSCANClustering:
     """
     points = []
     
-    def __init__(self, point_data):
+    def __init__(self, point_data, prop=0.98, eps=0.014, timer=no_timer):
         """
         Constructor
 
         Parameters
         ----------
-            point_data : QuerySet
+            point_data : QuerySet or PointColumns
                 points to be clustered
+            prop : float
+                weight of the space distance (the time distance weighs 1 - prop)
+            eps : float
+                maximum space-time distance of two neighbours
+            timer : callable
+                context manager factory measuring each stage of compute_clusters, given its name
+                (e.g. metrics.timer). Stages are not measured by default
         """
         self.points = point_data
+        self.prop = prop
+        self.eps = eps
+        self.timer = timer
 
     def distance_between_dates(self, p, p2):
         """
@@ -51,14 +70,15 @@ class DBSCANClustering:
             date_distances : numpy array
                 time distance matrix
         """
-        X = np.asarray([[float(p.latitude), float(p.longitude)] for p in self.points])
-
-        num_points = len(self.points)
-        date_distances = np.zeros((num_points, num_points))
+        if isinstance(self.points, PointColumns):
+            X = np.column_stack([self.points.latitude, self.points.longitude])
+            days = self.points.day
+        else:
+            X = np.asarray([[float(p.latitude), float(p.longitude)] for p in self.points])
+            days = np.asarray([p.date.toordinal() for p in self.points])
 
-        for i, p in enumerate(self.points):
-            for j, p2 in enumerate(self.points):
-                date_distances[i, j] = self.distance_between_dates(p, p2)
+        # Same as distance_between_dates, for every pair of points at once
+        date_distances = np.abs(days[:, None] - days[None, :])/10
 
         return X, date_distances
         
@@ -71,27 +91,32 @@ class DBSCANClustering:
             tup : tuple
                 centroids, sizes, and number of points of cluster found
         """
-        X, date_distances = self.transform_data()
+        with self.timer("transform_data"):
+            X, date_distances = self.transform_data()
 
-        X_rad = np.array([np.radians(i) for i in X])  # scikit method takes radians
+        with self.timer("haversine"):
+            X_rad = np.array([np.radians(i) for i in X])  # scikit method takes radians
 
-        # 2-D table of haversine distances between each pair of points
-        distance_pairs = haversine_distances(X_rad, X_rad)
+            # 2-D table of haversine distances between each pair of points
+            distance_pairs = haversine_distances(X_rad, X_rad)
 
-        distance_pairs /= distance_pairs.max()  # Normalize distances
+        if distance_pairs.max() > 0:  # All points can be at the same place (or alone)
+            distance_pairs /= distance_pairs.max()  # Normalize distances
 
         # Weight of space and time distances
-        # Found by experimentation
-        prop = 0.98
+        # 0.98 by default, found by experimentation
+        prop = self.prop
 
         # Distance is weighted average of space distance and time distance
         space_time_distance = prop*distance_pairs + (1-prop)*date_distances
 
         # epsilon is the max distance for 2 points to be considered "close"
-        # 0.014 has been found by experimentation
-        Y = DBSCAN(eps=0.014, metric="precomputed").fit_predict(space_time_distance)
+        # 0.014 by default, found by experimentation
+        with self.timer("dbscan"):
+            Y = DBSCAN(eps=self.eps, metric="precomputed").fit_predict(space_time_distance)
 
-        return self.get_cluster_data(X, Y)
+        with self.timer("get_cluster_data"):
+            return self.get_cluster_data(X, Y)
 
     def get_cluster_data(self, X, Y):
         """
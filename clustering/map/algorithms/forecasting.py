@@ -0,0 +1,337 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+# Same model as arima.predict
+# 7 is the seasonality in data (here in days)
+# Other parameters found by experimentation
+ORDER = (2, 0, 1)
+SEASONAL_ORDER = (0, 1, 0, 7)
+
+# Name of the series with the cases of the whole city
+TOTAL = "total"
+
+
+def series_version(series, orders=None):
+    """
+    Compute a version identifier of the series, that changes
+    as soon as one count (or one model order) changes
+
+    Parameters
+    ----------
+        series : dict
+            number of cases per day, indexed by series name
+        orders : dict, optional
+            (order, seasonal_order) indexed by series name
+
+    Returns
+    -------
+        version : str
+            hexadecimal hash of the series
+    """
+    sha = hashlib.sha1()
+    for name in sorted(series):
+        sha.update(name.encode("utf-8"))
+        sha.update(np.asarray(series[name], dtype=np.int64).tobytes())
+    for name in sorted(orders or {}):
+        sha.update(f"{name}{orders[name]}".encode("utf-8"))
+    return sha.hexdigest()
+
+
+def fit_series(counts, order=ORDER, seasonal_order=SEASONAL_ORDER):
+    """
+    Fit a SARIMA model on one series
+
+    Parameters
+    ----------
+        counts : numpy array
+            number of cases per day
+        order : tuple
+            (p, d, q) order of the model
+        seasonal_order : tuple
+            (P, D, Q, s) seasonal order of the model
+
+    Returns
+    -------
+        fit : SARIMAXResults
+            fitted model
+    """
+    model = SARIMAX(endog=np.asarray(counts, dtype=float), order=order, seasonal_order=seasonal_order, trend='n')
+
+    with warnings.catch_warnings():
+        # Small municipalities often do not converge perfectly, the fit is still usable
+        warnings.simplefilter("ignore")
+        return model.fit(disp=False)
+
+
+def _fit_series(args):
+    """
+    Helper for fit_all, so that series can be sent to worker processes
+    """
+    name, counts, order, seasonal_order = args
+    return name, fit_series(counts, order, seasonal_order)
+
+
+def fit_all(series, orders=None, workers=1):
+    """
+    Fit one model per series, in parallel
+
+    Parameters
+    ----------
+        series : dict
+            number of cases per day, indexed by series name
+        orders : dict, optional
+            (order, seasonal_order) indexed by series name.
+            Series without an entry use ORDER and SEASONAL_ORDER
+        workers : int
+            number of processes used
+
+    Returns
+    -------
+        fits : dict
+            fitted models, indexed by series name
+    """
+    orders = orders or {}
+    args = [(name, counts) + tuple(orders.get(name, (ORDER, SEASONAL_ORDER)))
+            for name, counts in series.items()]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return dict(executor.map(_fit_series, args))
+    else:
+        return dict(_fit_series(arg) for arg in args)
+
+
+class ForecastCache():
+    """
+    Pickled forecasting states (see update_state), stored on disk and keyed by data version
+    """
+
+    def __init__(self, directory):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            directory : str
+                directory where the models are stored
+        """
+        self.directory = directory
+
+    def path(self, version):
+        """
+        Path of the file with the models of a given version
+        """
+        return os.path.join(self.directory, f"models-{version}.pickle")
+
+    def load(self, version):
+        """
+        Read the state of a given version
+
+        Parameters
+        ----------
+            version : str
+                data version
+
+        Returns
+        -------
+            state : dict or None
+                forecasting state, None if not in cache
+        """
+        try:
+            with open(self.path(version), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def load_latest(self):
+        """
+        Read the most recent state, whatever its version
+
+        Returns
+        -------
+            state : dict or None
+                forecasting state, None if the cache is empty
+        """
+        try:
+            paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                     if name.startswith("models-")]
+        except OSError:
+            return None
+
+        for path in sorted(paths, key=os.path.getmtime, reverse=True):
+            try:
+                with open(path, "rb") as f:
+                    return pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                continue
+        return None
+
+    def save(self, version, state):
+        """
+        Store the state of a given version, and remove the older versions
+
+        Parameters
+        ----------
+            version : str
+                data version
+            state : dict
+                forecasting state
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Write in a temporary file first, so that readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path(version))
+
+        for name in os.listdir(self.directory):
+            if name.startswith("models-") and name != os.path.basename(self.path(version)):
+                os.remove(os.path.join(self.directory, name))
+
+
+def drifted(fit, threshold):
+    """
+    Check if the model still explains the last observations, using their
+    standardized one-step-ahead forecast errors
+
+    Parameters
+    ----------
+        fit : SARIMAXResults
+            model extended with the last observations only
+        threshold : float
+            maximum mean absolute standardized error
+
+    Returns
+    -------
+        drift : bool
+            True if the model should be re-estimated
+    """
+    errors = np.asarray(fit.standardized_forecasts_error)[0]
+    errors = errors[np.isfinite(errors)]
+    return len(errors) > 0 and np.abs(errors).mean() > threshold
+
+
+def new_state(series, orders=None, workers=1):
+    """
+    Fit every series from scratch
+
+    Parameters
+    ----------
+        series : dict
+            number of cases per day, indexed by series name
+        orders : dict, optional
+            (order, seasonal_order) indexed by series name
+        workers : int
+            number of processes used
+
+    Returns
+    -------
+        state : dict
+            "fits": fitted models, "series": series seen by the models,
+            "orders": orders of the models, "days_since_fit": number of days filtered since the parameters were estimated
+    """
+    orders = orders or {}
+    return {"fits": fit_all(series, orders, workers),
+            "series": {name: np.asarray(counts) for name, counts in series.items()},
+            "orders": {name: orders.get(name, (ORDER, SEASONAL_ORDER)) for name in series},
+            "days_since_fit": {name: 0 for name in series}}
+
+
+def update_state(state, series, refit_every, drift_threshold, orders=None, workers=1):
+    """
+    Apply new observations to the models without re-estimating their parameters.
+    The state space filter is extended with the new days only, so the cost does
+    not grow with the history.
+    A series is fitted again from scratch if its past counts or its order changed,
+    if its parameters are older than refit_every days, or if it drifted.
+
+    Parameters
+    ----------
+        state : dict
+            previous state, as returned by new_state or update_state
+        series : dict
+            number of cases per day, indexed by series name
+        refit_every : int
+            number of days after which parameters are always estimated again
+        drift_threshold : float
+            maximum mean absolute standardized error on the new days
+        orders : dict, optional
+            (order, seasonal_order) indexed by series name
+        workers : int
+            number of processes used for the series fitted again
+
+    Returns
+    -------
+        state : dict
+            updated state
+    """
+    orders = orders or {}
+    fits = {}
+    days_since_fit = {}
+    to_refit = {}
+
+    for name, counts in series.items():
+        counts = np.asarray(counts)
+        old_counts = state["series"].get(name)
+
+        # Only new days at the end of the series can be applied to the model
+        if old_counts is None or len(counts) < len(old_counts) \
+                or not np.array_equal(counts[:len(old_counts)], old_counts):
+            to_refit[name] = counts
+            continue
+
+        if state.get("orders", {}).get(name, (ORDER, SEASONAL_ORDER)) != orders.get(name, (ORDER, SEASONAL_ORDER)):
+            to_refit[name] = counts
+            continue
+
+        new_days = len(counts) - len(old_counts)
+        if new_days == 0:
+            fits[name] = state["fits"][name]
+            days_since_fit[name] = state["days_since_fit"][name]
+            continue
+
+        if state["days_since_fit"][name] + new_days > refit_every:
+            to_refit[name] = counts
+            continue
+
+        extended = state["fits"][name].extend(counts[len(old_counts):].astype(float))
+        if drifted(extended, drift_threshold):
+            to_refit[name] = counts
+            continue
+
+        fits[name] = extended
+        days_since_fit[name] = state["days_since_fit"][name] + new_days
+
+    fits.update(fit_all(to_refit, orders, workers))
+    days_since_fit.update({name: 0 for name in to_refit})
+
+    return {"fits": fits,
+            "series": {name: np.asarray(counts) for name, counts in series.items()},
+            "orders": {name: orders.get(name, (ORDER, SEASONAL_ORDER)) for name in series},
+            "days_since_fit": days_since_fit}
+
+
+def forecast(fits, days):
+    """
+    Forecast every series
+
+    Parameters
+    ----------
+        fits : dict
+            fitted models indexed by series name
+        days : int
+            number of days to forecast
+
+    Returns
+    -------
+        forecasts : dict
+            number of cases per day (never negative), indexed by series name
+    """
+    return {name: np.maximum(fit.forecast(days), 0) for name, fit in fits.items()}
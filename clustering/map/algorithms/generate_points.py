@@ -1,6 +1,74 @@
 import pandas as pd
 import numpy as np
+import datetime
+import zlib
 import os
+from collections import deque
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+# Directory of the municipality data files
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def load_municipality_data(cases_file="data_municipality.csv", circles_file="circles.csv"):
+    """
+    Read the number of cases per day and per municipality, and the
+    municipality shapes
+
+    Parameters
+    ----------
+        cases_file : str
+            file with the number of cases per day and per municipality, relative to DATA_DIR
+        circles_file : str
+            file with the center and radius of each municipality, relative to DATA_DIR
+
+    Returns
+    -------
+        cases_data : DataFrame
+            number of cases per day and per municipality
+        circles_data : DataFrame
+            center and radius of each municipality
+    """
+    # File with number of cases per day and per municipality
+    cases_data = pd.read_csv(os.path.join(DATA_DIR, cases_file), sep=";")
+
+    # Data on municipality shapes
+    circles_data = pd.read_csv(os.path.join(DATA_DIR, circles_file), sep=";")
+
+    return cases_data, circles_data
+
+
+def cases_for_date(cases_data, date):
+    """
+    Number of points to generate per municipality on a given day
+
+    Parameters
+    ----------
+        cases_data : DataFrame
+            number of cases per day and per municipality
+        date : date
+            day for which to count cases
+
+    Returns
+    -------
+        to_generate_dict : dict
+            number of cases indexed by municipality
+    """
+    values = cases_data[cases_data["DATE"] == str(date)]
+
+    to_generate_dict = {}
+
+    for mun, cases in zip(values["TX_DESCR_FR"], values["CASES"]):
+        if cases == "<5":
+            to_generate_dict[mun] = 3
+        else:
+            to_generate_dict[mun] = int(cases)
+
+    return to_generate_dict
 
 
 class PointGenerator():
@@ -8,7 +76,7 @@ class PointGenerator():
     Class used to generate random points on a given day.
     """
 
-    def __init__(self, past_points, date):
+    def __init__(self, past_points, date, data=None, rng=None):
         """
         Constructor
 
@@ -18,10 +86,21 @@ class PointGenerator():
                 points from the past 10 days
             date : str
                 date for which to generate
+            data : tuple, optional
+                (cases_data, circles_data) as returned by load_municipality_data,
+                to avoid reading the files again
+            rng : numpy Generator, optional
+                random generator. By default, numpy's global generator is used
         """
         self.past_points = past_points
         self.date = date
         self.R = 6371000
+
+        if data is None:
+            data = load_municipality_data()
+        self.cases_data, self.circles_data = data
+
+        self.rng = np.random if rng is None else rng
     
     def generate(self):
         """
@@ -33,29 +112,9 @@ class PointGenerator():
             all_points : list
             generated points
         """
+        self.to_generate_dict = cases_for_date(self.cases_data, self.date)
 
-        # File with number of cases per day and per municipality
-        wd = os.path.dirname(os.path.abspath(__file__))
-        file_path = os.path.join(wd, "../data/data_municipality.csv")
-        df = pd.read_csv(file_path, sep=";")
-
-        # Data on municipality shapes
-        circle_path = os.path.join(wd, "../data/circles.csv")
-        self.circles_data = pd.read_csv(circle_path, sep=";")
-        
-        values = df[df["DATE"] == str(self.date)]
-        
-        
-        self.to_generate_dict = {}
-        
-        for mun, cases in zip(values["TX_DESCR_FR"], values["CASES"]):
-            if cases == "<5":
-                self.to_generate_dict[mun] = 3
-            else:
-                self.to_generate_dict[mun] = int(cases)
-                
-                
-        print(self.to_generate_dict)
+        logger.debug("date=%s cases=%s", self.date, self.to_generate_dict)
 
         # Generated points
         all_points = []
@@ -78,8 +137,8 @@ class PointGenerator():
         ----------
             mun : str
                 municipality name
-            mun_points : QuerySet
-                past points of the municipality
+            mun_points : QuerySet or numpy array
+                past points of the municipality, or their (lat, lng) coordinates
 
         Returns
         -------
@@ -100,11 +159,11 @@ class PointGenerator():
         number_points = self.to_generate_dict[mun]
 
         if len(mun_points) < 20:
-            print(mun, "uniform")
+            logger.debug("municipality=%s distribution=uniform", mun)
             angles, radii = self.generate_uniform(number_points, mun_radius)
             center = mun_center
         else:
-            print(mun, "normal")
+            logger.debug("municipality=%s distribution=normal", mun)
             angles, radii, center = self.generate_normal(number_points, mun_radius, mun_points)
 
         for angle, radius in zip(angles, radii):
@@ -133,8 +192,8 @@ class PointGenerator():
             radii : numpy array
                 radii of the new points
         """
-        angles = 360*np.random.uniform(low=0, high=1, size=number_points)
-        radii = mun_radius*np.random.uniform(low=0, high=1, size=number_points)
+        angles = 360*self.rng.uniform(low=0, high=1, size=number_points)
+        radii = mun_radius*self.rng.uniform(low=0, high=1, size=number_points)
         
         return angles, radii
 
@@ -152,8 +211,8 @@ class PointGenerator():
                 number of points to generate
             mun_radius : float
                 radius of the municipality
-            mun_points : QuerySet
-                past points of the municipality
+            mun_points : QuerySet or numpy array
+                past points of the municipality, or their (lat, lng) coordinates
 
         Returns
         -------
@@ -164,21 +223,57 @@ class PointGenerator():
             centroid : list
                 coordinates of the centroid of past points
         """
-        centroid = [0, 0]
-        
-        for p in mun_points:
-            centroid[0] += float(p.latitude)
-            centroid[1] += float(p.longitude)
-            
-        centroid[0] /= len(mun_points)
-        centroid[1] /= len(mun_points)
+        if isinstance(mun_points, np.ndarray):
+            centroid = list(mun_points.mean(axis=0))
+        else:
+            centroid = [0, 0]
+
+            for p in mun_points:
+                centroid[0] += float(p.latitude)
+                centroid[1] += float(p.longitude)
+
+            centroid[0] /= len(mun_points)
+            centroid[1] /= len(mun_points)
         
-        angles = 180*np.random.uniform(low=0, high=1, size=number_points)
-        radii = np.random.normal(loc=0, scale=mun_radius/2, size=number_points)
+        angles = 180*self.rng.uniform(low=0, high=1, size=number_points)
+        radii = self.rng.normal(loc=0, scale=mun_radius/2, size=number_points)
         
         return angles, radii, centroid
     
     
+    def destination_points(self, lat, lng, distances, bearings):
+        """
+        Vectorized version of circle_point: find the points at given distances
+        and bearings from the original points, on the sphere
+
+        Parameters
+        ----------
+            lat : numpy array
+                latitudes of the original points
+            lng : numpy array
+                longitudes of the original points
+            distances : numpy array
+                distances of the new points to the original points (in meters)
+            bearings : numpy array
+                angles of the new points relative to the original points (in radians)
+
+        Returns
+        -------
+            lat : numpy array
+                latitudes of the new points
+            lng : numpy array
+                longitudes of the new points
+        """
+        lat_rad = np.radians(lat)
+        lng_rad = np.radians(lng)
+        delta = np.asarray(distances)/self.R
+
+        new_lat = np.arcsin(np.sin(lat_rad)*np.cos(delta) + np.cos(lat_rad)*np.sin(delta)*np.cos(bearings))
+        new_lng = lng_rad + np.arctan2(np.sin(bearings)*np.sin(delta)*np.cos(lat_rad),
+                                       np.cos(delta) - np.sin(lat_rad)*np.sin(new_lat))
+
+        return np.rad2deg(new_lat), np.rad2deg(new_lng)
+
     def latlng_to_cartesian(self, lat, lng):
         """
         Convert from latitude/longitude system to cartesian
@@ -321,4 +416,157 @@ class PointGenerator():
         dot_prod = Xp*Xq + Yp*Yq + Zp*Zq
         C = (dot_prod/squared_sum) * P
         S = C + r * self.R * np.cos(t)*u + r * self.R * np.sin(t)*v
-        return S
\ No newline at end of file
+        return S
+
+
+def _generate_municipality(args):
+    """
+    Helper for BulkPointGenerator.generate, so that municipalities can be
+    sent to worker processes
+    """
+    generator, mun = args
+    return generator.generate_municipality(mun)
+
+
+class BulkPointGenerator():
+    """
+    Class used to generate random points on a range of days.
+
+    Municipality data is read only once, and the window of past points
+    is advanced in memory instead of being queried for every day.
+    """
+
+    def __init__(self, past_points, start, end, seed, window=10, data=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            past_points : iterable
+                (municipality, date, latitude, longitude) of the points
+                in the window preceding start
+            start : date
+                first day for which to generate
+            end : date
+                last day for which to generate (included)
+            seed : int
+                seed of the run. Each municipality gets its own generator derived
+                from it, so results do not depend on the order of generation
+            window : int
+                number of past days used to center the new points
+            data : tuple, optional
+                (cases_data, circles_data) as returned by load_municipality_data
+        """
+        self.start = start
+        self.end = end
+        self.seed = seed
+        self.window = window
+        self.data = load_municipality_data() if data is None else data
+
+        # Past points coordinates, indexed by (lowercase) municipality and date
+        self.past_points = {}
+        for mun, date, lat, lng in past_points:
+            mun_days = self.past_points.setdefault(mun.lower(), {})
+            mun_days.setdefault(date, []).append([float(lat), float(lng)])
+
+        cases_data = self.data[0]
+        self.dates = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+        dates_str = [str(date) for date in self.dates]
+        in_range = cases_data[cases_data["DATE"].isin(dates_str)]
+        self.municipalities = sorted(set(in_range["TX_DESCR_FR"]))
+
+    def rng(self, mun):
+        """
+        Random generator of a municipality, derived from the seed of the run
+        and the name of the municipality
+
+        Parameters
+        ----------
+            mun : str
+                municipality name
+
+        Returns
+        -------
+            rng : numpy Generator
+                random generator
+        """
+        return np.random.default_rng([self.seed, zlib.crc32(mun.encode("utf-8"))])
+
+    def generate_municipality(self, mun):
+        """
+        Generate the points of one municipality for every day of the range
+
+        Parameters
+        ----------
+            mun : str
+                municipality name
+
+        Returns
+        -------
+            new_points : list
+                generated points, as [(lat, lng), municipality, date]
+        """
+        generator = PointGenerator(None, self.start, data=self.data, rng=self.rng(mun))
+
+        past_days = self.past_points.get(mun.lower(), {})
+
+        # Points of the current window, oldest day first
+        window = deque()
+        for i in range(self.window, 0, -1):
+            day = self.start - datetime.timedelta(days=i)
+            window.append((day, past_days.get(day, [])))
+
+        new_points = []
+
+        for date in self.dates:
+            # Drop the day that left the window
+            while window and window[0][0] < date - datetime.timedelta(days=self.window):
+                window.popleft()
+
+            generator.date = date
+            generator.to_generate_dict = cases_for_date(generator.cases_data, date)
+
+            day_points = []
+            if mun in generator.to_generate_dict:
+                mun_points = [coords for _, day_coords in window for coords in day_coords]
+                mun_points += past_days.get(date, [])
+                mun_points = np.asarray(mun_points).reshape(-1, 2)
+
+                for coords, _ in generator.random_points(mun, mun_points):
+                    day_points.append([float(coords[0]), float(coords[1])])
+                    new_points.append([coords, mun, date])
+
+            window.append((date, past_days.get(date, []) + day_points))
+
+        return new_points
+
+    def generate(self, workers=1):
+        """
+        Generate the points of every municipality for every day of the range
+
+        Parameters
+        ----------
+            workers : int
+                number of processes used. Municipalities are independent,
+                so the result is the same whatever this number
+
+        Returns
+        -------
+            all_points : list
+                generated points, as [(lat, lng), municipality, date]
+        """
+        args = [(self, mun) for mun in self.municipalities]
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_generate_municipality, args))
+        else:
+            results = [_generate_municipality(arg) for arg in args]
+
+        all_points = []
+        for mun_points in results:
+            all_points += mun_points
+
+        all_points.sort(key=lambda point: point[2])
+
+        return all_points
@@ -0,0 +1,119 @@
+import numpy as np
+from scipy.signal import fftconvolve
+
+# Weight of space and time, and scale of days, of the space-time distance of DBSCANClustering
+PROP = 0.98
+DAY_SCALE = 10
+
+# Space-time distance at which the kernel falls to 1/e: the epsilon of DBSCANClustering
+BANDWIDTH = 0.014
+
+
+class SpaceTimeKDE:
+    """
+    Density of points on a fixed grid, with the space-time distance of DBSCANClustering:
+        d = prop*s/s_max + (1 - prop)*t/10
+    where s is the haversine distance, t the difference in days, and s_max the diagonal
+    of the grid (DBSCANClustering uses the largest distance between the points instead,
+    which would change the kernel with every window).
+
+    The kernel exp(-d/bandwidth) is the product of a space kernel and a time kernel,
+    so the points are binned on the grid with the weight of their day, and the grid
+    is convolved once with the space kernel, by FFT
+    """
+
+    def __init__(self, bbox, shape, prop=PROP, bandwidth=BANDWIDTH, cutoff=1e-3):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            bbox : tuple
+                (min_lng, min_lat, max_lng, max_lat) of the grid
+            shape : tuple
+                number of rows (from north to south) and columns (from west to east)
+            prop : float
+                weight of the space distance
+            bandwidth : float
+                space-time distance at which the kernel falls to 1/e
+            cutoff : float
+                smallest weight of the space kernel, which is truncated below it
+        """
+        self.bbox = bbox
+        self.rows, self.cols = shape
+        self.prop = prop
+        self.bandwidth = bandwidth
+
+        min_lng, min_lat, max_lng, max_lat = bbox
+
+        # Size of the cells in radians of great circle, along each axis
+        self.cell_lat = np.radians(max_lat - min_lat)/self.rows
+        self.cell_lng = np.radians(max_lng - min_lng)/self.cols*np.cos(np.radians((min_lat + max_lat)/2))
+        self.max_distance = np.hypot(self.rows*self.cell_lat, self.cols*self.cell_lng)
+
+        self.kernel = self.space_kernel(cutoff)
+
+    def space_kernel(self, cutoff):
+        """
+        Weight of the space distance between the center cell and its neighbours
+
+        Returns
+        -------
+            kernel : numpy array
+                (2*n + 1, 2*m + 1) weights
+        """
+        # Distance (in radians) at which the weight falls to 1/e
+        scale = self.bandwidth*self.max_distance/self.prop
+        radius = -np.log(cutoff)*scale
+
+        n = min(int(np.ceil(radius/self.cell_lat)), self.rows)
+        m = min(int(np.ceil(radius/self.cell_lng)), self.cols)
+        distances = np.hypot(np.arange(-n, n + 1)[:, None]*self.cell_lat,
+                             np.arange(-m, m + 1)[None, :]*self.cell_lng)
+
+        return np.exp(-distances/scale)
+
+    def time_weights(self, ages):
+        """
+        Weight of points given their age (in days)
+        """
+        return np.exp(-(1 - self.prop)*ages/(DAY_SCALE*self.bandwidth))
+
+    def cells(self, latitude, longitude):
+        """
+        Cell of each point, -1 if the point is outside of the grid
+        """
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+
+        row = np.floor((max_lat - latitude)/(max_lat - min_lat)*self.rows).astype(np.int64)
+        col = np.floor((longitude - min_lng)/(max_lng - min_lng)*self.cols).astype(np.int64)
+
+        inside = (row >= 0) & (row < self.rows) & (col >= 0) & (col < self.cols)
+        return np.where(inside, row*self.cols + col, -1)
+
+    def density(self, columns, day):
+        """
+        Density of the points of a window on its last day
+
+        Parameters
+        ----------
+            columns : PointColumns
+                points of the window
+            day : int
+                last day of the window, in days since 1970-01-01 (like columns.day)
+
+        Returns
+        -------
+            grid : numpy array
+                (rows, cols) density, in weighted points per cell
+        """
+        cell = self.cells(columns.latitude, columns.longitude)
+        inside = cell >= 0
+
+        weights = self.time_weights(day - columns.day[inside])
+        counts = np.bincount(cell[inside], weights=weights, minlength=self.rows*self.cols)
+
+        grid = fftconvolve(counts.reshape(self.rows, self.cols), self.kernel, mode="same")
+
+        # FFT leaves small negative values where there are no points
+        return np.maximum(grid, 0)
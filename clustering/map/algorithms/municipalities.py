@@ -0,0 +1,80 @@
+import numpy as np
+from map.algorithms.generate_points import load_municipality_data
+
+
+class MunicipalityLocator():
+    """
+    Find the municipality of points offline, using the municipality circles
+    (center and radius) instead of a geocoding server
+    """
+
+    def __init__(self, circles_data=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            circles_data : DataFrame, optional
+                center and radius of each municipality
+        """
+        if circles_data is None:
+            circles_data = load_municipality_data()[1]
+
+        self.names = np.asarray(circles_data["municipality"], dtype=object)
+        self.centers = np.radians([[float(coord) for coord in center[1:-1].split(",")]
+                                   for center in circles_data["center"]])
+        self.radii = circles_data["radius"].to_numpy(dtype=float)
+        self.R = 6371000
+
+    def distances(self, lat, lng):
+        """
+        Haversine distance of every point to every municipality center
+
+        Parameters
+        ----------
+            lat : numpy array
+                latitudes of the points
+            lng : numpy array
+                longitudes of the points
+
+        Returns
+        -------
+            distances : numpy array
+                (points x municipalities) distances, in meters
+        """
+        lat = np.radians(np.asarray(lat, dtype=float))[:, None]
+        lng = np.radians(np.asarray(lng, dtype=float))[:, None]
+
+        a = (np.sin((lat - self.centers[:, 0])/2)**2
+             + np.cos(lat)*np.cos(self.centers[:, 0])*np.sin((lng - self.centers[:, 1])/2)**2)
+        return 2*self.R*np.arcsin(np.sqrt(a))
+
+    def locate(self, lat, lng, unknown="Unknown"):
+        """
+        Municipality of each point: the municipality whose circle contains the point,
+        the closest relative to its radius if circles overlap
+
+        Parameters
+        ----------
+            lat : numpy array
+                latitudes of the points
+            lng : numpy array
+                longitudes of the points
+            unknown : str
+                name given to points outside every circle
+
+        Returns
+        -------
+            municipalities : numpy array
+                names of the municipalities
+        """
+        if len(lat) == 0:
+            return np.asarray([], dtype=object)
+
+        relative = self.distances(lat, lng)/self.radii
+        closest = np.argmin(relative, axis=1)
+
+        municipalities = self.names[closest]
+        municipalities[relative[np.arange(len(closest)), closest] > 1] = unknown
+
+        return municipalities
@@ -0,0 +1,283 @@
+import itertools
+import json
+import logging
+import os
+import tempfile
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+from map.algorithms.forecasting import TOTAL, fit_series, series_version
+
+logger = logging.getLogger(__name__)
+
+# Seasonality in data (here in days)
+SEASON = 7
+
+
+def candidate_orders(max_p, d, max_q, max_P, D, max_Q):
+    """
+    Grid of candidate orders, with the same differencing orders.
+    Likelihoods of models with different d or D are computed on differently
+    differenced data, so their AIC can not be compared
+
+    Parameters
+    ----------
+        max_p, max_q : int
+            maximum values of p and q of the (p, d, q) order
+        d : int
+            differencing order
+        max_P, max_Q : int
+            maximum values of P and Q of the (P, D, Q) seasonal order
+        D : int
+            seasonal differencing order
+
+    Returns
+    -------
+        candidates : list
+            (order, seasonal_order) tuples
+    """
+    candidates = []
+    for p, q, P, Q in itertools.product(range(max_p + 1), range(max_q + 1), range(max_P + 1), range(max_Q + 1)):
+        candidates.append(((p, d, q), (P, D, Q, SEASON)))
+    return candidates
+
+
+def order_key(order, seasonal_order):
+    """
+    String representation of a candidate, used as cache key
+    """
+    return ",".join(str(i) for i in order + seasonal_order)
+
+
+def parse_order_key(key):
+    """
+    Inverse of order_key
+    """
+    values = tuple(int(i) for i in key.split(","))
+    return values[:3], values[3:]
+
+
+def evaluate(counts, order, seasonal_order, maxiter):
+    """
+    Fit a candidate and compute its AIC
+
+    Parameters
+    ----------
+        counts : numpy array
+            number of cases per day
+        order : tuple
+            (p, d, q) order of the model
+        seasonal_order : tuple
+            (P, D, Q, s) seasonal order of the model
+        maxiter : int or None
+            maximum number of iterations of the optimizer, None for the default
+
+    Returns
+    -------
+        aic : float
+            AIC of the fit, infinite if the fit failed
+    """
+    model = SARIMAX(endog=np.asarray(counts, dtype=float), order=order, seasonal_order=seasonal_order, trend='n')
+
+    kwargs = {"disp": False}
+    if maxiter is not None:
+        kwargs["maxiter"] = maxiter
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            aic = model.fit(**kwargs).aic
+        except (ValueError, np.linalg.LinAlgError):
+            return float("inf")
+
+    return float(aic) if np.isfinite(aic) else float("inf")
+
+
+def _evaluate(args):
+    """
+    Helper for select_orders, so that candidates can be sent to worker processes
+    """
+    name, key, counts, maxiter = args
+    order, seasonal_order = parse_order_key(key)
+    return name, key, evaluate(counts, order, seasonal_order, maxiter)
+
+
+class OrderCache():
+    """
+    AIC of each candidate, stored on disk in one JSON file per series hash
+    """
+
+    def __init__(self, directory):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            directory : str
+                directory where the results are stored
+        """
+        self.directory = directory
+
+    def path(self, counts):
+        """
+        Path of the file with the results of a series
+        """
+        return os.path.join(self.directory, f"aic-{series_version({'': counts})}.json")
+
+    def load(self, counts):
+        """
+        Read the results of a series
+
+        Returns
+        -------
+            results : dict
+                {"quick": {key: aic}, "full": {key: aic}}
+        """
+        try:
+            with open(self.path(counts)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"quick": {}, "full": {}}
+
+    def save(self, counts, results):
+        """
+        Store the results of a series
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(results, f)
+        os.replace(tmp_path, self.path(counts))
+
+
+def select_orders(series, candidates, cache, workers=1, quick_maxiter=10, margin=10):
+    """
+    Select the candidate with the lowest AIC for each series.
+    Candidates must have the same differencing orders (see candidate_orders).
+
+    Every candidate is first fitted with a few optimizer iterations only, and only
+    the candidates whose quick AIC is at most margin above the best quick AIC are
+    fitted until convergence. This pruning is a heuristic: the quick AIC is only an
+    upper bound of the converged one, so a pruned candidate could have won. Pruned
+    candidates are logged, and an infinite margin fits every candidate.
+
+    Parameters
+    ----------
+        series : dict
+            number of cases per day, indexed by series name
+        candidates : list
+            (order, seasonal_order) tuples
+        cache : OrderCache
+            results of previous runs
+        workers : int
+            number of processes used
+        quick_maxiter : int
+            number of iterations of the first pass
+        margin : float
+            AIC margin of the pruning
+
+    Returns
+    -------
+        winners : dict
+            (order, seasonal_order, aic) indexed by series name
+    """
+    if len({(order[1], seasonal_order[1]) for order, seasonal_order in candidates}) > 1:
+        raise ValueError("AIC can not be compared between candidates with different differencing orders")
+
+    keys = [order_key(order, seasonal_order) for order, seasonal_order in candidates]
+    results = {name: cache.load(counts) for name, counts in series.items()}
+
+    def run(stage, jobs, maxiter):
+        args = [(name, key, series[name], maxiter) for name, key in jobs
+                if key not in results[name][stage]]
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                evaluated = list(executor.map(_evaluate, args, chunksize=4))
+        else:
+            evaluated = [_evaluate(arg) for arg in args]
+
+        for name, key, aic in evaluated:
+            results[name][stage][key] = aic
+
+    # First pass: few iterations for every candidate
+    run("quick", [(name, key) for name in series for key in keys], quick_maxiter)
+
+    # Second pass: full fit of the candidates that were not pruned
+    jobs = []
+    for name in series:
+        quick = {key: results[name]["quick"][key] for key in keys}
+        best = min(quick.values())
+        jobs += [(name, key) for key, aic in quick.items() if aic <= best + margin]
+
+        pruned = [key for key, aic in quick.items() if aic > best + margin]
+        if pruned:
+            logger.info("series=%s pruned=%d/%d candidates=%s", name, len(pruned), len(keys), ";".join(pruned))
+    run("full", jobs, None)
+
+    winners = {}
+    for name, counts in series.items():
+        cache.save(counts, results[name])
+
+        full = {key: aic for key, aic in results[name]["full"].items() if key in keys}
+        key = min(full, key=full.get)
+        order, seasonal_order = parse_order_key(key)
+        winners[name] = (order, seasonal_order, full[key])
+
+    return winners
+
+
+def read_holdout(path):
+    """
+    Read real data from the official file, in the same way as arima.get_real
+
+    Parameters
+    ----------
+        path : str
+            csv file with the number of cases per day and per municipality
+
+    Returns
+    -------
+        by_name : dict
+            number of cases indexed by date string, indexed by municipality (and TOTAL for the city)
+    """
+    data = pd.read_csv(path, sep=";")
+
+    by_name = {TOTAL: {}}
+
+    for date, mun, case in zip(data["DATE"], data["TX_DESCR_FR"], data["CASES"]):
+        case = 3 if case == "<5" else int(case)
+
+        by_name.setdefault(mun, {})
+        by_name[mun][date] = by_name[mun].get(date, 0) + case
+        by_name[TOTAL][date] = by_name[TOTAL].get(date, 0) + case
+
+    return by_name
+
+
+def holdout_error(counts, order, seasonal_order, real):
+    """
+    Mean absolute error of the forecast of a candidate on real data
+
+    Parameters
+    ----------
+        counts : numpy array
+            number of cases per day
+        order : tuple
+            (p, d, q) order of the model
+        seasonal_order : tuple
+            (P, D, Q, s) seasonal order of the model
+        real : numpy array
+            real number of cases of the days following the series
+
+    Returns
+    -------
+        mae : float
+            mean absolute error
+    """
+    fit = fit_series(counts, order, seasonal_order)
+    prediction = np.maximum(fit.forecast(len(real)), 0)
+    return float(np.mean(np.abs(prediction - real)))
@@ -0,0 +1,251 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Monte Carlo replicates drawn by a task of the process pool
+REPLICATES_PER_CHUNK = 50
+
+
+class SpaceTimeScan:
+    """
+    Kulldorff space-time scan statistic, with the Poisson model.
+
+    Candidate clusters are cylinders: a zone made of a municipality and its nearest
+    neighbours, over an interval of days. The likelihood ratio of a cylinder compares its
+    observed cases to the cases expected from the baseline, the total being the observed one.
+
+    Counts of every cylinder come from cumulative sums: over days, then over the neighbours
+    of each center, so that a cylinder is a difference of two sums instead of a sum over its cells
+    """
+
+    def __init__(self, expected, centers, max_days=7, max_zone_size=None, max_population=0.5, prospective=False):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            expected : numpy array
+                (municipalities, days) baseline cases, only their proportions matter
+            centers : numpy array
+                (municipalities, 2) latitude and longitude of the municipalities, in radians
+            max_days : int
+                maximum length of the cylinders, in days
+            max_zone_size : int, optional
+                maximum number of municipalities in a zone, all by default
+            max_population : float
+                maximum part of the expected cases in a zone, over the whole period
+            prospective : bool
+                only scan the cylinders that end on the last day (clusters still going on)
+        """
+        self.expected = expected
+        self.num_municipalities, self.num_days = expected.shape
+
+        # Neighbours of each municipality, from the closest (itself) to the farthest
+        lat, lng = centers[:, 0], centers[:, 1]
+        a = (np.sin((lat[:, None] - lat[None, :])/2)**2
+             + np.cos(lat[:, None])*np.cos(lat[None, :])*np.sin((lng[:, None] - lng[None, :])/2)**2)
+        self.neighbours = np.argsort(2*np.arcsin(np.sqrt(a)), axis=1, kind="stable")[:, :max_zone_size]
+
+        # Intervals of days [first, last), as indexes in the cumulative sums
+        intervals = [(last - length, last)
+                     for last in range(1, self.num_days + 1)
+                     for length in range(1, min(max_days, last) + 1)
+                     if not prospective or last == self.num_days]
+        self.first, self.last = np.asarray(intervals).T
+
+        self.expected_total = expected.sum()
+        self.zone_expected = self.cylinder_sums(expected)
+
+        # Zones whose expected cases exceed max_population of the total are not scanned
+        zone_share = self.zone_sums(expected.sum(axis=1, keepdims=True))[:, :, -1]/self.expected_total
+        self.valid = (zone_share <= max_population)[:, :, None] & (self.zone_expected > 0)
+
+    def zone_sums(self, values):
+        """
+        Cumulative sums over days of each zone
+
+        Parameters
+        ----------
+            values : numpy array
+                (municipalities, days) values
+
+        Returns
+        -------
+            sums : numpy array
+                (centers, zone sizes, days + 1) sums, sums[i, k, t] being the sum of values before day t
+                of center i and its k nearest neighbours
+        """
+        days = np.concatenate([np.zeros((len(values), 1)), np.cumsum(values, axis=1)], axis=1)
+        return np.cumsum(days[self.neighbours], axis=1)
+
+    def cylinder_sums(self, values):
+        """
+        Sum of values in every cylinder
+
+        Returns
+        -------
+            sums : numpy array
+                (centers, zone sizes, intervals) sums
+        """
+        sums = self.zone_sums(values)
+        return sums[:, :, self.last] - sums[:, :, self.first]
+
+    def log_likelihood_ratios(self, counts):
+        """
+        Log likelihood ratio of every cylinder, 0 if it has fewer cases than expected
+
+        Parameters
+        ----------
+            counts : numpy array
+                (municipalities, days) observed cases
+
+        Returns
+        -------
+            llr : numpy array
+                (centers, zone sizes, intervals) log likelihood ratios
+            observed : numpy array
+                observed cases of the cylinders
+            expected : numpy array
+                expected cases of the cylinders, given the total of counts
+        """
+        total = counts.sum()
+        observed = self.cylinder_sums(counts)
+        expected = self.zone_expected*total/self.expected_total
+
+        high = self.valid & (observed > expected)
+        c, n = observed[high], expected[high]
+
+        # Outside the cylinder: total - c observed for total - n expected (0*log(0) = 0)
+        outside = np.where(total > c, (total - c)*np.log(np.maximum(total - c, 1e-300)/(total - n)), 0)
+
+        llr = np.zeros(observed.shape)
+        llr[high] = c*np.log(c/n) + outside
+        return llr, observed, expected
+
+    def clusters(self, counts, max_clusters=10):
+        """
+        Most likely clusters, without municipality in common
+
+        Parameters
+        ----------
+            counts : numpy array
+                (municipalities, days) observed cases
+            max_clusters : int
+                maximum number of clusters returned
+
+        Returns
+        -------
+            clusters : list
+                dicts with the municipalities (indexes), first and last days (indexes, included),
+                observed and expected cases, relative risk (None if every case is in the cluster)
+                and log likelihood ratio of each cluster
+        """
+        llr, observed, expected = self.log_likelihood_ratios(counts)
+        total = counts.sum()
+
+        clusters = []
+        used = set()
+        for index in np.argsort(-llr, axis=None):
+            center, size, interval = np.unravel_index(index, llr.shape)
+            if llr[center, size, interval] <= 0 or len(clusters) == max_clusters:
+                break
+
+            zone = self.neighbours[center, :size + 1].tolist()
+            if used.intersection(zone):
+                continue
+            used.update(zone)
+
+            c, n = observed[center, size, interval], expected[center, size, interval]
+            clusters.append({"municipalities": zone,
+                             "first": int(self.first[interval]),
+                             "last": int(self.last[interval]) - 1,
+                             "observed": int(c),
+                             "expected": float(n),
+                             "relative_risk": float((c/n)/((total - c)/(total - n))) if total > c else None,
+                             "llr": float(llr[center, size, interval])})
+
+        return clusters
+
+    def simulate(self, total, replicates, seed):
+        """
+        Maximum log likelihood ratio of datasets drawn under the null hypothesis:
+        total cases spread over the cells in proportion to the baseline
+
+        Parameters
+        ----------
+            total : int
+                number of cases of each dataset
+            replicates : int
+                number of datasets
+            seed : int or SeedSequence
+                seed of the random generator
+
+        Returns
+        -------
+            max_llr : numpy array
+                maximum log likelihood ratio of each dataset
+        """
+        rng = np.random.default_rng(seed)
+        probabilities = self.expected.ravel()/self.expected_total
+
+        return np.asarray([self.log_likelihood_ratios(rng.multinomial(total, probabilities)
+                                                      .reshape(self.expected.shape))[0].max()
+                           for _ in range(replicates)])
+
+
+def simulate_chunk(scan, total, replicates, seed):
+    return scan.simulate(total, replicates, seed)
+
+
+def scan_statistic(counts, expected, centers, replicates=999, workers=1, seed=0, max_clusters=10, **kwargs):
+    """
+    Most likely space-time clusters of the counts, and their p-value from Monte Carlo replicates
+
+    Parameters
+    ----------
+        counts : numpy array
+            (municipalities, days) observed cases
+        expected : numpy array
+            (municipalities, days) baseline cases
+        centers : numpy array
+            (municipalities, 2) latitude and longitude of the municipalities, in radians
+        replicates : int
+            number of datasets drawn under the null hypothesis
+        workers : int
+            number of processes drawing them
+        seed : int
+            seed of the run, so that p-values are reproducible
+        max_clusters : int
+            maximum number of clusters returned
+        kwargs
+            options of SpaceTimeScan
+
+    Returns
+    -------
+        clusters : list
+            clusters as returned by SpaceTimeScan.clusters, with their p-value
+    """
+    scan = SpaceTimeScan(expected, centers, **kwargs)
+
+    clusters = scan.clusters(counts, max_clusters)
+    total = int(counts.sum())
+    if not clusters or replicates == 0:
+        return clusters
+
+    # One independent stream of random numbers per chunk of replicates.
+    # Chunks do not depend on workers, so neither do the results
+    chunks = np.array_split(np.arange(replicates), -(-replicates//REPLICATES_PER_CHUNK))
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            max_llr = np.concatenate(list(executor.map(simulate_chunk, [scan]*len(chunks), [total]*len(chunks),
+                                                       [len(chunk) for chunk in chunks], seeds)))
+    else:
+        max_llr = np.concatenate([scan.simulate(total, len(chunk), chunk_seed)
+                                  for chunk, chunk_seed in zip(chunks, seeds)])
+
+    # Secondary clusters are compared with the most likely clusters of the replicates (conservative)
+    for cluster in clusters:
+        cluster["p_value"] = float((1 + np.sum(max_llr >= cluster["llr"]))/(replicates + 1))
+
+    return clusters
@@ -0,0 +1,230 @@
+import datetime
+import numpy as np
+from map.algorithms.generate_points import PointGenerator, load_municipality_data
+
+
+class SyntheticDataset():
+    """
+    Class used to generate large synthetic datasets, with many cities and many days.
+
+    Every city is a copy of the Brussels municipalities, moved to a random location.
+    Cases come from hotspots that grow and fade over time, on top of a uniform
+    background in each municipality.
+    """
+
+    def __init__(self, num_points, num_cities, start, num_days, seed,
+                 hotspots_per_city=20, background=0.3, circles_data=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            num_points : int
+                total number of points to generate
+            num_cities : int
+                number of cities
+            start : date
+                first day of the dataset
+            num_days : int
+                number of days of the dataset
+            seed : int
+                seed of the run, so that results are reproducible
+            hotspots_per_city : int
+                number of hotspots in each city, over the whole period
+            background : float
+                fraction of the points that do not belong to a hotspot
+            circles_data : DataFrame, optional
+                center and radius of the template municipalities
+        """
+        if hotspots_per_city < 1:
+            raise ValueError("There must be at least one hotspot per city")
+
+        self.num_points = num_points
+        self.num_cities = num_cities
+        self.start = start
+        self.num_days = num_days
+        self.background = background
+        self.rng = np.random.default_rng(seed)
+        self.geometry = PointGenerator(None, start, data=(None, None))
+
+        if circles_data is None:
+            circles_data = load_municipality_data()[1]
+
+        self.make_municipalities(circles_data)
+        self.make_hotspots(hotspots_per_city)
+        self.make_counts()
+
+    def make_municipalities(self, circles_data):
+        """
+        Copy the template municipalities in every city.
+        The first city is the template itself.
+
+        Parameters
+        ----------
+            circles_data : DataFrame
+                center and radius of the template municipalities
+        """
+        centers = np.asarray([[float(coord) for coord in center[1:-1].split(",")]
+                              for center in circles_data["center"]])
+        radii = circles_data["radius"].to_numpy(dtype=float)
+        names = list(circles_data["municipality"])
+
+        city_center = centers.mean(axis=0)
+
+        # Cities are spread over Western Europe
+        offsets = np.zeros((self.num_cities, 2))
+        offsets[1:, 0] = self.rng.uniform(43, 55, size=self.num_cities - 1) - city_center[0]
+        offsets[1:, 1] = self.rng.uniform(-5, 20, size=self.num_cities - 1) - city_center[1]
+
+        self.mun_centers = (centers[None, :, :] + offsets[:, None, :]).reshape(-1, 2)
+        self.mun_radii = np.tile(radii, self.num_cities)
+        self.mun_city = np.repeat(np.arange(self.num_cities), len(names))
+        self.municipalities = [names[i] if city == 0 else f"City {city} - {names[i]}"
+                               for city in range(self.num_cities) for i in range(len(names))]
+
+    def make_hotspots(self, hotspots_per_city):
+        """
+        Draw the hotspots: location, spatial spread, and time profile
+
+        Parameters
+        ----------
+            hotspots_per_city : int
+                number of hotspots in each city
+        """
+        num_hotspots = hotspots_per_city*self.num_cities
+        num_mun = len(self.municipalities)
+
+        # Each hotspot is inside a municipality of its city
+        mun_per_city = num_mun//self.num_cities
+        city = np.repeat(np.arange(self.num_cities), hotspots_per_city)
+        self.hotspot_mun = city*mun_per_city + self.rng.integers(0, mun_per_city, size=num_hotspots)
+
+        radius = self.mun_radii[self.hotspot_mun]
+        lat, lng = self.geometry.destination_points(self.mun_centers[self.hotspot_mun, 0],
+                                                    self.mun_centers[self.hotspot_mun, 1],
+                                                    radius*np.sqrt(self.rng.uniform(size=num_hotspots)),
+                                                    self.rng.uniform(0, 2*np.pi, size=num_hotspots))
+        self.hotspot_centers = np.column_stack([lat, lng])
+
+        # Spatial spread in meters
+        self.hotspot_sigma = self.rng.uniform(150, 800, size=num_hotspots)
+
+        # Hotspots grow then fade, with a bell-shaped intensity
+        self.hotspot_peak = self.rng.uniform(0, self.num_days, size=num_hotspots)
+        self.hotspot_duration = self.rng.uniform(5, 25, size=num_hotspots)
+        self.hotspot_weight = self.rng.lognormal(0, 0.75, size=num_hotspots)
+
+    def hotspot_intensity(self, day):
+        """
+        Relative intensity of each hotspot on a given day
+
+        Parameters
+        ----------
+            day : int
+                number of days since the start
+
+        Returns
+        -------
+            intensity : numpy array
+                intensity of the hotspots
+        """
+        z = (day - self.hotspot_peak)/(self.hotspot_duration/2)
+        return self.hotspot_weight*np.exp(-z**2/2)
+
+    def make_counts(self):
+        """
+        Split the number of points between days and cities.
+        The number of cases follows slow waves with a weekly seasonality, like the real data.
+        """
+        days = np.arange(self.num_days)
+        waves = 1 + 0.5*np.sin(2*np.pi*days/self.rng.uniform(45, 90) + self.rng.uniform(0, 2*np.pi))
+        weekly = np.where(days % 7 >= 5, 0.6, 1.0)
+        day_weights = waves*weekly
+        day_weights /= day_weights.sum()
+
+        city_weights = self.rng.dirichlet(np.full(self.num_cities, 2.0))
+
+        counts = self.rng.multinomial(self.num_points, day_weights)
+        self.counts = np.asarray([self.rng.multinomial(count, city_weights) for count in counts])
+
+    def generate_day(self, day):
+        """
+        Generate the points of one day
+
+        Parameters
+        ----------
+            day : int
+                number of days since the start
+
+        Returns
+        -------
+            lat : numpy array
+                latitudes of the points
+            lng : numpy array
+                longitudes of the points
+            municipality : numpy array
+                index of the municipality of each point
+        """
+        intensity = self.hotspot_intensity(day)
+        hotspot_city = self.mun_city[self.hotspot_mun]
+
+        mun_per_city = len(self.municipalities)//self.num_cities
+
+        centers, spreads, muns, uniform = [], [], [], []
+
+        for city, count in enumerate(self.counts[day]):
+            num_background = self.rng.binomial(count, self.background)
+
+            # Background: uniform in a random municipality of the city
+            mun = city*mun_per_city + self.rng.integers(0, mun_per_city, size=num_background)
+            centers.append(self.mun_centers[mun])
+            spreads.append(self.mun_radii[mun])
+            muns.append(mun)
+            uniform.append(np.ones(num_background, dtype=bool))
+
+            # Hotspots: normal around the active hotspots of the city
+            city_hotspots = np.flatnonzero(hotspot_city == city)
+            weights = intensity[city_hotspots]
+            if weights.sum() == 0:
+                weights = np.ones(len(city_hotspots))
+            hotspot = self.rng.choice(city_hotspots, size=count - num_background, p=weights/weights.sum())
+            centers.append(self.hotspot_centers[hotspot])
+            spreads.append(self.hotspot_sigma[hotspot])
+            muns.append(self.hotspot_mun[hotspot])
+            uniform.append(np.zeros(len(hotspot), dtype=bool))
+
+        centers = np.concatenate(centers)
+        spreads = np.concatenate(spreads)
+        muns = np.concatenate(muns)
+        uniform = np.concatenate(uniform)
+
+        num_points = len(muns)
+        distances = np.where(uniform,
+                             spreads*np.sqrt(self.rng.uniform(size=num_points)),
+                             np.abs(self.rng.normal(0, 1, size=num_points))*spreads)
+        bearings = self.rng.uniform(0, 2*np.pi, size=num_points)
+
+        lat, lng = self.geometry.destination_points(centers[:, 0], centers[:, 1], distances, bearings)
+
+        return np.round(lat, 5), np.round(lng, 5), muns
+
+    def generate(self):
+        """
+        Generate the points day by day, so that memory does not depend
+        on the size of the dataset
+
+        Yields
+        ------
+            date : date
+                day of the points
+            lat : numpy array
+                latitudes of the points
+            lng : numpy array
+                longitudes of the points
+            municipality : numpy array
+                index of the municipality of each point
+        """
+        for day in range(self.num_days):
+            date = self.start + datetime.timedelta(days=day)
+            lat, lng, muns = self.generate_day(day)
+            yield date, lat, lng, muns
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MapConfig(AppConfig):
     name = 'map'
+
+    def ready(self):
+        # Data versions are bumped on every point write
+        from map import signals  # noqa: F401
@@ -0,0 +1,188 @@
+"""
+ASGI application of the project (see clustering/asgi.py).
+
+Django 2.2 has no async views, so this application dispatches requests itself:
+POST requests to the views of async_views.ASYNC_VIEWS run as coroutines, and every
+other request goes through the Django WSGI handler (with all its middleware) in a thread
+of a pool of ASGI_THREADS threads. Views waiting for the geocoder thus hold no thread,
+and cannot starve the threads serving the map.
+"""
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.wsgi import get_wsgi_application
+from django.middleware.csrf import CsrfViewMiddleware
+from django.urls import Resolver404, resolve
+from map import metrics
+from map.async_views import ASYNC_VIEWS
+from map.geocoding import close_async_geocoder
+
+
+def build_environ(scope, body):
+    """
+    WSGI environ of an ASGI HTTP request
+
+    Parameters
+    ----------
+        scope : dict
+            scope of the request
+        body : bytes
+            body of the request
+
+    Returns
+    -------
+        environ : dict
+            WSGI environ
+    """
+    script_name = scope.get("root_path", "")
+    path_info = scope["path"][len(script_name):] if scope["path"].startswith(script_name) else scope["path"]
+    server = scope.get("server") or ("localhost", 80)
+
+    environ = {"REQUEST_METHOD": scope["method"],
+               "SCRIPT_NAME": script_name.encode("utf-8").decode("latin1"),
+               "PATH_INFO": path_info.encode("utf-8").decode("latin1"),
+               "QUERY_STRING": scope["query_string"].decode("latin1"),
+               "SERVER_NAME": server[0],
+               "SERVER_PORT": str(server[1]),
+               "SERVER_PROTOCOL": "HTTP/%s" % scope["http_version"],
+               "wsgi.version": (1, 0),
+               "wsgi.url_scheme": scope.get("scheme", "http"),
+               "wsgi.input": io.BytesIO(body),
+               "wsgi.errors": io.StringIO(),
+               "wsgi.multithread": True,
+               "wsgi.multiprocess": True,
+               "wsgi.run_once": False}
+
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        value = value.decode("latin1")
+        environ[name] = environ[name] + "," + value if name in environ else value
+
+    return environ
+
+
+async def read_body(receive):
+    """
+    Body of an ASGI HTTP request, None if the client disconnected before sending it
+    """
+    body = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(body)
+
+
+class Application():
+    """
+    ASGI application serving the project
+    """
+
+    def __init__(self):
+        self.wsgi = get_wsgi_application()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            name = None
+            if scope["method"] == "POST":
+                try:
+                    name = resolve(scope["path"][len(scope.get("root_path", "")):]).url_name
+                except Resolver404:
+                    pass
+
+            if name in ASYNC_VIEWS:
+                await self.async_view(name, scope, receive, send)
+            else:
+                await self.sync_view(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported scope type {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(settings.ASGI_THREADS))
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await close_async_geocoder()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def sync_view(self, scope, receive, send):
+        """
+        Handle the request with Django in a thread. The response is sent chunk by chunk,
+        so streamed responses stay streamed
+        """
+        body = await read_body(receive)
+        if body is None:
+            return
+
+        environ = build_environ(scope, body)
+        loop = asyncio.get_running_loop()
+
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            start = {}
+
+            def start_response(status, headers, exc_info=None):
+                # Django gives cookies with a leading space, which ASGI servers reject
+                start["status"] = int(status.split(" ", 1)[0])
+                start["headers"] = [(header.lower().encode("latin1"), value.strip().encode("latin1"))
+                                    for header, value in headers]
+
+            response = self.wsgi(environ, start_response)
+            try:
+                send_message({"type": "http.response.start", "status": start["status"],
+                              "headers": start["headers"]})
+                for chunk in response:
+                    if chunk:
+                        send_message({"type": "http.response.body", "body": chunk, "more_body": True})
+            finally:
+                # Closing the response sends request_finished, which closes the database connection of the thread
+                if hasattr(response, "close"):
+                    response.close()
+            send_message({"type": "http.response.body", "body": b""})
+
+        await loop.run_in_executor(None, run)
+
+    async def async_view(self, name, scope, receive, send):
+        """
+        Handle the request with an async view. Only the CSRF middleware applies
+        """
+        start = time.perf_counter()
+        body = await read_body(receive)
+        if body is None:
+            return
+
+        request = WSGIRequest(build_environ(scope, body))
+        view = ASYNC_VIEWS[name]
+
+        csrf = CsrfViewMiddleware()
+        csrf.process_request(request)
+        response = csrf.process_view(request, view, (), {})
+        if response is None:
+            response = await view(request)
+        response = csrf.process_response(request, response)
+
+        headers = [(header.lower().encode("latin1"), value.encode("latin1")) for header, value in response.items()]
+        headers += [(b"set-cookie", cookie.output(header="").strip().encode("latin1"))
+                    for cookie in response.cookies.values()]
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": response.content})
+
+        metrics.registry.inc("stc_requests_total", view=name, status=response.status_code)
+        metrics.registry.observe("stc_request_seconds", time.perf_counter() - start, view=name)
@@ -0,0 +1,135 @@
+"""
+Async versions of the views that wait for the geocoder, served by the ASGI application (map/asgi.py).
+While they wait, the server keeps serving other requests.
+Database and CPU-bound work runs in the threads of the server
+"""
+import asyncio
+import datetime
+from random import randint
+from django.conf import settings
+from django.db import close_old_connections
+from django.shortcuts import render
+from map import algorithms
+from map.datasets import get_dataset, dataset_redirect
+from map.forms import PointFormCoord, PointFormAddr
+from map.generation import generate_range
+from map.geocoding import get_async_geocoder, get_municipality
+from map.models import Point
+
+
+async def run_sync(function, *args, **kwargs):
+    """
+    Run blocking code in a thread of the server, and close the database connection it opened
+    """
+    def call():
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+def parse_date(date_str):
+    date_lst = date_str.split("-")
+    return datetime.date(year=int(date_lst[0]), month=int(date_lst[1]), day=int(date_lst[2]))
+
+
+def validate_point(form_class, data):
+    """
+    Bind and validate a point form. Model forms read the database (datasets, default values of the point),
+    so they are built in a thread of the server too
+
+    Returns
+    -------
+        form : PointForm
+            bound form
+        point : Point
+            point of the form, not saved yet. None if the form is not valid
+    """
+    form = form_class(data)
+    return form, form.save(commit=False) if form.is_valid() else None
+
+
+async def point_coord_create(request):
+    """
+    Create a new point with given coordinates, and find its address
+    """
+    form, point = await run_sync(validate_point, PointFormCoord, request.POST)
+    if point is None:
+        return await run_sync(render, request, 'map/point_form_coord.html', {'form': form})
+
+    # Use Geocoding to find address
+    location = await get_async_geocoder().reverse(str(point.latitude) + ", " + str(point.longitude))
+    point.address = location.address
+    point.municipality = get_municipality(location.raw)
+
+    await run_sync(point.save)
+
+    return dataset_redirect('map_clusters', point.dataset)
+
+
+async def point_addr_create(request):
+    """
+    Create a new point with given address, and find its coordinates
+    """
+    form, point = await run_sync(validate_point, PointFormAddr, request.POST)
+    if point is None:
+        return await run_sync(render, request, 'map/point_form_addr.html', {'form': form})
+
+    # Use Geocoding to find coordinates
+    geocoder = get_async_geocoder()
+    coords = await geocoder.geocode(point.address)
+    point.latitude = coords.latitude
+    point.longitude = coords.longitude
+
+    location = await geocoder.reverse(str(coords.latitude) + ", " + str(coords.longitude))
+    point.municipality = get_municipality(location.raw)
+
+    await run_sync(point.save)
+
+    return dataset_redirect('map_clusters', point.dataset)
+
+
+async def generate_points(request):
+    """
+    Generate points on a given day, or on every day of a range.
+    The addresses of the points of a day are requested concurrently,
+    within the limits of the geocoder
+    """
+    dataset = await run_sync(get_dataset, request)
+    date = parse_date(request.POST.get('date'))
+
+    end_str = request.POST.get('end_date')
+    if end_str:
+        seed_str = request.POST.get('seed')
+        seed = int(seed_str) if seed_str else randint(0, 2**32 - 1)
+
+        await run_sync(generate_range, dataset, date, parse_date(end_str), seed, window=settings.WINDOW_DAYS)
+
+        return dataset_redirect('generateView', dataset)
+
+    # Get points of the past days
+    past_points = Point.objects.filter(dataset=dataset,
+                                       date__gte=date - datetime.timedelta(days=settings.WINDOW_DAYS),
+                                       date__lte=date)
+
+    # Generate points
+    new_points = await run_sync(lambda: algorithms.PointGenerator(past_points, date,
+                                                                  data=dataset.municipality_data()).generate())
+
+    geocoder = get_async_geocoder()
+    locations = await asyncio.gather(*[geocoder.reverse(str(lat) + ", " + str(lng))
+                                       for (lat, lng), municipality in new_points])
+
+    rows = [(Point.POSITIVE, lat, lng, location.address, municipality, date)
+            for ((lat, lng), municipality), location in zip(new_points, locations)]
+    await run_sync(Point.objects.bulk_create_points, rows, dataset.pk)
+
+    return dataset_redirect('generateView', dataset)
+
+
+# Async view of each URL name, for POST requests (GET requests show the forms, without geocoding)
+ASYNC_VIEWS = {'new_point_coord': point_coord_create,
+               'new_point_addr': point_addr_create,
+               'generate': generate_points}
@@ -0,0 +1,275 @@
+import contextlib
+import datetime
+import gc
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from map.algorithms.columns import PointColumns
+from map.algorithms.dbscan import DBSCANClustering
+from map.algorithms.forecasting import fit_series
+from map.algorithms.kde import SpaceTimeKDE
+from map.algorithms.generate_points import PointGenerator, load_municipality_data
+
+# Input sizes of the suite
+SIZES = [10**3, 3*10**3, 10**4, 3*10**4, 10**5]
+
+# Day of the generated points
+DATE = datetime.date(2021, 1, 15)
+
+
+def random_columns(size, rng):
+    """
+    Points spread over Brussels and over 11 days
+    """
+    return PointColumns(rng.uniform(50.77, 50.91, size),
+                        rng.uniform(4.25, 4.48, size),
+                        (DATE - datetime.date(1970, 1, 1)).days - rng.integers(0, 11, size),
+                        np.ones(size))
+
+
+def setup_compute_clusters(size, rng):
+    columns = random_columns(size, rng)
+    return lambda: DBSCANClustering(columns).compute_clusters()
+
+
+def setup_transform_data(size, rng):
+    columns = random_columns(size, rng)
+    return lambda: DBSCANClustering(columns).transform_data()
+
+
+def setup_get_cluster_data(size, rng):
+    columns = random_columns(size, rng)
+    X = np.column_stack([columns.latitude, columns.longitude])
+
+    # About 50 points per cluster, and some noise
+    Y = rng.integers(-1, max(size//50, 1), size)
+
+    return lambda: DBSCANClustering(columns).get_cluster_data(X, Y)
+
+
+def setup_heatmap(size, rng):
+    """
+    Density grid of size points, with the default grid size
+    """
+    columns = random_columns(size, rng)
+    kde = SpaceTimeKDE((4.25, 50.77, 4.48, 50.91), (256, 256))
+    return lambda: kde.density(columns, (DATE - datetime.date(1970, 1, 1)).days)
+
+
+def setup_generate(size, rng):
+    """
+    Generate size points in total, spread over the municipalities.
+    No past points: every municipality is generated uniformly
+    """
+    from map.models import Point
+
+    circles_data = load_municipality_data()[1]
+    municipalities = list(circles_data["municipality"])
+    counts = np.bincount(rng.integers(0, len(municipalities), size), minlength=len(municipalities))
+    cases_data = pd.DataFrame({"DATE": str(DATE), "TX_DESCR_FR": municipalities, "CASES": counts.astype(str)})
+
+    generator = PointGenerator(Point.objects.none(), DATE, data=(cases_data, circles_data),
+                               rng=np.random.default_rng(0))
+    return generator.generate
+
+
+def setup_predict(size, rng):
+    """
+    Same model and forecast as arima.predict, on a series of size days
+    """
+    days = np.arange(size)
+    counts = rng.poisson(100 + 20*np.sin(2*np.pi*days/7))
+
+    return lambda: fit_series(counts).forecast(14)
+
+
+# name: (setup, maximum size). Setup returns the function to measure.
+# Clustering builds (size x size) matrices, so its sizes are limited by max_quadratic_size
+BENCHMARKS = {"compute_clusters": (setup_compute_clusters, "quadratic"),
+              "transform_data": (setup_transform_data, "quadratic"),
+              "get_cluster_data": (setup_get_cluster_data, None),
+              "heatmap": (setup_heatmap, None),
+              "generate": (setup_generate, None),
+              "predict": (setup_predict, 10**4)}
+
+# "startup" measures the import of the application in a new process, at a single size (0)
+NAMES = list(BENCHMARKS) + ["startup"]
+
+
+# Libraries that a server process should not load before it clusters or forecasts
+HEAVY_MODULES = ("sklearn", "scipy", "pandas", "statsmodels", "matplotlib", "geopy", "pyarrow")
+
+# Start Django and import every view, as a server worker does before its first request
+STARTUP_CODE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - start
+try:
+    # Peak of this process alone: ru_maxrss keeps the peak of the parent across exec
+    with open("/proc/self/status") as f:
+        peak = int(next(line for line in f if line.startswith("VmHWM")).split()[1])*1024
+except OSError:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024
+print(json.dumps({"time": elapsed,
+                  "peak_memory": peak,
+                  "heavy_modules": sorted(name for name in %r if name in sys.modules)}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_startup(repeat, directory):
+    """
+    Measure the start of a fresh process: best time to set up Django and import the views,
+    its maximum resident memory, and the heavy libraries it loaded
+
+    Parameters
+    ----------
+        repeat : int
+            number of processes started
+        directory : str
+            directory of manage.py
+
+    Returns
+    -------
+        result : dict
+            "time" in seconds, "peak_memory" in bytes, "heavy_modules" names
+    """
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", STARTUP_CODE], cwd=directory, env=os.environ,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.splitlines()[-1]))
+
+    return {"time": min(run["time"] for run in runs),
+            "peak_memory": max(run["peak_memory"] for run in runs),
+            "heavy_modules": runs[-1]["heavy_modules"]}
+
+
+def measure(function, repeat):
+    """
+    Measure a function: best time of repeat runs, then peak memory of one more run.
+    Memory is traced separately, since tracing slows down allocations
+
+    Returns
+    -------
+        result : dict
+            "time" in seconds, "peak_memory" in bytes
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"time": min(times), "peak_memory": peak}
+
+
+def run(names=None, sizes=SIZES, max_quadratic_size=3*10**3, repeat=3, seed=0, log=None):
+    """
+    Run the suite
+
+    Parameters
+    ----------
+        names : list, optional
+            benchmarks to run, all by default
+        sizes : list
+            input sizes
+        max_quadratic_size : int
+            maximum size of the benchmarks with quadratic memory
+        repeat : int
+            number of timed runs of each measure
+        seed : int
+            seed of the generated data
+        log : callable, optional
+            called with a line of text after each measure
+
+    Returns
+    -------
+        results : dict
+            {"time", "peak_memory"} indexed by size (as a string), indexed by benchmark name
+    """
+    results = {}
+    for name in names or NAMES:
+        if name == "startup":
+            result = measure_startup(repeat, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+            results[name] = {"0": result}
+            if log is not None:
+                log(f"{name:<18} {0:>7}  {result['time']:9.4f} s  {result['peak_memory']/2**20:9.1f} MiB"
+                    f"  {' '.join(result['heavy_modules'])}")
+            continue
+
+        setup, max_size = BENCHMARKS[name]
+        if max_size == "quadratic":
+            max_size = max_quadratic_size
+
+        results[name] = {}
+        for size in sizes:
+            if max_size is not None and size > max_size:
+                continue
+
+            # The measured functions print their results
+            with contextlib.redirect_stdout(io.StringIO()):
+                function = setup(size, np.random.default_rng(seed))
+                result = measure(function, repeat)
+            results[name][str(size)] = result
+
+            if log is not None:
+                log(f"{name:<18} {size:>7}  {result['time']:9.4f} s  {result['peak_memory']/2**20:9.1f} MiB")
+
+    return results
+
+
+# Differences below these values are noise
+MIN_DIFFERENCE = {"time": 1e-3, "peak_memory": 2**20}
+
+
+def compare(results, baseline, threshold):
+    """
+    Find the measures that got worse than the baseline, by more than threshold
+    and more than MIN_DIFFERENCE
+
+    Parameters
+    ----------
+        results : dict
+            results of run
+        baseline : dict
+            results of a previous run
+        threshold : float
+            relative increase tolerated (0.2 for 20%)
+
+    Returns
+    -------
+        regressions : list
+            (name, size, metric, baseline value, new value) tuples
+    """
+    regressions = []
+    for name, by_size in results.items():
+        for size, result in by_size.items():
+            previous = baseline.get(name, {}).get(size)
+            if previous is None:
+                continue
+
+            for metric in ("time", "peak_memory"):
+                if result[metric] > previous[metric]*(1 + threshold) \
+                        and result[metric] - previous[metric] > MIN_DIFFERENCE[metric]:
+                    regressions.append((name, size, metric, previous[metric], result[metric]))
+
+    return regressions
@@ -0,0 +1,93 @@
+import struct
+import numpy as np
+
+# Compact binary format for points, decoded by map_points.js
+# Header (little-endian):
+#   magic "STCP", version (uint16), reserved (uint16), number of points (uint32),
+#   first day (int32, days since 1970-01-01), scale (uint32),
+#   first latitude and longitude (int32, quantized)
+# Then, for n points:
+#   latitude deltas (int32 * n), longitude deltas (int32 * n),
+#   day offsets from first day (uint16 * n), states (uint8 * n)
+CONTENT_TYPE = 'application/x-stc-points'
+
+MAGIC = b'STCP'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIiIii')
+
+# Coordinates are stored in units of 1e-5 degrees, the precision of the database
+SCALE = 100000
+
+
+def encode_points(columns, scale=SCALE):
+    """
+    Encode points in the compact binary format
+
+    Parameters
+    ----------
+        columns : PointColumns
+            points to encode
+        scale : int
+            quantization of coordinates (units per degree)
+
+    Returns
+    -------
+        data : bytes
+            encoded points
+    """
+    lat = np.rint(columns.latitude*scale).astype(np.int32)
+    lng = np.rint(columns.longitude*scale).astype(np.int32)
+
+    num_points = len(columns)
+    first_day = int(columns.day.min()) if num_points else 0
+    first_lat = int(lat[0]) if num_points else 0
+    first_lng = int(lng[0]) if num_points else 0
+
+    header = HEADER.pack(MAGIC, VERSION, 0, num_points, first_day, scale, first_lat, first_lng)
+
+    # Deltas from the previous point (the first one is relative to the header)
+    dlat = np.diff(lat, prepend=np.int32(first_lat)).astype('<i4')
+    dlng = np.diff(lng, prepend=np.int32(first_lng)).astype('<i4')
+    days = (columns.day - first_day).astype('<u2')
+    states = columns.state.astype(np.uint8)
+
+    return b''.join([header, dlat.tobytes(), dlng.tobytes(), days.tobytes(), states.tobytes()])
+
+
+def decode_points(data):
+    """
+    Decode points from the compact binary format, the same way as map_points.js
+
+    Parameters
+    ----------
+        data : bytes
+            encoded points
+
+    Returns
+    -------
+        latitude : numpy array
+            latitudes of the points
+        longitude : numpy array
+            longitudes of the points
+        day : numpy array
+            dates of the points, as number of days since 1970-01-01
+        state : numpy array
+            states of the points
+    """
+    magic, version, _, num_points, first_day, scale, first_lat, first_lng = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a point payload")
+
+    offset = HEADER.size
+    dlat = np.frombuffer(data, dtype='<i4', count=num_points, offset=offset)
+    offset += 4*num_points
+    dlng = np.frombuffer(data, dtype='<i4', count=num_points, offset=offset)
+    offset += 4*num_points
+    days = np.frombuffer(data, dtype='<u2', count=num_points, offset=offset)
+    offset += 2*num_points
+    states = np.frombuffer(data, dtype=np.uint8, count=num_points, offset=offset)
+
+    latitude = (first_lat + np.cumsum(dlat, dtype=np.int64))/scale
+    longitude = (first_lng + np.cumsum(dlng, dtype=np.int64))/scale
+
+    return latitude, longitude, first_day + days.astype(np.int32), states
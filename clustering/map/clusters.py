@@ -0,0 +1,138 @@
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from django.conf import settings
+from map.models import DataVersion, default_states, states_key
+from map.algorithms.columns import EPOCH
+from map import algorithms, metrics, store
+
+
+def cluster_points(columns, prop=0.98, eps=0.014):
+    """
+    Compute clusters of the given points
+
+    Parameters
+    ----------
+        columns : PointColumns
+            points to cluster
+        prop : float
+            weight of the space distance
+        eps : float
+            maximum space-time distance of two neighbours
+
+    Returns
+    -------
+        tup : tuple
+            centroids ([lat, lng] lists), number of points, and sizes of clusters found
+    """
+    if len(columns) == 0:  # Can't cluster if there are no points
+        return [], [], []
+
+    centroids, num_points, sizes = algorithms.DBSCANClustering(columns, prop, eps, metrics.timer).compute_clusters()
+
+    return ([[float(centroid[0]), float(centroid[1])] for centroid in centroids],
+            [int(num) for num in num_points],
+            [float(size) for size in sizes])
+
+
+def window_versions(dataset, start, end, window):
+    """
+    Version of the window of each day between start and end (included)
+
+    Parameters
+    ----------
+        dataset : int
+            id of the dataset
+        start : date
+            first day
+        end : date
+            last day
+        window : int
+            length of the windows, in days
+
+    Returns
+    -------
+        versions : dict
+            version indexed by date
+    """
+    versions = dict(DataVersion.objects.filter(dataset=dataset, date__gte=start - datetime.timedelta(days=window),
+                                               date__lte=end).values_list('date', 'version'))
+
+    window_days = [datetime.timedelta(days=i) for i in range(window + 1)]
+    num_days = (end - start).days + 1
+    days = [start + datetime.timedelta(days=i) for i in range(num_days)]
+
+    return {day: max(versions.get(day - delta, 0) for delta in window_days) for day in days}
+
+
+def cache_key(dataset, day, window, version, states):
+    return (f"clusters:{dataset.pk}:{dataset.cluster_prop}:{dataset.cluster_eps}:"
+            f"{day}:{window}:{version}:{states_key(states)}")
+
+
+def get_clusters_range(dataset, start, end, workers=1, window=None, states=None):
+    """
+    Clusters of the window of each day between start and end (included).
+    Days already computed for the current version of their window are read from the store.
+    The others are sliced from the point store, and clustered in parallel.
+
+    Parameters
+    ----------
+        dataset : Dataset
+            dataset of the points, with the parameters of its clusters
+        start : date
+            first day
+        end : date
+            last day
+        workers : int
+            number of processes used
+        window : int, optional
+            length of the windows, in days. By default, settings.WINDOW_DAYS
+        states : set, optional
+            states of the points to cluster. By default, settings.DEFAULT_STATES
+
+    Returns
+    -------
+        clusters : dict
+            (centroids, num_points, sizes) indexed by date
+    """
+    if window is None:
+        window = settings.WINDOW_DAYS
+
+    if states is None:
+        states = default_states()
+
+    points_store = store.for_dataset(dataset.pk)
+    versions = window_versions(dataset.pk, start, end, window)
+    keys = {day: cache_key(dataset, day, window, version, states) for day, version in versions.items()}
+
+    cached = points_store.get_clusters(list(keys.values()))
+    clusters = {day: cached[key] for day, key in keys.items() if key in cached}
+
+    missing = sorted(day for day in keys if day not in clusters)
+    metrics.cache_lookup("clusters", len(clusters), len(missing))
+    if missing:
+        points = points_store.window(missing[0] - datetime.timedelta(days=window), missing[-1]).with_states(states)
+
+        # Points are sorted by date, so each window is a slice
+        epoch_days = np.asarray([(day - EPOCH).days for day in missing])
+        first = np.searchsorted(points.day, epoch_days - window, side='left')
+        last = np.searchsorted(points.day, epoch_days, side='right')
+        windows = [points.take(slice(i, j)) for i, j in zip(first, last)]
+
+        prop, eps = dataset.cluster_prop, dataset.cluster_eps
+        if workers > 1 and len(missing) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(cluster_points, windows, [prop]*len(windows), [eps]*len(windows)))
+        else:
+            results = [cluster_points(columns, prop, eps) for columns in windows]
+
+        metrics.count("points", sum(len(columns) for columns in windows))
+        metrics.count("clusters", sum(len(result[1]) for result in results))
+
+        computed = dict(zip(missing, results))
+        points_store.set_clusters({keys[day]: (day - datetime.timedelta(days=window), day, result)
+                                   for day, result in computed.items()})
+        clusters.update(computed)
+
+    return clusters
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.shortcuts import get_object_or_404, redirect
+from django.urls import reverse
+from map.models import Dataset
+
+
+def get_dataset(request):
+    """
+    Dataset given by its slug in the query string (or in the form of a POST request),
+    the default one otherwise. Read once per request, raise Http404 if it does not exist
+    """
+    if not hasattr(request, 'dataset'):
+        slug = request.GET.get('dataset') or request.POST.get('dataset') or settings.DEFAULT_DATASET
+        request.dataset = get_object_or_404(Dataset, slug=slug)
+    return request.dataset
+
+
+def dataset_context(dataset):
+    """
+    Dataset of a map page, for the scripts: slug for the requests, and initial view of the map
+    """
+    return {"slug": dataset.slug,
+            "name": dataset.name,
+            "center": [float(dataset.center_latitude), float(dataset.center_longitude)],
+            "zoom": dataset.zoom}
+
+
+def dataset_redirect(name, dataset):
+    """
+    Redirect to a page, keeping the dataset
+    """
+    return redirect(f"{reverse(name)}?dataset={dataset.slug}")
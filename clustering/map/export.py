@@ -0,0 +1,160 @@
+import csv
+import datetime
+import itertools
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from map.models import Point
+from map.clusters import get_clusters_range
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+POINT_FIELDS = ["date", "state", "latitude", "longitude", "municipality", "address"]
+
+CLUSTER_FIELDS = ["date", "cluster", "latitude", "longitude", "num_points", "size"]
+
+if pa is not None:
+    POINT_SCHEMA = pa.schema([("date", pa.date32()),
+                              ("state", pa.int8()),
+                              ("latitude", pa.float64()),
+                              ("longitude", pa.float64()),
+                              ("municipality", pa.string()),
+                              ("address", pa.string())])
+
+    CLUSTER_SCHEMA = pa.schema([("date", pa.date32()),
+                                ("cluster", pa.int32()),
+                                ("latitude", pa.float64()),
+                                ("longitude", pa.float64()),
+                                ("num_points", pa.int32()),
+                                ("size", pa.float64())])
+else:
+    POINT_SCHEMA = CLUSTER_SCHEMA = None
+
+
+def chunks(rows, chunk_size):
+    """
+    Group rows in lists of chunk_size rows
+    """
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def point_rows(dataset, start, end, states, chunk_size=2000):
+    """
+    Points of a dataset between start and end (included) of the given states,
+    read from the database chunk by chunk
+
+    Yields
+    ------
+        row : tuple
+            values of POINT_FIELDS
+    """
+    points = Point.objects.filter(dataset=dataset, date__gte=start, date__lte=end).with_states(states)
+    points = points.order_by('date', 'id')
+    points = points.annotate(lat=Cast('latitude', FloatField()), lng=Cast('longitude', FloatField()))
+
+    return points.values_list('date', 'state', 'lat', 'lng', 'municipality', 'address').iterator(chunk_size=chunk_size)
+
+
+def cluster_rows(dataset, start, end, window=None, workers=1, states=None, batch_days=7):
+    """
+    Clusters of a dataset for every day between start and end (included), one row per cluster.
+    Days are clustered batch_days at a time
+
+    Yields
+    ------
+        row : tuple
+            values of CLUSTER_FIELDS
+    """
+    batch_start = start
+    while batch_start <= end:
+        batch_end = min(batch_start + datetime.timedelta(days=batch_days - 1), end)
+        clusters = get_clusters_range(dataset, batch_start, batch_end, workers, window, states)
+
+        for day in sorted(clusters):
+            centroids, num_points, sizes = clusters[day]
+            for i, (centroid, num, size) in enumerate(zip(centroids, num_points, sizes)):
+                yield day, i, centroid[0], centroid[1], num, size
+
+        batch_start = batch_end + datetime.timedelta(days=1)
+
+
+class Echo():
+    """
+    File-like object that returns what is written instead of storing it,
+    so that csv.writer can be used in a generator
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(header, rows, chunk_size=2000):
+    """
+    Encode rows as CSV
+
+    Yields
+    ------
+        chunk : bytes
+            header, then chunk_size rows at a time
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(header).encode("utf-8")
+
+    for chunk in chunks(rows, chunk_size):
+        yield "".join(writer.writerow(row) for row in chunk).encode("utf-8")
+
+
+class Sink():
+    """
+    File-like object that keeps what is written until it is drained,
+    so that an Arrow writer can be used in a generator
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_arrow(schema, rows, chunk_size=10000):
+    """
+    Encode rows in the Arrow IPC streaming format, one record batch per chunk
+
+    Yields
+    ------
+        chunk : bytes
+            part of the Arrow stream
+    """
+    sink = Sink()
+    writer = pa.ipc.new_stream(sink, schema)
+
+    for chunk in chunks(rows, chunk_size):
+        columns = zip(*chunk)
+        batch = pa.record_batch([pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                                schema=schema)
+        writer.write_batch(batch)
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,160 @@
+import datetime
+import json
+import os
+from django.conf import settings
+from django.db.models import Count
+from map.models import Point
+from map import algorithms
+
+
+def get_series(dataset):
+    """
+    Count the cases of a dataset per day, for each municipality and for the whole city.
+    Days without cases count as 0.
+
+    Parameters
+    ----------
+        dataset : Dataset
+            dataset of the points
+
+    Returns
+    -------
+        series : dict
+            number of cases per day, indexed by municipality (and TOTAL for the city)
+        last_date : date
+            last day of the series, None if there are no points
+    """
+    counts = Point.objects.filter(dataset=dataset).values_list("municipality", "date").annotate(cases=Count("id")).order_by()
+
+    counts = list(counts)
+    if len(counts) == 0:
+        return {}, None
+
+    first_date = min(date for _, date, _ in counts)
+    last_date = max(date for _, date, _ in counts)
+    num_days = (last_date - first_date).days + 1
+
+    series = {algorithms.TOTAL: [0]*num_days}
+    for municipality, date, cases in counts:
+        day = (date - first_date).days
+        series.setdefault(municipality, [0]*num_days)[day] += cases
+        series[algorithms.TOTAL][day] += cases
+
+    return series, last_date
+
+
+def orders_file(dataset):
+    """
+    File of the orders selected for the series of a dataset
+    """
+    return settings.FORECAST_ORDERS_FILE.format(dataset=dataset.slug)
+
+
+def get_orders(dataset):
+    """
+    Read the orders selected for each series of a dataset by the select_orders command
+
+    Returns
+    -------
+        orders : dict
+            (order, seasonal_order) indexed by series name. Empty if no selection was made
+    """
+    try:
+        with open(orders_file(dataset)) as f:
+            selected = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return {name: (tuple(values["order"]), tuple(values["seasonal_order"])) for name, values in selected.items()}
+
+
+def save_orders(dataset, winners):
+    """
+    Store the orders selected for each series of a dataset, so that the forecaster uses them
+
+    Parameters
+    ----------
+        dataset : Dataset
+            dataset of the series
+        winners : dict
+            (order, seasonal_order, aic) indexed by series name
+    """
+    selected = {name: {"order": list(order), "seasonal_order": list(seasonal_order), "aic": aic}
+                for name, (order, seasonal_order, aic) in winners.items()}
+
+    os.makedirs(os.path.dirname(orders_file(dataset)), exist_ok=True)
+    with open(orders_file(dataset), "w") as f:
+        json.dump(selected, f, indent=2)
+
+
+def get_fits(dataset, series, refit=False):
+    """
+    Get the fitted models of the series from the cache of their dataset.
+    If the data changed since the last fit, the new days are applied to the
+    last models, which are only estimated again when needed (see update_state)
+
+    Parameters
+    ----------
+        dataset : Dataset
+            dataset of the series
+        series : dict
+            number of cases per day, indexed by series name
+        refit : bool
+            if True, estimate every model again from scratch
+
+    Returns
+    -------
+        fits : dict
+            fitted models indexed by series name
+        version : str
+            data version of the models
+    """
+    cache = algorithms.ForecastCache(os.path.join(settings.FORECAST_CACHE_DIR, dataset.slug))
+    orders = get_orders(dataset)
+    version = algorithms.series_version(series, orders)
+
+    state = None if refit else cache.load(version)
+    if state is None:
+        latest = None if refit else cache.load_latest()
+
+        if latest is None:
+            state = algorithms.new_state(series, orders, workers=settings.FORECAST_WORKERS)
+        else:
+            state = algorithms.update_state(latest, series, settings.FORECAST_REFIT_EVERY,
+                                            settings.FORECAST_DRIFT_THRESHOLD, orders,
+                                            workers=settings.FORECAST_WORKERS)
+
+        cache.save(version, state)
+
+    return state["fits"], version
+
+
+def get_forecasts(dataset, days):
+    """
+    Forecast the number of cases per municipality and for the whole city
+
+    Parameters
+    ----------
+        dataset : Dataset
+            dataset of the points
+        days : int
+            number of days to forecast
+
+    Returns
+    -------
+        forecasts : dict
+            number of cases per day indexed by series name
+        first_date : date
+            first forecast day, None if there is no data
+        version : str
+            data version of the models
+    """
+    series, last_date = get_series(dataset)
+    if last_date is None:
+        return {}, None, None
+
+    fits, version = get_fits(dataset, series)
+
+    forecasts = algorithms.forecast(fits, days)
+
+    return forecasts, last_date + datetime.timedelta(days=1), version
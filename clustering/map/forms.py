@@ -1,25 +1,33 @@
 from django import forms
-from map.models import Point
+from map.models import Dataset, Point
 
 
-class PointFormCoord(forms.ModelForm):
+class PointForm(forms.ModelForm):
+    """
+    Base form class of the points. The dataset is given by its slug, as in the query strings
+    """
+    dataset = forms.ModelChoiceField(queryset=Dataset.objects.order_by('name'), to_field_name='slug',
+                                     empty_label=None)
+
+
+class PointFormCoord(PointForm):
     """
     Form class if the user wants to define a point with (latitude, longitude) coordinates
     """
     class Meta:
         model = Point
-        fields = ('state', 'latitude', 'longitude', 'date')
+        fields = ('dataset', 'state', 'latitude', 'longitude', 'date')
         
         widgets = {}
         
 
-class PointFormAddr(forms.ModelForm):
+class PointFormAddr(PointForm):
     """
     Form class if the user wants to define a point with an address
     """
     class Meta:
         model = Point
-        fields = ('state', 'address', 'date')
+        fields = ('dataset', 'state', 'address', 'date')
         
         widgets = {}
         
@@ -33,4 +41,4 @@ class GeneratePointsForm(forms.ModelForm):
         model = Point
         fields = ('date',)
         
-        widgets = {}
\ No newline at end of file
+        widgets = {}
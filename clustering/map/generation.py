@@ -0,0 +1,46 @@
+import datetime
+from map.models import Point
+from map import algorithms
+
+
+def generate_range(dataset, start, end, seed, workers=1, window=10):
+    """
+    Generate points for every day between start and end (included),
+    and insert them in the database in a single transaction
+
+    Parameters
+    ----------
+        dataset : Dataset
+            dataset of the points, whose municipality data is used
+        start : date
+            first day for which to generate
+        end : date
+            last day for which to generate
+        seed : int
+            seed of the run, so that results are reproducible
+        workers : int
+            number of processes used to generate the municipalities
+        window : int
+            number of past days used to center the new points
+
+    Returns
+    -------
+        num_points : int
+            number of generated points
+    """
+    # Load the points of the first window, and the existing points of the range, once
+    past_points = Point.objects.filter(dataset=dataset, date__gte=start - datetime.timedelta(days=window),
+                                       date__lte=end)
+    past_points = past_points.values_list("municipality", "date", "latitude", "longitude")
+
+    generator = algorithms.BulkPointGenerator(past_points, start, end, seed, window=window,
+                                              data=dataset.municipality_data())
+    new_points = generator.generate(workers=workers)
+
+    # Generated points are not geocoded: one request per second would take hours
+    rows = ((Point.POSITIVE, coords[0], coords[1], "Unknown", municipality, date)
+            for coords, municipality, date in new_points)
+
+    Point.objects.bulk_create_points(rows, dataset.pk)
+
+    return len(new_points)
@@ -0,0 +1,126 @@
+import asyncio
+from django.conf import settings
+from map import metrics
+
+
+def get_geolocator(**kwargs):
+    """
+    Nominatim geolocator, on the server given in the settings
+    (the public server by default, a local stub for load tests)
+
+    Parameters
+    ----------
+        kwargs
+            other arguments of the geolocator (e.g. adapter_factory)
+    """
+    # geopy is only loaded by the views that geocode
+    import geopy as gp
+
+    return gp.Nominatim(user_agent=settings.GEOCODER_USER_AGENT,
+                        domain=settings.GEOCODER_DOMAIN,
+                        scheme=settings.GEOCODER_SCHEME,
+                        **kwargs)
+
+
+def rate_limited(function):
+    """
+    Wrap a geocoding function so that it waits GEOCODER_MIN_DELAY seconds between calls
+    """
+    from geopy.extra.rate_limiter import RateLimiter
+
+    return RateLimiter(function, min_delay_seconds=settings.GEOCODER_MIN_DELAY)
+
+
+def get_municipality(raw):
+    """
+    Name of the municipality in the raw answer of Nominatim, "Unknown" if there is none
+    """
+    for name in ["town", "village", "municipality"]:
+        if name in raw["address"]:
+            return raw["address"][name]
+    return "Unknown"
+
+
+class AsyncGeocoder():
+    """
+    Nominatim client for the async views (requires aiohttp).
+    Requests share one HTTP session, so connections are reused.
+    At most max_concurrency requests are sent at a time, and min_delay seconds
+    separate the start of any two requests, reverse or not
+    """
+
+    def __init__(self, min_delay=None, max_concurrency=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            min_delay : float, optional
+                minimum time between two requests (in seconds), GEOCODER_MIN_DELAY by default
+            max_concurrency : int, optional
+                maximum number of requests in progress, GEOCODER_MAX_CONCURRENCY by default
+        """
+        from geopy.adapters import AioHTTPAdapter
+
+        self.geolocator = get_geolocator(adapter_factory=AioHTTPAdapter)
+        self.min_delay = settings.GEOCODER_MIN_DELAY if min_delay is None else min_delay
+        self.semaphore = asyncio.Semaphore(max_concurrency or settings.GEOCODER_MAX_CONCURRENCY)
+        self.lock = asyncio.Lock()
+        self.last_start = None
+
+    async def wait_turn(self):
+        """
+        Wait until min_delay seconds have passed since the start of the previous request
+        """
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            if self.last_start is not None:
+                delay = self.last_start + self.min_delay - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self.last_start = loop.time()
+
+    async def call(self, function, query):
+        async with self.semaphore:
+            await self.wait_turn()
+
+            start = asyncio.get_running_loop().time()
+            try:
+                return await function(query)
+            finally:
+                metrics.registry.observe("stc_stage_seconds", asyncio.get_running_loop().time() - start,
+                                         stage="geocode")
+
+    async def geocode(self, address):
+        return await self.call(self.geolocator.geocode, address)
+
+    async def reverse(self, coords):
+        return await self.call(self.geolocator.reverse, coords)
+
+    async def close(self):
+        await self.geolocator.__aexit__(None, None, None)
+
+
+# Geocoder of the event loop serving the async views
+_async_geocoder = None
+
+
+def get_async_geocoder():
+    """
+    Geocoder shared by the async views, so that its limits apply to all of them.
+    Created on first use in the running event loop
+    """
+    global _async_geocoder
+    if _async_geocoder is None:
+        _async_geocoder = AsyncGeocoder()
+    return _async_geocoder
+
+
+async def close_async_geocoder():
+    """
+    Close the connections of the shared geocoder, at the end of the event loop
+    """
+    global _async_geocoder
+    if _async_geocoder is not None:
+        await _async_geocoder.close()
+        _async_geocoder = None
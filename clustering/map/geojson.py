@@ -0,0 +1,95 @@
+# Features are written with a fixed template instead of building one dict per feature,
+# and coordinates are numbers instead of strings
+POINT_TEMPLATE = ('{"type":"Feature","properties":{"state":%d,"date":"%s"},'
+                  '"geometry":{"type":"Point","coordinates":[%.5f,%.5f]}}')
+
+CENTROID_TEMPLATE = ('{"type":"Feature","properties":{"size":%.6f,"numPoints":%d},'
+                     '"geometry":{"type":"Point","coordinates":[%.6f,%.6f]}}')
+
+HEADER = b'{"type":"FeatureCollection","features":['
+FOOTER = b']}'
+
+
+def stream_features(features, chunk_size):
+    """
+    Wrap encoded features in a FeatureCollection, yielding chunks of features
+
+    Parameters
+    ----------
+        features : iterable
+            encoded features (str)
+        chunk_size : int
+            number of features per chunk
+
+    Yields
+    ------
+        chunk : bytes
+            part of the GeoJSON document
+    """
+    yield HEADER
+
+    chunk = []
+    first = True
+    for feature in features:
+        chunk.append(feature)
+        if len(chunk) == chunk_size:
+            yield (("" if first else ",") + ",".join(chunk)).encode("utf-8")
+            first = False
+            chunk = []
+
+    if chunk:
+        yield (("" if first else ",") + ",".join(chunk)).encode("utf-8")
+
+    yield FOOTER
+
+
+def stream_points(columns, chunk_size=5000):
+    """
+    Encode points as a GeoJSON FeatureCollection
+
+    Parameters
+    ----------
+        columns : PointColumns
+            points to encode
+        chunk_size : int
+            number of features per chunk
+
+    Yields
+    ------
+        chunk : bytes
+            part of the GeoJSON document
+    """
+    def features():
+        for start in range(0, len(columns), chunk_size):
+            part = columns.take(slice(start, start + chunk_size))
+            for state, date, lat, lng in zip(part.state.tolist(), part.dates().tolist(),
+                                             part.latitude.tolist(), part.longitude.tolist()):
+                yield POINT_TEMPLATE % (state, date, lng, lat)
+
+    return stream_features(features(), chunk_size)
+
+
+def stream_centroids(centroids, num_points, sizes, chunk_size=5000):
+    """
+    Encode cluster centroids as a GeoJSON FeatureCollection
+
+    Parameters
+    ----------
+        centroids : list
+            (lat, lng) centroids of clusters
+        num_points : list
+            number of points in clusters
+        sizes : list
+            sizes of clusters (in kilometers)
+        chunk_size : int
+            number of features per chunk
+
+    Yields
+    ------
+        chunk : bytes
+            part of the GeoJSON document
+    """
+    features = (CENTROID_TEMPLATE % (size, num, centroid[1], centroid[0])
+                for centroid, num, size in zip(centroids, num_points, sizes))
+
+    return stream_features(features, chunk_size)
@@ -0,0 +1,216 @@
+import datetime
+import struct
+import zlib
+import numpy as np
+from django.conf import settings
+from map import algorithms, metrics, store
+from map.algorithms.columns import EPOCH
+from map.models import states_key
+
+# Color ramp of the heat layer: (value relative to the maximum of the grid, RGBA)
+COLOR_STOPS = [(0.0, (255, 255, 178, 0)),
+               (0.05, (255, 255, 178, 90)),
+               (0.25, (254, 204, 92, 150)),
+               (0.5, (253, 141, 60, 190)),
+               (0.75, (240, 59, 32, 215)),
+               (1.0, (189, 0, 38, 235))]
+
+COLORS = np.stack([np.interp(np.linspace(0, 1, 256), [stop for stop, color in COLOR_STOPS],
+                             [color[channel] for stop, color in COLOR_STOPS])
+                   for channel in range(4)], axis=1).astype(np.uint8)
+
+# Bounding boxes and density estimators of the datasets, computed once per process
+_bboxes = {}
+_kdes = {}
+
+
+def get_bbox(dataset):
+    """
+    Bounding box of the heatmap grid of a dataset: HEATMAP_BBOX[slug],
+    or the box around the municipality circles
+
+    Parameters
+    ----------
+        dataset : Dataset
+            dataset of the grid
+
+    Returns
+    -------
+        bbox : tuple
+            (min_lng, min_lat, max_lng, max_lat)
+    """
+    if dataset.pk not in _bboxes:
+        if dataset.slug in settings.HEATMAP_BBOX:
+            bbox = tuple(settings.HEATMAP_BBOX[dataset.slug])
+        else:
+            locator = algorithms.MunicipalityLocator(dataset.municipality_data()[1])
+            lat, lng = np.degrees(locator.centers[:, 0]), np.degrees(locator.centers[:, 1])
+            dlat = np.degrees(locator.radii/locator.R)
+            dlng = dlat/np.cos(locator.centers[:, 0])
+            bbox = (float(np.min(lng - dlng)), float(np.min(lat - dlat)),
+                    float(np.max(lng + dlng)), float(np.max(lat + dlat)))
+        _bboxes[dataset.pk] = bbox
+    return _bboxes[dataset.pk]
+
+
+def grid_shape(bbox, size):
+    """
+    Rows and columns of a grid with size cells along its longest side, and square cells
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    height = max_lat - min_lat
+    width = (max_lng - min_lng)*np.cos(np.radians((min_lat + max_lat)/2))
+
+    if height >= width:
+        return size, max(int(round(size*width/height)), 1)
+    return max(int(round(size*height/width)), 1), size
+
+
+def get_kde(dataset):
+    """
+    Density estimator of a dataset, with the parameters of its clusters
+    """
+    key = (dataset.pk, dataset.cluster_prop, dataset.cluster_eps)
+    if key not in _kdes:
+        bbox = get_bbox(dataset)
+        _kdes[key] = algorithms.SpaceTimeKDE(bbox, grid_shape(bbox, settings.HEATMAP_GRID_SIZE),
+                                             prop=dataset.cluster_prop, bandwidth=dataset.cluster_eps)
+    return _kdes[key]
+
+
+def cache_key(dataset, day, window, version, states):
+    return (f"heatmap:{dataset.pk}:{dataset.cluster_prop}:{dataset.cluster_eps}:{day}:{window}:{version}:"
+            f"{states_key(states)}")
+
+
+def get_grid(dataset, request_date, window, version, states):
+    """
+    Density grid of the window of a date, from the store of the process
+    or computed from its points. Grids are stored as float16
+
+    Parameters
+    ----------
+        dataset : Dataset
+            dataset of the points
+        request_date : date
+            last day of the window
+        window : int
+            length of the window, in days
+        version : int
+            version of the window
+        states : set
+            states of the points
+
+    Returns
+    -------
+        grid : numpy array
+            (rows, cols) density, from north to south and from west to east
+    """
+    points_store = store.for_dataset(dataset.pk)
+    key = cache_key(dataset, request_date, window, version, states)
+    grid = points_store.get_clusters([key]).get(key)
+    metrics.cache_lookup("heatmap", int(grid is not None), int(grid is None))
+
+    if grid is None:
+        with metrics.timer("heatmap"):
+            columns = store.get_window(dataset.pk, request_date, window, states=states)
+            grid = get_kde(dataset).density(columns, (request_date - EPOCH).days).astype(np.float16)
+
+        points_store.set_clusters({key: (request_date - datetime.timedelta(days=window), request_date, grid)})
+
+    return grid
+
+
+def tile_values(grid, bbox, z, x, y, size):
+    """
+    Values of the grid at the pixels of a map tile (nearest cell), 0 outside of the grid
+
+    Parameters
+    ----------
+        grid : numpy array
+            density grid
+        bbox : tuple
+            (min_lng, min_lat, max_lng, max_lat) of the grid
+        z : int
+            zoom level of the tile
+        x : int
+            column of the tile
+        y : int
+            row of the tile
+        size : int
+            number of pixels per tile side
+
+    Returns
+    -------
+        values : numpy array
+            (size, size) values, from north to south and from west to east
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    rows, cols = grid.shape
+
+    # Centers of the pixels, in Web Mercator coordinates normalized to [0, 1) (see tiles.mercator)
+    pixels = (np.arange(size) + 0.5)/size
+    lng = (x + pixels)/2**z*360 - 180
+    lat = np.degrees(np.arctan(np.sinh(np.pi*(1 - 2*(y + pixels)/2**z))))
+
+    row = np.floor((max_lat - lat)/(max_lat - min_lat)*rows).astype(np.int64)
+    col = np.floor((lng - min_lng)/(max_lng - min_lng)*cols).astype(np.int64)
+    row_inside = (row >= 0) & (row < rows)
+    col_inside = (col >= 0) & (col < cols)
+
+    values = np.zeros((size, size), dtype=grid.dtype)
+    values[np.ix_(row_inside, col_inside)] = grid[np.ix_(row[row_inside], col[col_inside])]
+    return values
+
+
+def colorize(values, scale):
+    """
+    RGBA image of values, with the color ramp of the heat layer
+
+    Parameters
+    ----------
+        values : numpy array
+            (height, width) values
+        scale : float
+            value shown with the last color
+
+    Returns
+    -------
+        image : numpy array
+            (height, width, 4) uint8 image
+    """
+    if scale <= 0:
+        return np.zeros(values.shape + (4,), dtype=np.uint8)
+
+    levels = np.clip(values.astype(np.float32)/scale*255, 0, 255).astype(np.uint8)
+    return COLORS[levels]
+
+
+def encode_png(image, level=6):
+    """
+    Encode an RGBA image as PNG, with zlib alone
+
+    Parameters
+    ----------
+        image : numpy array
+            (height, width, 4) uint8 image
+        level : int
+            zlib compression level
+
+    Returns
+    -------
+        data : bytes
+            PNG file
+    """
+    height, width = image.shape[:2]
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    # Each row starts with its filter type (0, none)
+    rows = np.hstack([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, width*4)])
+
+    return b"".join([b"\x89PNG\r\n\x1a\n",
+                     chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)),
+                     chunk(b"IDAT", zlib.compress(rows.tobytes(), level)),
+                     chunk(b"IEND", b"")])
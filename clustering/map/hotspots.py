@@ -0,0 +1,179 @@
+import datetime
+import numpy as np
+from django.conf import settings
+from django.db.models import Count
+from map import algorithms, metrics, store
+from map.algorithms.columns import EPOCH
+from map.models import DataVersion, Point, default_states, states_key
+
+# Official figures below 5 are published as "<5" (same value as cases_for_date)
+LOW_CASES = 3
+
+# Smallest expected cases of a municipality on a day: with 0, a single case
+# would make every cylinder containing it infinitely unlikely
+MIN_EXPECTED = 0.5
+
+
+def official_expected(cases_data, municipalities, start, num_days):
+    """
+    Expected cases per municipality and per day, from the official figures.
+    Raise ValueError if a day has no figures
+
+    Parameters
+    ----------
+        cases_data : DataFrame
+            number of cases per day and per municipality, as read by load_municipality_data
+        municipalities : list
+            names of the municipalities
+        start : date
+            first day
+        num_days : int
+            number of days
+
+    Returns
+    -------
+        expected : numpy array
+            (municipalities, days) cases
+    """
+    days = [str(start + datetime.timedelta(days=i)) for i in range(num_days)]
+
+    cases = cases_data.assign(CASES=cases_data["CASES"].replace("<5", LOW_CASES).astype(float))
+    table = cases.pivot_table(index="TX_DESCR_FR", columns="DATE", values="CASES", aggfunc="sum")
+    table = table.reindex(index=municipalities, columns=days)
+
+    missing = [day for day in days if table[day].isna().all()]
+    if missing:
+        raise ValueError(f"No official figures for {len(missing)} days, from {missing[0]}")
+
+    return np.maximum(table.fillna(0).to_numpy(), MIN_EXPECTED)
+
+
+def observed_counts(counts, unknown, locator, start, num_days):
+    """
+    Points per municipality and per day. Points are counted in their stored municipality,
+    the circles only locate the points whose municipality is not one of the locator
+    ("Unknown" when they were not geocoded, or a name spelled differently by the geocoder):
+    circles overlap, and would move points to a neighbouring municipality.
+    Points outside every municipality are left out
+
+    Parameters
+    ----------
+        counts : iterable
+            (municipality, date, number of points) of the points of the municipalities of the locator
+        unknown : PointColumns
+            other points
+        locator : MunicipalityLocator
+            municipalities
+        start : date
+            first day
+        num_days : int
+            number of days
+
+    Returns
+    -------
+        observed : numpy array
+            (municipalities, days) points
+    """
+    index = {name: i for i, name in enumerate(locator.names)}
+    observed = np.zeros((len(index), num_days), dtype=np.int64)
+
+    for municipality, day, count in counts:
+        i, t = index.get(municipality, -1), (day - start).days
+        if i >= 0 and 0 <= t < num_days:
+            observed[i, t] += count
+
+    municipality = np.asarray([index.get(name, -1) for name in locator.locate(unknown.latitude, unknown.longitude)],
+                              dtype=np.int64)
+    day = unknown.day.astype(np.int64) - (start - EPOCH).days
+
+    keep = (municipality >= 0) & (day >= 0) & (day < num_days)
+    np.add.at(observed, (municipality[keep], day[keep]), 1)
+    return observed
+
+
+def point_counts(dataset, start, end, states, names):
+    """
+    Points of a dataset between start and end (included), as read by observed_counts:
+    number of points per day of the municipalities of names, and the other points
+    """
+    points = Point.objects.filter(dataset=dataset, date__gte=start, date__lte=end).with_states(states)
+
+    counts = (points.filter(municipality__in=names).order_by()
+              .values_list('municipality', 'date').annotate(count=Count('id')))
+    unknown = points.exclude(municipality__in=names).columns()
+
+    return list(counts), unknown
+
+
+def cache_key(dataset, start, end, version, replicates, prospective, seed, states):
+    return (f"hotspots:{dataset.pk}:{start}:{end}:{version}:{states_key(states)}:{settings.HOTSPOT_MAX_DAYS}:{settings.HOTSPOT_MAX_POPULATION}:"
+            f"{replicates}:{int(prospective)}:{seed}")
+
+
+def get_hotspots(dataset, start, end, replicates, workers=1, prospective=False, seed=0, states=None):
+    """
+    Space-time clusters of the points between start and end (included), against the official figures.
+    Results are stored until the points of the range change
+
+    Parameters
+    ----------
+        dataset : Dataset
+            dataset of the points and of the official figures
+        start : date
+            first day
+        end : date
+            last day
+        replicates : int
+            number of Monte Carlo replicates
+        workers : int
+            number of processes running the replicates
+        prospective : bool
+            only look for clusters still going on at the end of the range
+        seed : int
+            seed of the replicates
+        states : set, optional
+            states of the points counted as cases. By default, settings.DEFAULT_STATES
+
+    Returns
+    -------
+        hotspots : list
+            clusters, from the most likely: municipalities, first and last days, observed and
+            expected cases, relative risk, log likelihood ratio, p-value and significance
+    """
+    if states is None:
+        states = default_states()
+
+    points_store = store.for_dataset(dataset.pk)
+    version = DataVersion.objects.window_version(dataset.pk, start, end)[0]
+    key = cache_key(dataset, start, end, version, replicates, prospective, seed, states)
+    hotspots = points_store.get_clusters([key]).get(key)
+    metrics.cache_lookup("hotspots", int(hotspots is not None), int(hotspots is None))
+    if hotspots is not None:
+        return hotspots
+
+    num_days = (end - start).days + 1
+    cases_data, circles_data = dataset.municipality_data()
+    locator = algorithms.MunicipalityLocator(circles_data)
+
+    expected = official_expected(cases_data, list(locator.names), start, num_days)
+    counts = observed_counts(*point_counts(dataset, start, end, states, list(locator.names)),
+                             locator, start, num_days)
+
+    with metrics.timer("scan"):
+        clusters = algorithms.scan_statistic(counts, expected, locator.centers, replicates, workers, seed,
+                                             max_days=settings.HOTSPOT_MAX_DAYS,
+                                             max_population=settings.HOTSPOT_MAX_POPULATION,
+                                             prospective=prospective)
+
+    hotspots = []
+    for cluster in clusters:
+        p_value = cluster.get("p_value")
+        hotspots.append(dict(cluster,
+                             municipalities=[locator.names[i] for i in cluster["municipalities"]],
+                             first=str(start + datetime.timedelta(days=cluster["first"])),
+                             last=str(start + datetime.timedelta(days=cluster["last"])),
+                             p_value=p_value,
+                             significant=p_value is not None and p_value <= settings.HOTSPOT_ALPHA))
+
+    points_store.set_clusters({key: (start, end, hotspots)})
+    return hotspots
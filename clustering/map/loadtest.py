@@ -0,0 +1,377 @@
+import hashlib
+import http.cookiejar
+import json
+import re
+import socketserver
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+import numpy as np
+from map.algorithms.municipalities import MunicipalityLocator
+
+# Area where new cases are created
+MIN_LAT, MAX_LAT = 50.79, 50.90
+MIN_LNG, MAX_LNG = 4.28, 4.45
+
+PERCENTILES = (50, 95, 99)
+
+
+class NominatimStub(BaseHTTPRequestHandler):
+    """
+    Local replacement of a Nominatim server, answering /search and /reverse
+    with addresses whose municipality comes from the municipality circles,
+    after a delay simulating a slow server
+    """
+    locator = None
+    delay = 0
+
+    def do_GET(self):
+        time.sleep(self.delay)
+
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+
+        if url.path.startswith("/reverse"):
+            lat, lng = [float(value) for value in query["lat"] + query["lon"]]
+            body = self.place(lat, lng)
+        elif url.path.startswith("/search"):
+            # Same address, same place
+            digest = hashlib.sha1(query["q"][0].encode("utf-8")).digest()
+            lat = MIN_LAT + (MAX_LAT - MIN_LAT)*digest[0]/255
+            lng = MIN_LNG + (MAX_LNG - MIN_LNG)*digest[1]/255
+            body = [self.place(lat, lng)]
+        else:
+            self.send_error(404)
+            return
+
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def place(self, lat, lng):
+        town = self.locator.locate(np.asarray([lat]), np.asarray([lng]))[0]
+        return {"lat": str(lat), "lon": str(lng),
+                "display_name": f"1 Rue de la Charge, {town}, Belgique",
+                "address": {"road": "Rue de la Charge", "town": town, "country": "Belgique"}}
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_in_thread(server):
+    """
+    Serve in a background thread
+
+    Returns
+    -------
+        url : str
+            base URL of the server
+    """
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def start_stub(locator=None, delay=0):
+    """
+    Start a Nominatim stub on a free local port, answering after delay seconds
+
+    Returns
+    -------
+        server : ThreadingHTTPServer
+            stub server, to shut down at the end
+        address : str
+            host:port of the stub
+    """
+    NominatimStub.locator = locator or MunicipalityLocator()
+    NominatimStub.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NominatimStub)
+    start_in_thread(server)
+    return server, "%s:%d" % server.server_address[:2]
+
+
+def start_wsgi(application):
+    """
+    Serve a WSGI application on a free local port, one thread per request
+
+    Returns
+    -------
+        server : WSGIServer
+            server, to shut down at the end
+        url : str
+            base URL of the server
+    """
+    server = make_server("127.0.0.1", 0, application, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    return server, start_in_thread(server)
+
+
+class ASGIServer():
+    """
+    ASGI server (uvicorn) running in a background thread
+    """
+
+    def __init__(self, server, thread):
+        self.server = server
+        self.thread = thread
+
+    def shutdown(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def start_asgi(application):
+    """
+    Serve an ASGI application with uvicorn on a free local port
+
+    Returns
+    -------
+        server : ASGIServer
+            server, to shut down at the end
+        url : str
+            base URL of the server
+    """
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(application, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    host, port = server.servers[0].sockets[0].getsockname()[:2]
+    return ASGIServer(server, thread), f"http://{host}:{port}"
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """
+    Measure the POST of a form alone, not the page it redirects to
+    """
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class User():
+    """
+    Virtual user of the map, with its own cookies
+    """
+
+    def __init__(self, base_url, dataset, dates, popular, rng, think_time):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            base_url : str
+                URL of the server
+            dataset : str
+                slug of the dataset of the requests
+            dates : list
+                dates with data
+            popular : list
+                dates requested by many users
+            rng : numpy Generator
+                random generator of the user
+            think_time : float
+                mean time between two actions (in seconds)
+        """
+        self.base_url = base_url
+        self.dataset = dataset
+        self.dates = dates
+        self.popular = popular
+        self.rng = rng
+        self.think_time = think_time
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+                                                  NoRedirect)
+        self.latencies = {}
+        self.errors = {}
+
+    def request(self, endpoint, path, data=None, expected=None):
+        """
+        Send a request and record its latency under the endpoint name
+
+        Parameters
+        ----------
+            endpoint : str
+                name of the endpoint in the report
+            path : str
+                path of the URL
+            data : bytes
+                body of a POST request
+            expected : int
+                only status counted as a success, by default any status below 400
+
+        Returns
+        -------
+            body : bytes or None
+                content of the response, None if the request failed
+        """
+        start = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path, data=data, timeout=60) as response:
+                body = response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            status = e.code
+        except OSError:
+            status = None
+
+        if status is None or status >= 400 or (expected is not None and status != expected):
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return None
+
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        return body
+
+    def page_date(self, date):
+        return date.strftime("%m-%d-%Y")
+
+    def scrub(self):
+        """
+        Open the cluster map on a date, then step through the following days
+        like the date control of the map does
+        """
+        start = int(self.rng.integers(len(self.dates)))
+        self.request("ClusterView", f"/clusters/date/{self.page_date(self.dates[start])}?dataset={self.dataset}")
+
+        for date in self.dates[start + 1:start + 1 + int(self.rng.integers(3, 10))]:
+            self.request("api/clusters", f"/api/clusters?date={date}&dataset={self.dataset}")
+            self.pause(0.2)
+
+    def popular_date(self):
+        """
+        Open a map on one of the popular dates (Zipf distribution)
+        """
+        rank = min(int(self.rng.zipf(1.5)), len(self.popular)) - 1
+        date = self.popular[rank]
+
+        if self.rng.uniform() < 0.5:
+            self.request("ClusterView", f"/clusters/date/{self.page_date(date)}?dataset={self.dataset}")
+        else:
+            self.request("PointView", f"/points/date/{self.page_date(date)}?dataset={self.dataset}")
+            self.request("api/points", f"/api/points?date={date}&dataset={self.dataset}")
+
+    def insert_burst(self):
+        """
+        Register several cases in a row, mostly with coordinates
+        """
+        for _ in range(int(self.rng.integers(3, 10))):
+            date = self.dates[-1 - int(self.rng.integers(min(3, len(self.dates))))]
+
+            if self.rng.uniform() < 0.8:
+                self.post_form("new_coord", "/new_coord/",
+                               {"dataset": self.dataset, "state": 1, "date": date,
+                                "latitude": f"{self.rng.uniform(MIN_LAT, MAX_LAT):.5f}",
+                                "longitude": f"{self.rng.uniform(MIN_LNG, MAX_LNG):.5f}"})
+            else:
+                self.post_form("new_addr", "/new_addr/",
+                               {"dataset": self.dataset, "state": 1, "date": date,
+                                "address": f"{int(self.rng.integers(1, 200))} Rue de la Loi, Bruxelles"})
+
+    def post_form(self, endpoint, path, fields):
+        """
+        Fill a form like a browser: read the page for its CSRF token, then post it.
+        Only the redirection after a stored point is a success, a form shown again is an error
+        """
+        page = self.request(endpoint + " (form)", path)
+        if page is None:
+            return
+
+        token = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', page)
+        fields = dict(fields, csrfmiddlewaretoken=token.group(1).decode() if token else "")
+        self.request(endpoint, path, urllib.parse.urlencode(fields).encode(), expected=302)
+
+    def pause(self, scale=1):
+        if self.think_time > 0:
+            time.sleep(self.rng.exponential(self.think_time*scale))
+
+    def run(self, deadline, mix):
+        """
+        Act until the deadline, choosing each action according to the traffic mix
+        """
+        actions = [self.scrub, self.popular_date, self.insert_burst]
+        weights = np.asarray([mix["scrub"], mix["popular"], mix["insert"]], dtype=float)
+
+        while time.monotonic() < deadline:
+            actions[self.rng.choice(len(actions), p=weights/weights.sum())]()
+            self.pause()
+
+        return self
+
+
+def run_load(base_url, dataset, dates, users, duration, mix, think_time=0.5, num_popular=5, seed=0):
+    """
+    Drive the server with concurrent virtual users
+
+    Parameters
+    ----------
+        base_url : str
+            URL of the server
+        dataset : str
+            slug of the dataset of the requests
+        dates : list
+            dates with data, sorted
+        users : int
+            number of concurrent users
+        duration : float
+            duration of the test (in seconds)
+        mix : dict
+            relative weights of the "scrub", "popular" and "insert" actions
+        think_time : float
+            mean time between two actions of a user (in seconds)
+        num_popular : int
+            number of popular dates
+        seed : int
+            seed of the run
+
+    Returns
+    -------
+        report : dict
+            count, errors, throughput and latency percentiles, indexed by endpoint
+    """
+    rng = np.random.default_rng(seed)
+    popular = [dates[i] for i in rng.choice(len(dates), size=min(num_popular, len(dates)), replace=False)]
+
+    start = time.monotonic()
+    deadline = start + duration
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        futures = [executor.submit(User(base_url, dataset, dates, popular, np.random.default_rng([seed, i]), think_time).run,
+                                   deadline, mix)
+                   for i in range(users)]
+        done = [future.result() for future in futures]
+    elapsed = time.monotonic() - start
+
+    latencies, errors = {}, {}
+    for user in done:
+        for endpoint, values in user.latencies.items():
+            latencies.setdefault(endpoint, []).extend(values)
+        for endpoint, count in user.errors.items():
+            errors[endpoint] = errors.get(endpoint, 0) + count
+
+    report = {}
+    for endpoint in sorted(set(latencies) | set(errors)):
+        values = np.asarray(latencies.get(endpoint, []))
+        report[endpoint] = {"count": len(values),
+                            "errors": errors.get(endpoint, 0),
+                            "throughput": len(values)/elapsed}
+        for percentile in PERCENTILES:
+            report[endpoint][f"p{percentile}"] = float(np.percentile(values, percentile)) if len(values) else None
+
+    return report
@@ -0,0 +1,93 @@
+import datetime
+import json
+import os
+import platform
+import subprocess
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from map import benchmarks
+
+
+def current_commit():
+    """
+    Hash of the current git commit, with a "-dirty" suffix if there are uncommitted changes
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if status else "")
+
+
+class Command(BaseCommand):
+    """
+    Measure the hot paths of clustering, generation and forecasting at several input sizes
+    """
+    help = "Run the benchmark suite, store its results per commit, and flag regressions against a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*",
+                            help=f"benchmarks to run, among {', '.join(benchmarks.NAMES)} (all by default)")
+        parser.add_argument("--sizes", type=int, nargs="+", default=benchmarks.SIZES, help="input sizes")
+        parser.add_argument("--max-quadratic-size", type=int, default=3*10**3,
+                            help="maximum size of the clustering benchmarks, whose memory is quadratic")
+        parser.add_argument("--repeat", type=int, default=3, help="number of timed runs of each measure")
+        parser.add_argument("--output-dir", default=settings.BENCHMARK_DIR, help="directory of the results")
+        parser.add_argument("--baseline", help="results to compare with (default: baseline.json in the output "
+                                               "directory, if it exists)")
+        parser.add_argument("--threshold", type=float, default=0.2,
+                            help="relative increase of time or memory reported as a regression")
+        parser.add_argument("--save-baseline", action="store_true", help="use these results as the new baseline")
+
+    def handle(self, *args, **options):
+        unknown = [name for name in options["names"] if name not in benchmarks.NAMES]
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(unknown)}")
+
+        commit = current_commit()
+        results = benchmarks.run(options["names"] or None, options["sizes"], options["max_quadratic_size"],
+                                 options["repeat"], log=self.stdout.write)
+
+        run = {"commit": commit,
+               "date": datetime.datetime.now().isoformat(timespec="seconds"),
+               "python": platform.python_version(),
+               "machine": platform.machine(),
+               "results": results}
+
+        os.makedirs(options["output_dir"], exist_ok=True)
+        path = os.path.join(options["output_dir"], f"{commit}.json")
+        with open(path, "w") as f:
+            json.dump(run, f, indent=2)
+        self.stdout.write(f"Results written to {path}")
+
+        # The scientific libraries are loaded on first use (or by the warm-up after fork), never at import
+        heavy = results.get("startup", {}).get("0", {}).get("heavy_modules")
+        if heavy:
+            raise CommandError(f"Startup imports {', '.join(heavy)}")
+
+        baseline_path = options["baseline"] or os.path.join(options["output_dir"], "baseline.json")
+        if options["save_baseline"]:
+            with open(os.path.join(options["output_dir"], "baseline.json"), "w") as f:
+                json.dump(run, f, indent=2)
+            self.stdout.write("Saved as baseline")
+            return
+
+        if not os.path.exists(baseline_path):
+            if options["baseline"]:
+                raise CommandError(f"Baseline {baseline_path} not found")
+            return
+
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        regressions = benchmarks.compare(results, baseline["results"], options["threshold"])
+        for name, size, metric, before, after in regressions:
+            self.stdout.write(f"REGRESSION {name} {size} {metric}: {before:.4g} -> {after:.4g} "
+                              f"(+{100*(after/before - 1):.0f}%)")
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} regressions against {baseline['commit']}")
+        self.stdout.write(f"No regression against {baseline['commit']}")
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from map.models import Dataset
+from map.shared import SharedPointStore
+
+
+class Command(BaseCommand):
+    """
+    Remove the shared memory segments of the point store.
+    They outlive the server, until the machine reboots
+    """
+    help = "Remove the points and clusters published in shared memory"
+
+    def handle(self, *args, **options):
+        for dataset in Dataset.objects.values_list('id', flat=True):
+            SharedPointStore(dataset, settings.SHARED_MEMORY_DIR, settings.SHARED_MEMORY_PREFIX).clear()
+        self.stdout.write("Shared point store cleared")
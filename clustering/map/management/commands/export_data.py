@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from map import export
+from map.management.commands.generate_points import parse_dataset, parse_date, parse_state_list
+
+
+class Command(BaseCommand):
+    """
+    Export points or cluster summaries of a date range, in constant memory
+    """
+    help = "Export the points or the clusters of every day of a date range, as CSV or Arrow IPC"
+
+    def add_arguments(self, parser):
+        parser.add_argument("data", choices=["points", "clusters"], help="data to export")
+        parser.add_argument("start", type=parse_date, help="first day (YYYY-MM-DD)")
+        parser.add_argument("end", type=parse_date, help="last day, included (YYYY-MM-DD)")
+        parser.add_argument("--dataset", type=parse_dataset, default=settings.DEFAULT_DATASET,
+                            help="slug of the dataset")
+        parser.add_argument("--states", type=parse_state_list, default=",".join(settings.DEFAULT_STATES),
+                            help="states of the points (e.g. positive,recovered, or all)")
+        parser.add_argument("--output", required=True, help="output file (.csv, or .arrows for Arrow IPC)")
+        parser.add_argument("--window", type=int, default=settings.WINDOW_DAYS,
+                            help="number of past days clustered with each day")
+        parser.add_argument("--workers", type=int, default=1, help="number of processes used for clustering")
+
+    def handle(self, *args, **options):
+        if options["end"] < options["start"]:
+            raise CommandError("End date is before start date")
+
+        output = options["output"]
+        if not output.endswith((".csv", ".arrows")):
+            raise CommandError("Output file must be .csv or .arrows")
+        if output.endswith(".arrows") and export.pa is None:
+            raise CommandError("pyarrow is required for .arrows files")
+
+        if options["data"] == "points":
+            rows = export.point_rows(options["dataset"], options["start"], options["end"], options["states"])
+            header = export.POINT_FIELDS
+            schema = export.POINT_SCHEMA
+        else:
+            rows = export.cluster_rows(options["dataset"], options["start"], options["end"], options["window"],
+                                       options["workers"], options["states"])
+            header = export.CLUSTER_FIELDS
+            schema = export.CLUSTER_SCHEMA
+
+        if output.endswith(".csv"):
+            chunks = export.stream_csv(header, rows)
+        else:
+            chunks = export.stream_arrow(schema, rows)
+
+        size = 0
+        with open(output, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+
+        self.stdout.write(f"Wrote {size} bytes to {output}")
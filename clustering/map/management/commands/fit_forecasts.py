@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from map.forecasts import get_fits, get_series
+from map.management.commands.generate_points import parse_dataset
+
+
+class Command(BaseCommand):
+    """
+    Fit the forecasting models ahead of time, so that no request has to wait for them
+    """
+    help = "Fit one SARIMA model per municipality and for the whole city, and store them in the cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset", type=parse_dataset, default=settings.DEFAULT_DATASET,
+                            help="slug of the dataset")
+        parser.add_argument("--refit", action="store_true",
+                            help="estimate every model again, instead of applying the new days to the last models")
+
+    def handle(self, *args, **options):
+        series, last_date = get_series(options["dataset"])
+        if last_date is None:
+            self.stdout.write("No data to fit")
+            return
+
+        fits, version = get_fits(options["dataset"], series, refit=options["refit"])
+
+        self.stdout.write(f"{len(fits)} models available for data version {version}")
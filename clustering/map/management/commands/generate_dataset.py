@@ -0,0 +1,173 @@
+import os
+import tempfile
+import zipfile
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from map.algorithms.synthetic import SyntheticDataset
+from map.management.commands.generate_points import parse_dataset, parse_date
+from map.models import DataVersion, Point
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Columns of the .npz files
+NPZ_COLUMNS = (("date", "datetime64[D]"),
+               ("latitude", np.float32),
+               ("longitude", np.float32),
+               ("municipality", np.uint16),
+               ("state", np.uint8))
+
+
+class Command(BaseCommand):
+    """
+    Generate a large synthetic dataset, for load and scaling tests
+    """
+    help = "Generate a synthetic dataset with hotspots, in the database or in a columnar file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset", type=parse_dataset, default=settings.DEFAULT_DATASET,
+                            help="slug of the dataset whose municipalities are copied, and that gets the points")
+        parser.add_argument("--points", type=int, default=10**5, help="total number of points")
+        parser.add_argument("--cities", type=int, default=1,
+                            help="number of cities (only one in the database, whose municipalities are the dataset's)")
+        parser.add_argument("--days", type=int, default=31, help="number of days")
+        parser.add_argument("--start", type=parse_date, default="2021-01-01", help="first day (YYYY-MM-DD)")
+        parser.add_argument("--hotspots", type=int, default=20, help="number of hotspots per city")
+        parser.add_argument("--background", type=float, default=0.3,
+                            help="fraction of points that do not belong to a hotspot")
+        parser.add_argument("--seed", type=int, default=0, help="seed of the run")
+        parser.add_argument("--output", help="write to this .npz, .parquet or .arrow file instead of the database")
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        if output and not output.endswith((".npz", ".parquet", ".arrow")):
+            raise CommandError("Output file must be .npz, .parquet or .arrow")
+        if output and not output.endswith(".npz") and pa is None:
+            raise CommandError("pyarrow is required for .parquet and .arrow files")
+        if options["cities"] < 1 or options["days"] < 1 or options["hotspots"] < 1:
+            raise CommandError("There must be at least one city, one day and one hotspot per city")
+        if options["points"] < 0:
+            raise CommandError("The number of points cannot be negative")
+        if output is None and options["cities"] > 1:
+            # A dataset is one city: its map, clusters and municipalities would mix the synthetic cities
+            raise CommandError("Several cities can only be written to a file (--output)")
+        if not 0 <= options["background"] <= 1:
+            raise CommandError("background must be between 0 and 1")
+
+        dataset = SyntheticDataset(options["points"], options["cities"], options["start"], options["days"],
+                                   options["seed"], hotspots_per_city=options["hotspots"],
+                                   background=options["background"],
+                                   circles_data=options["dataset"].municipality_data()[1])
+
+        if output is None:
+            num_points = self.write_database(dataset, options["dataset"].pk)
+        elif output.endswith(".npz"):
+            num_points = self.write_npz(dataset, output)
+        else:
+            num_points = self.write_arrow(dataset, output)
+
+        self.stdout.write(f"Generated {num_points} points")
+
+    def write_database(self, dataset, target):
+        """
+        Insert the points day by day in the target dataset (id), with one executemany per day.
+        Building model instances for millions of points would be much slower.
+        """
+        table = connection.ops.quote_name(Point._meta.db_table)
+        query = (f"INSERT INTO {table} (dataset_id, state, latitude, longitude, address, municipality, date) "
+                 f"VALUES (%s, %s, %s, %s, %s, %s, %s)")
+
+        num_points = 0
+        dates = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            for date, lat, lng, muns in dataset.generate():
+                date_str = str(date)
+                rows = [(target, Point.POSITIVE, float(p_lat), float(p_lng), "Unknown", dataset.municipalities[mun],
+                         date_str)
+                        for p_lat, p_lng, mun in zip(lat, lng, muns)]
+                cursor.executemany(query, rows)
+
+                num_points += len(rows)
+                dates.append(date)
+                self.stdout.write(f"{date}: {len(rows)} points")
+
+            DataVersion.objects.bump(target, dates)
+
+        return num_points
+
+    def write_npz(self, dataset, output):
+        """
+        Write the points in a compressed numpy archive.
+        Municipalities are stored as indexes in the "municipalities" array.
+        Days are written in memory-mapped .npy files first, then compressed in the archive,
+        so that memory does not depend on the size of the dataset
+        """
+        num_points = int(dataset.counts.sum())
+
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output))) as directory:
+            columns = {name: np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+",
+                                                       dtype=dtype, shape=(num_points,))
+                       for name, dtype in NPZ_COLUMNS}
+
+            end = 0
+            for date, lat, lng, mun in dataset.generate():
+                start, end = end, end + len(lat)
+                columns["date"][start:end] = np.datetime64(date, "D")
+                columns["latitude"][start:end] = lat
+                columns["longitude"][start:end] = lng
+                columns["municipality"][start:end] = mun
+            columns["state"][:] = Point.POSITIVE
+
+            for column in columns.values():
+                column.flush()
+            del columns
+
+            np.save(os.path.join(directory, "municipalities.npy"), np.asarray(dataset.municipalities))
+
+            # Same layout as np.savez_compressed, members are compressed from the files in chunks
+            with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+                for name in [name for name, dtype in NPZ_COLUMNS] + ["municipalities"]:
+                    archive.write(os.path.join(directory, f"{name}.npy"), arcname=f"{name}.npy")
+
+        return num_points
+
+    def write_arrow(self, dataset, output):
+        """
+        Write the points day by day in a Parquet or Arrow IPC file,
+        so that memory does not depend on the size of the dataset
+        """
+        municipalities = pa.array(dataset.municipalities)
+        schema = pa.schema([("date", pa.date32()),
+                            ("latitude", pa.float32()),
+                            ("longitude", pa.float32()),
+                            ("municipality", pa.dictionary(pa.uint16(), pa.string())),
+                            ("state", pa.uint8())])
+
+        if output.endswith(".parquet"):
+            writer = pq.ParquetWriter(output, schema)
+        else:
+            writer = pa.ipc.new_file(output, schema)
+
+        num_points = 0
+        with writer:
+            for date, lat, lng, muns in dataset.generate():
+                batch = pa.record_batch([pa.array(np.full(len(lat), np.datetime64(date, "D"))),
+                                         pa.array(lat.astype(np.float32)),
+                                         pa.array(lng.astype(np.float32)),
+                                         pa.DictionaryArray.from_arrays(pa.array(muns.astype(np.uint16)),
+                                                                        municipalities),
+                                         pa.array(np.full(len(lat), Point.POSITIVE, dtype=np.uint8))],
+                                        schema=schema)
+                if output.endswith(".parquet"):
+                    writer.write_table(pa.Table.from_batches([batch]))
+                else:
+                    writer.write_batch(batch)
+
+                num_points += len(lat)
+
+        return num_points
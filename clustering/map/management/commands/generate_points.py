@@ -0,0 +1,59 @@
+import argparse
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from map.generation import generate_range
+from map.models import Dataset, parse_states
+
+
+def parse_date(date_str):
+    """
+    Convert a YYYY-MM-DD string to Python date format
+    """
+    return datetime.datetime.strptime(date_str, "%Y-%m-%d").date()
+
+
+def parse_dataset(slug):
+    """
+    Dataset of the given slug, for the --dataset option of the commands
+    """
+    try:
+        return Dataset.objects.get(slug=slug)
+    except Dataset.DoesNotExist:
+        raise argparse.ArgumentTypeError(f"Unknown dataset {slug}")
+
+
+def parse_state_list(value):
+    """
+    States of the points, for the --states option of the commands (see parse_states)
+    """
+    try:
+        return parse_states(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid states {value}")
+
+
+class Command(BaseCommand):
+    """
+    Generate points for a range of days, using available data
+    """
+    help = "Generate random points for every day of a date range"
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", type=parse_date, help="first day (YYYY-MM-DD)")
+        parser.add_argument("end", type=parse_date, help="last day, included (YYYY-MM-DD)")
+        parser.add_argument("--dataset", type=parse_dataset, default=settings.DEFAULT_DATASET,
+                            help="slug of the dataset")
+        parser.add_argument("--seed", type=int, default=0, help="seed of the run")
+        parser.add_argument("--workers", type=int, default=1, help="number of processes")
+        parser.add_argument("--window", type=int, default=settings.WINDOW_DAYS,
+                            help="number of past days used to center the new points")
+
+    def handle(self, *args, **options):
+        if options["end"] < options["start"]:
+            raise CommandError("End date is before start date")
+
+        num_points = generate_range(options["dataset"], options["start"], options["end"], options["seed"],
+                                    workers=options["workers"], window=options["window"])
+
+        self.stdout.write(f"Generated {num_points} points")
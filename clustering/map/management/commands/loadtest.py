@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from map import loadtest, store
+from map.management.commands.generate_points import parse_dataset
+from map.models import Point
+
+
+class Command(BaseCommand):
+    """
+    Load test of the map views, on a local WSGI (or ASGI) server with a Nominatim stub.
+    The server works on a copy of the database, so inserted points are thrown away
+    """
+    help = "Drive the map views with concurrent users, and report latency percentiles and throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset", type=parse_dataset, default=settings.DEFAULT_DATASET,
+                            help="slug of the dataset of the requests")
+        parser.add_argument("--users", type=int, default=8, help="number of concurrent users")
+        parser.add_argument("--duration", type=float, default=30, help="duration of the test (in seconds)")
+        parser.add_argument("--think", type=float, default=0.5, help="mean time between two actions of a user")
+        parser.add_argument("--scrub", type=float, default=4, help="weight of users scrubbing through dates")
+        parser.add_argument("--popular", type=float, default=4, help="weight of users opening popular dates")
+        parser.add_argument("--insert", type=float, default=2, help="weight of bursts of new cases")
+        parser.add_argument("--geocoder-delay", type=float, default=0,
+                            help="time taken by the Nominatim stub to answer (in seconds)")
+        parser.add_argument("--asgi", action="store_true",
+                            help="serve the ASGI application with uvicorn, geocoding views being async")
+        parser.add_argument("--seed", type=int, default=0, help="seed of the run")
+        parser.add_argument("--output", help="also write the report to this JSON file")
+
+    def handle(self, *args, **options):
+        if options["asgi"]:
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError("uvicorn is required to serve the ASGI application")
+
+        connection = connections['default']
+        if connection.vendor != 'sqlite':
+            raise CommandError("Load tests run on a copy of the SQLite database")
+
+        # Work on a copy of the database, in this process and in the server threads
+        directory = tempfile.mkdtemp()
+        copy = os.path.join(directory, "db.sqlite3")
+        original = connection.settings_dict['NAME']
+        shutil.copy(original, copy)
+        connection.close()
+        connection.settings_dict['NAME'] = copy
+
+        # The stores of the process follow the copy (a shared store would follow the real database)
+        settings.SHARED_MEMORY_STORE = False
+        store.stores.clear()
+
+        stub, stub_address = loadtest.start_stub(delay=options["geocoder_delay"])
+        settings.GEOCODER_DOMAIN = stub_address
+        settings.GEOCODER_SCHEME = 'http'
+        settings.GEOCODER_MIN_DELAY = 0
+
+        if options["asgi"]:
+            from map.asgi import Application
+            server, url = loadtest.start_asgi(Application())
+        else:
+            server, url = loadtest.start_wsgi(get_wsgi_application())
+
+        try:
+            dataset = options["dataset"]
+            dates = list(Point.objects.filter(dataset=dataset).dates('date', 'day'))
+            if not dates:
+                raise CommandError("The database has no points")
+
+            self.stdout.write(f"{options['users']} users for {options['duration']} s on {url}")
+            report = loadtest.run_load(url, dataset.slug, dates, options["users"], options["duration"],
+                                       {"scrub": options["scrub"], "popular": options["popular"],
+                                        "insert": options["insert"]},
+                                       think_time=options["think"], seed=options["seed"])
+        finally:
+            server.shutdown()
+            stub.shutdown()
+            connection.close()
+            connection.settings_dict['NAME'] = original
+            shutil.rmtree(directory, ignore_errors=True)
+
+        self.stdout.write(f"{'endpoint':<20} {'count':>6} {'errors':>6} {'req/s':>7} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for endpoint, stats in report.items():
+            percentiles = [f"{1000*stats[f'p{p}']:8.1f}" if stats[f'p{p}'] is not None else f"{'-':>8}"
+                           for p in loadtest.PERCENTILES]
+            self.stdout.write(f"{endpoint:<20} {stats['count']:>6} {stats['errors']:>6} "
+                              f"{stats['throughput']:>7.2f} " + " ".join(percentiles))
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from map.rtree import create_index, rtree_available
+
+
+class Command(BaseCommand):
+    """
+    Fill the R*Tree index of point coordinates again from the point table
+    """
+    help = "Rebuild the spatial index used by bounding box queries"
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("The spatial index is only used with SQLite")
+
+        with transaction.atomic():
+            create_index(connection)
+
+        if not rtree_available():
+            raise CommandError("SQLite was compiled without the R*Tree module")
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM map_point_rtree")
+            self.stdout.write(f"{cursor.fetchone()[0]} points indexed")
@@ -0,0 +1,51 @@
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from map.hotspots import get_hotspots
+from map.management.commands.generate_points import parse_dataset, parse_date, parse_state_list
+
+
+class Command(BaseCommand):
+    """
+    Scan a date range for space-time clusters, e.g. a whole month as a batch job
+    """
+    help = "Find space-time clusters of cases against the official figures, with Monte Carlo p-values"
+
+    def add_arguments(self, parser):
+        parser.add_argument("start", type=parse_date, help="first day (YYYY-MM-DD)")
+        parser.add_argument("end", type=parse_date, help="last day (YYYY-MM-DD)")
+        parser.add_argument("--dataset", type=parse_dataset, default=settings.DEFAULT_DATASET,
+                            help="slug of the dataset")
+        parser.add_argument("--states", type=parse_state_list, default=",".join(settings.DEFAULT_STATES),
+                            help="states of the points counted as cases (e.g. positive,recovered, or all)")
+        parser.add_argument("--replicates", type=int, default=settings.HOTSPOT_REPLICATES,
+                            help="number of Monte Carlo replicates")
+        parser.add_argument("--workers", type=int, default=settings.HOTSPOT_WORKERS,
+                            help="number of processes running the replicates")
+        parser.add_argument("--prospective", action="store_true",
+                            help="only look for clusters still going on at the end of the range")
+        parser.add_argument("--seed", type=int, default=0, help="seed of the replicates")
+        parser.add_argument("--output", help="also write the clusters to this JSON file")
+
+    def handle(self, *args, **options):
+        if options["end"] < options["start"]:
+            raise CommandError("end must not be before start")
+
+        start_time = time.perf_counter()
+        try:
+            hotspots = get_hotspots(options["dataset"], options["start"], options["end"], options["replicates"],
+                                    options["workers"], options["prospective"], options["seed"], options["states"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for hotspot in hotspots:
+            p_value = f"{hotspot['p_value']:.3f}" if hotspot["p_value"] is not None else "-"
+            self.stdout.write(f"{hotspot['first']} - {hotspot['last']}  {hotspot['observed']:>5} cases "
+                              f"for {hotspot['expected']:8.1f} expected  llr {hotspot['llr']:8.2f}  p {p_value}"
+                              f"{'  *' if hotspot['significant'] else ''}  {', '.join(hotspot['municipalities'])}")
+        self.stdout.write(f"{len(hotspots)} clusters in {time.perf_counter() - start_time:.1f} s")
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(hotspots, f, indent=2)
@@ -0,0 +1,70 @@
+import datetime
+import os
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from map.algorithms.forecasting import ORDER, SEASONAL_ORDER
+from map.algorithms.order_selection import (OrderCache, candidate_orders, holdout_error, read_holdout,
+                                            select_orders)
+from map.forecasts import get_series, save_orders
+from map.management.commands.generate_points import parse_dataset
+
+
+class Command(BaseCommand):
+    """
+    Select the SARIMA orders of each series automatically, for the forecaster
+    """
+    help = "Search the best SARIMA orders per municipality by AIC, and report their error on hold-out data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset", type=parse_dataset, default=settings.DEFAULT_DATASET,
+                            help="slug of the dataset")
+        parser.add_argument("--max-p", type=int, default=2)
+        parser.add_argument("--d", type=int, default=ORDER[1], help="differencing order of every candidate")
+        parser.add_argument("--max-q", type=int, default=2)
+        parser.add_argument("--max-P", type=int, default=1)
+        parser.add_argument("--D", type=int, default=SEASONAL_ORDER[1],
+                            help="seasonal differencing order of every candidate")
+        parser.add_argument("--max-Q", type=int, default=1)
+        parser.add_argument("--workers", type=int, default=settings.FORECAST_WORKERS, help="number of processes")
+        parser.add_argument("--margin", type=float, default=10,
+                            help="candidates whose first-pass AIC is above the best one plus this margin are pruned "
+                                 "(heuristic, inf to fit every candidate)")
+        parser.add_argument("--holdout", default=os.path.join(settings.BASE_DIR, "map", "data", "february.csv"),
+                            help="csv file with the real cases of the following days")
+        parser.add_argument("--horizon", type=int, default=14, help="number of hold-out days")
+
+    def handle(self, *args, **options):
+        dataset = options["dataset"]
+        series, last_date = get_series(dataset)
+        if last_date is None:
+            raise CommandError("No data to fit")
+        series = {name: np.asarray(counts) for name, counts in series.items()}
+
+        candidates = candidate_orders(options["max_p"], options["d"], options["max_q"],
+                                      options["max_P"], options["D"], options["max_Q"])
+        self.stdout.write(f"{len(candidates)} candidates for {len(series)} series")
+
+        cache = OrderCache(os.path.join(settings.FORECAST_ORDERS_CACHE_DIR, dataset.slug))
+        winners = select_orders(series, candidates, cache, workers=options["workers"], margin=options["margin"])
+        save_orders(dataset, winners)
+
+        self.report(series, last_date, winners, options)
+
+    def report(self, series, last_date, winners, options):
+        """
+        Compare the hold-out error of the selected orders with the default orders
+        """
+        real = read_holdout(options["holdout"])
+        dates = [str(last_date + datetime.timedelta(days=i)) for i in range(1, options["horizon"] + 1)]
+
+        for name, (order, seasonal_order, aic) in sorted(winners.items()):
+            line = f"{name}: {order}{seasonal_order} AIC={aic:.1f}"
+
+            if name in real and all(date in real[name] for date in dates):
+                values = np.asarray([real[name][date] for date in dates])
+                selected = holdout_error(series[name], order, seasonal_order, values)
+                default = holdout_error(series[name], ORDER, SEASONAL_ORDER, values)
+                line += f" hold-out MAE={selected:.2f} (default orders: {default:.2f})"
+
+            self.stdout.write(line)
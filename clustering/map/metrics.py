@@ -0,0 +1,149 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the histogram buckets (in seconds)
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, float("inf"))
+
+# Type and description of each metric
+METRICS = {"stc_requests_total": ("counter", "Requests, by view and status"),
+           "stc_request_seconds": ("histogram", "Duration of requests, streaming included, by view"),
+           "stc_stage_seconds": ("histogram", "Time spent in each stage of the requests"),
+           "stc_items_total": ("counter", "Points and clusters handled"),
+           "stc_cache_requests_total": ("counter", "Cache lookups, by cache and result (hit or miss)")}
+
+
+class Registry():
+    """
+    Counters and histograms of the process, with labels
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            buckets, total, count = self.histograms.get(key, ([0]*len(BUCKETS), 0, 0))
+            buckets = [num + (value <= bound) for num, bound in zip(buckets, BUCKETS)]
+            self.histograms[key] = (buckets, total + value, count + 1)
+
+    def expose(self):
+        """
+        Metrics in the Prometheus text format
+
+        Returns
+        -------
+            text : str
+                one line per sample
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+
+        def format_labels(labels):
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, num in zip(BUCKETS, buckets):
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {num}")
+                lines.append(f"{name}_sum{format_labels(labels)} {total}")
+                lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+# Metrics of the process
+registry = Registry()
+
+# Metrics of the request handled by the current thread
+_local = threading.local()
+
+
+def start_request():
+    """
+    Start collecting the metrics of a request in the current thread
+    """
+    _local.request = {"stages": {}, "items": {}, "cache": {}}
+
+
+def finish_request():
+    """
+    Stop collecting the metrics of the request of the current thread
+
+    Returns
+    -------
+        metrics : dict
+            "stages": seconds per stage, "items": counts per kind, "cache": (hits, misses) per cache
+    """
+    metrics = getattr(_local, "request", None)
+    _local.request = None
+    return metrics or {"stages": {}, "items": {}, "cache": {}}
+
+
+def current_request():
+    return getattr(_local, "request", None)
+
+
+@contextmanager
+def timer(stage):
+    """
+    Measure the time spent in a stage
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe("stc_stage_seconds", elapsed, stage=stage)
+
+        request = current_request()
+        if request is not None:
+            request["stages"][stage] = request["stages"].get(stage, 0) + elapsed
+
+
+def count(kind, value):
+    """
+    Count handled items (e.g. points or clusters)
+    """
+    registry.inc("stc_items_total", value, kind=kind)
+
+    request = current_request()
+    if request is not None:
+        request["items"][kind] = request["items"].get(kind, 0) + value
+
+
+def cache_lookup(cache, hits, misses):
+    """
+    Count the hits and misses of a cache
+    """
+    if hits:
+        registry.inc("stc_cache_requests_total", hits, cache=cache, result="hit")
+    if misses:
+        registry.inc("stc_cache_requests_total", misses, cache=cache, result="miss")
+
+    request = current_request()
+    if request is not None:
+        previous = request["cache"].get(cache, (0, 0))
+        request["cache"][cache] = (previous[0] + hits, previous[1] + misses)
@@ -0,0 +1,89 @@
+import cProfile
+import datetime
+import logging
+import os
+import time
+from django.conf import settings
+from map import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware():
+    """
+    Collect the metrics of each request: duration, stages, counts and cache lookups.
+    Streamed responses are measured until their last chunk.
+    With PROFILE_SLOW_REQUESTS, requests run under cProfile, and the profile of
+    requests slower than PROFILE_SLOW_THRESHOLD is written in PROFILE_DIR
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.start_request()
+        profiler = cProfile.Profile() if settings.PROFILE_SLOW_REQUESTS else None
+
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        elapsed = time.perf_counter() - start
+
+        if response.streaming:
+            response.streaming_content = self.measure_stream(request, response, response.streaming_content,
+                                                             elapsed, profiler)
+        else:
+            self.finish(request, response, elapsed, profiler)
+
+        return response
+
+    def measure_stream(self, request, response, content, elapsed, profiler):
+        """
+        Pass the chunks of a streamed response through, counting the time spent producing them
+        """
+        chunks = iter(content)
+        stream_time = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+                    stream_time += time.perf_counter() - start
+                yield chunk
+        finally:
+            metrics.registry.observe("stc_stage_seconds", stream_time, stage="stream")
+            self.finish(request, response, elapsed + stream_time, profiler, stream_time)
+
+    def finish(self, request, response, elapsed, profiler, stream_time=None):
+        view = request.resolver_match.url_name if request.resolver_match else "unknown"
+        collected = metrics.finish_request()
+        if stream_time is not None:
+            collected["stages"]["stream"] = stream_time
+
+        metrics.registry.inc("stc_requests_total", view=view, status=response.status_code)
+        metrics.registry.observe("stc_request_seconds", elapsed, view=view)
+
+        fields = [f"view={view}", f"status={response.status_code}", f"duration={elapsed:.4f}"]
+        fields += [f"stage.{stage}={seconds:.4f}" for stage, seconds in collected["stages"].items()]
+        fields += [f"{kind}={value}" for kind, value in collected["items"].items()]
+        fields += [f"cache.{cache}={hits}/{hits + misses}" for cache, (hits, misses) in collected["cache"].items()]
+        logger.info("request %s", " ".join(fields))
+
+        if profiler is not None and elapsed > settings.PROFILE_SLOW_THRESHOLD:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            path = os.path.join(settings.PROFILE_DIR,
+                                f"{datetime.datetime.now():%Y%m%d-%H%M%S-%f}-{view}.prof")
+            profiler.dump_stats(path)
+            logger.warning("slow request view=%s duration=%.4f profile=%s", view, elapsed, path)
@@ -0,0 +1,21 @@
+from django.db import migrations
+from map.rtree import create_index, drop_index
+
+
+def create_rtree(apps, schema_editor):
+    create_index(schema_editor.connection)
+
+
+def drop_rtree(apps, schema_editor):
+    drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('map', '0002_point_municipality'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_rtree, drop_rtree),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.28 on 2026-10-19 14:53
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_versions(apps, schema_editor):
+    """
+    Existing dates start at version 1
+    """
+    Point = apps.get_model('map', 'Point')
+    DataVersion = apps.get_model('map', 'DataVersion')
+
+    dates = Point.objects.values_list('date', flat=True).distinct()
+    DataVersion.objects.bulk_create([DataVersion(date=date, version=1) for date in dates])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('map', '0003_point_rtree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
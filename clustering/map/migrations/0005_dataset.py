@@ -0,0 +1,83 @@
+# Generated by Django 2.2.28 on 2026-10-19 16:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import map.models
+from map.rtree import create_index
+
+
+def create_default_dataset(apps, schema_editor):
+    """
+    Existing points and versions belong to the Brussels dataset, with the files read so far
+    """
+    Dataset = apps.get_model('map', 'Dataset')
+    Dataset.objects.create(pk=1, name='Brussels', slug='brussels', center_latitude=50.81301,
+                           center_longitude=4.37613, zoom=14, cases_file='data_municipality.csv',
+                           circles_file='circles.csv')
+
+
+def restore_rtree(apps, schema_editor):
+    """
+    SQLite rebuilds map_point to add a column, which drops the triggers of the R*Tree index
+    """
+    create_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('map', '0004_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Dataset',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=256)),
+                ('slug', models.SlugField(unique=True)),
+                ('center_latitude', models.DecimalField(decimal_places=5, max_digits=7)),
+                ('center_longitude', models.DecimalField(decimal_places=5, max_digits=8)),
+                ('zoom', models.PositiveSmallIntegerField(default=14)),
+                ('cases_file', models.CharField(default='data_municipality.csv', max_length=512)),
+                ('circles_file', models.CharField(default='circles.csv', max_length=512)),
+                ('cluster_prop', models.FloatField(default=0.98)),
+                ('cluster_eps', models.FloatField(default=0.014)),
+            ],
+        ),
+        migrations.RunPython(create_default_dataset, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='point',
+            name='dataset',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, related_name='points',
+                                    to='map.Dataset'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='point',
+            name='dataset',
+            field=models.ForeignKey(default=map.models.default_dataset, on_delete=django.db.models.deletion.CASCADE,
+                                    related_name='points', to='map.Dataset'),
+        ),
+        migrations.AddIndex(
+            model_name='point',
+            index=models.Index(fields=['dataset', 'date'], name='map_point_dataset_date'),
+        ),
+        migrations.AddField(
+            model_name='dataversion',
+            name='dataset',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, related_name='versions',
+                                    to='map.Dataset'),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='dataversion',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dataversion',
+            unique_together={('dataset', 'date')},
+        ),
+        migrations.RunPython(restore_rtree, migrations.RunPython.noop),
+    ]
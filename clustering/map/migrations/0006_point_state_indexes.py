@@ -0,0 +1,17 @@
+# Generated by Django 2.2.28 on 2026-10-19 15:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('map', '0005_dataset'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='point',
+            index=models.Index(fields=['dataset', 'state', 'date'], name='map_point_state_date'),
+        ),
+    ]
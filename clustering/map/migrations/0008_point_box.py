@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-19 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('map', '0007_dataset_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointBox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_lat', models.FloatField()),
+                ('max_lat', models.FloatField()),
+                ('min_lng', models.FloatField()),
+                ('max_lng', models.FloatField()),
+            ],
+            options={
+                'db_table': 'map_point_rtree',
+                'managed': False,
+            },
+        ),
+    ]
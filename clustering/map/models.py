@@ -1,18 +1,145 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import FloatField, Max
+from django.db.models.functions import Cast
 from django.urls import reverse
+from django.utils import timezone
 from datetime import date
+from map import algorithms
+from map.rtree import RTREE_TABLE, rtree_available
+from map.algorithms.columns import PointColumns
 
 
-class PointManager(models.Manager):
+class DatasetManager(models.Manager):
+    """
+    Manager class that is used to find datasets
+    """
+    def get_default(self):
+        """
+        Dataset used when none is asked for (settings.DEFAULT_DATASET)
+        """
+        return self.get(slug=settings.DEFAULT_DATASET)
+
+
+class Dataset(models.Model):
+    """
+    Class to represent a region: its points, its municipality data and
+    the parameters of its clusters. Every query, cache and precomputed
+    result is scoped to one dataset
+    """
+    objects = DatasetManager()
+
+    name = models.CharField(max_length=256)
+    slug = models.SlugField(unique=True)
+
+    # Initial view of the map
+    center_latitude = models.DecimalField(max_digits=7, decimal_places=5)
+    center_longitude = models.DecimalField(max_digits=8, decimal_places=5)
+    zoom = models.PositiveSmallIntegerField(default=14)
+
+    # Cases per day and per municipality, and municipality circles (see load_municipality_data)
+    cases_file = models.CharField(max_length=512, default="data_municipality.csv")
+    circles_file = models.CharField(max_length=512, default="circles.csv")
+
+    # Weight of space and time distances, and epsilon of DBSCANClustering
+    cluster_prop = models.FloatField(default=0.98)
+    cluster_eps = models.FloatField(default=0.014)
+
+    # Part of the ETags of the map views, whose results depend on the parameters of the dataset
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    def municipality_data(self):
+        """
+        Cases per day and per municipality, and municipality circles of the dataset
+        """
+        return algorithms.load_municipality_data(self.cases_file, self.circles_file)
+
+
+def default_dataset():
+    """
+    Id of the default dataset, for points created without one
+    """
+    return Dataset.objects.get_default().pk
+
+
+class PointQuerySet(models.QuerySet):
+    """
+    QuerySet class with spatial and state filters
+    """
+    def with_states(self, states):
+        """
+        Keep the points whose state is one of the given states
+        """
+        return self.filter(state__in=sorted(states))
+
+    def in_bbox(self, min_lng, min_lat, max_lng, max_lat):
+        """
+        Keep the points inside a bounding box.
+        With SQLite, candidates are read from the R*Tree index first
+        """
+        points = self.filter(latitude__gte=min_lat, latitude__lte=max_lat,
+                             longitude__gte=min_lng, longitude__lte=max_lng)
+
+        if rtree_available(self.db):
+            candidates = PointBox.objects.using(self.db).filter(max_lng__gte=min_lng, min_lng__lte=max_lng,
+                                                                max_lat__gte=min_lat, min_lat__lte=max_lat)
+            points = points.filter(id__in=candidates.values('id'))
+
+        return points
+
+    def columns(self):
+        """
+        Read the points as columns, without building Point objects
+        """
+        # Cast avoids building one Decimal per coordinate
+        rows = self.annotate(lat=Cast('latitude', FloatField()),
+                             lng=Cast('longitude', FloatField()))
+
+        return PointColumns.from_rows(rows.values_list('lat', 'lng', 'date', 'state'))
+
+
+class PointManager(models.Manager.from_queryset(PointQuerySet)):
     """
     Manager class that is used to create points
     """
-    def create_point(self, state, lat, lng, address, municipality, date=None):
+    def create_point(self, state, lat, lng, address, municipality, date=None, dataset=None):
+        if dataset is None:
+            dataset = default_dataset()
+
         if date is None:
-            return self.create(state=state, latitude=lat, longitude=lng, municipality=municipality, address=address)
+            return self.create(state=state, latitude=lat, longitude=lng, municipality=municipality, address=address,
+                               dataset_id=dataset)
         else:
             return self.create(state=state, latitude=lat, longitude=lng, municipality=municipality, address=address,
-                               date=date)
+                               date=date, dataset_id=dataset)
+
+    def bulk_create_points(self, points, dataset, batch_size=None):
+        """
+        Insert many points at once
+
+        Parameters
+        ----------
+            points : iterable
+                (state, lat, lng, address, municipality, date) of the points
+            dataset : int
+                id of the dataset of the points
+            batch_size : int, optional
+                number of points per INSERT query. By default, the database backend decides
+        """
+        objs = [self.model(state=state, latitude=lat, longitude=lng, address=address,
+                           municipality=municipality, date=date, dataset_id=dataset)
+                for state, lat, lng, address, municipality, date in points]
+
+        with transaction.atomic():
+            created = self.bulk_create(objs, batch_size=batch_size)
+
+            # bulk_create does not send signals
+            DataVersion.objects.bump(dataset, set(obj.date for obj in objs))
+
+        return created
 
 
 class Point(models.Model):
@@ -21,6 +148,8 @@ class Point(models.Model):
     """
     objects = PointManager()
 
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name="points", default=default_dataset)
+
     NEGATIVE = 0
     POSITIVE = 1
     RECOVERED = 2
@@ -31,6 +160,9 @@ class Point(models.Model):
                      (RECOVERED, "Recovered"),
                      (UNKNOWN, "Unknown")]
 
+    # States by name, as given in query strings
+    STATE_NAMES = {name.lower(): state for state, name in STATE_CHOICES}
+
     state = models.IntegerField(choices=STATE_CHOICES, default=POSITIVE)
     latitude = models.DecimalField(max_digits=7, decimal_places=5)
     longitude = models.DecimalField(max_digits=8, decimal_places=5)
@@ -39,5 +171,123 @@ class Point(models.Model):
     municipality = models.CharField(max_length=256, default='Unknown')
     date = models.DateField(default=date.today)
 
+    class Meta:
+        # Every query on points reads one dataset, over a range of dates, often for some states only
+        indexes = [models.Index(fields=['dataset', 'date'], name='map_point_dataset_date'),
+                   models.Index(fields=['dataset', 'state', 'date'], name='map_point_state_date')]
+
     def get_absolute_url(self):
         return reverse('map')
+
+
+class PointBox(models.Model):
+    """
+    Class to read the SQLite R*Tree index of the point coordinates (see map/rtree.py).
+    Its rows are written by triggers on the points, never by Django
+    """
+    min_lat = models.FloatField()
+    max_lat = models.FloatField()
+    min_lng = models.FloatField()
+    max_lng = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = RTREE_TABLE
+
+
+def parse_states(value):
+    """
+    States given as a comma-separated list of names (e.g. "positive,recovered"), or "all".
+    Raise ValueError if a name is not valid
+
+    Returns
+    -------
+        states : frozenset
+            states of the list
+    """
+    if value.strip().lower() == "all":
+        return frozenset(Point.STATE_NAMES.values())
+
+    names = [name.strip().lower() for name in value.split(",")]
+    if not all(name in Point.STATE_NAMES for name in names):
+        raise ValueError("Invalid states")
+
+    return frozenset(Point.STATE_NAMES[name] for name in names)
+
+
+def default_states():
+    """
+    States used when none are asked for (settings.DEFAULT_STATES)
+    """
+    return frozenset(Point.STATE_NAMES[name] for name in settings.DEFAULT_STATES)
+
+
+def states_key(states):
+    """
+    Part of the cache keys of results computed on the points of some states
+    """
+    return ",".join(str(state) for state in sorted(states))
+
+
+class DataVersionManager(models.Manager):
+    """
+    Manager class that is used to bump and read data versions
+    """
+    def bump(self, dataset, dates):
+        """
+        Give a new version to the given dates of a dataset. Versions come from a single
+        counter, so the version of a window is the maximum version of its dates
+        """
+        # Points can be created with dates given as strings
+        date_field = self.model._meta.get_field('date')
+        dates = set(date_field.to_python(day) for day in dates)
+        if len(dates) == 0:
+            return
+
+        with transaction.atomic():
+            version = (self.aggregate(version=Max('version'))['version'] or 0) + 1
+            now = timezone.now()
+
+            versions = self.filter(dataset=dataset, date__in=dates)
+            versions.update(version=version, modified=now)
+
+            existing = set(versions.values_list('date', flat=True))
+            self.bulk_create([self.model(dataset_id=dataset, date=day, version=version, modified=now)
+                              for day in dates - existing])
+
+    def window_version(self, dataset, start, end):
+        """
+        Version and last modification of the points of a dataset between start and end (included)
+
+        Returns
+        -------
+            version : int
+                0 if the dates were never written
+            modified : datetime
+                None if the dates were never written
+        """
+        versions = self.filter(dataset=dataset, date__gte=start, date__lte=end).aggregate(
+            version=Max('version'), modified=Max('modified'))
+        return versions['version'] or 0, versions['modified']
+
+    def global_version(self, dataset):
+        """
+        Version of the whole dataset
+        """
+        return self.filter(dataset=dataset).aggregate(version=Max('version'))['version'] or 0
+
+
+class DataVersion(models.Model):
+    """
+    Class to represent the version of the points of a dataset on a given date.
+    It changes every time a point of this date is written
+    """
+    objects = DataVersionManager()
+
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name="versions")
+    date = models.DateField()
+    version = models.PositiveIntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = [('dataset', 'date')]
@@ -0,0 +1,94 @@
+from django.db import connections
+
+# SQLite R*Tree index of the point coordinates, kept in sync with map_point by triggers,
+# so that it also covers bulk_create and raw inserts
+RTREE_TABLE = 'map_point_rtree'
+
+CREATE_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_insert AFTER INSERT ON map_point BEGIN
+        INSERT INTO {RTREE_TABLE} VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END""",
+
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_update AFTER UPDATE OF latitude, longitude ON map_point BEGIN
+        UPDATE {RTREE_TABLE} SET min_lat = new.latitude, max_lat = new.latitude,
+                                 min_lng = new.longitude, max_lng = new.longitude
+        WHERE id = new.id;
+    END""",
+
+    f"""CREATE TRIGGER IF NOT EXISTS {RTREE_TABLE}_delete AFTER DELETE ON map_point BEGIN
+        DELETE FROM {RTREE_TABLE} WHERE id = old.id;
+    END""",
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {RTREE_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {RTREE_TABLE}_update",
+    f"DROP TRIGGER IF EXISTS {RTREE_TABLE}_delete",
+    f"DROP TABLE IF EXISTS {RTREE_TABLE}",
+]
+
+BACKFILL_SQL = [
+    f"DELETE FROM {RTREE_TABLE}",
+    f"INSERT INTO {RTREE_TABLE} SELECT id, latitude, latitude, longitude, longitude FROM map_point",
+]
+
+# Databases where the index exists. Only positive answers are kept, the index may be created later
+_available = set()
+
+
+def rtree_available(using='default'):
+    """
+    Check if the R*Tree index exists in the database
+
+    Parameters
+    ----------
+        using : str
+            database alias
+
+    Returns
+    -------
+        available : bool
+            True if bounding box queries can use the index
+    """
+    if using in _available:
+        return True
+
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+
+    if RTREE_TABLE in connection.introspection.table_names():
+        _available.add(using)
+        return True
+    return False
+
+
+def create_index(connection):
+    """
+    Create the index and its triggers, and fill it with the existing points.
+    Does nothing if SQLite was compiled without the R*Tree module
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        if 'ENABLE_RTREE' not in [row[0] for row in cursor.fetchall()]:
+            return
+
+        for sql in CREATE_SQL + BACKFILL_SQL:
+            cursor.execute(sql)
+
+
+def drop_index(connection):
+    """
+    Remove the index and its triggers
+    """
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
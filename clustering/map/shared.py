@@ -0,0 +1,338 @@
+import datetime
+import fcntl
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from map.algorithms.columns import PointColumns
+from map.models import DataVersion
+from map.store import PointStore
+from map import metrics
+
+# Columns of the points, one shared memory segment each
+COLUMNS = (("latitude", np.float64),
+           ("longitude", np.float64),
+           ("day", np.int32),
+           ("state", np.int8))
+
+
+def create_segment(name, size):
+    """
+    Create a shared memory segment, that outlives the process
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+    except FileExistsError:
+        # Left by a process that crashed while publishing
+        unlink_segment(name)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+
+    # Otherwise the segment is destroyed when the process exits, even if other processes use it
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def attach_segment(name):
+    """
+    Attach an existing shared memory segment.
+    Raise FileNotFoundError if it was removed
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def unlink_segment(name):
+    """
+    Remove a shared memory segment. Processes that attached it keep their mapping
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+class SharedPointStore(PointStore):
+    """
+    Point store of a dataset shared by the processes of the server (e.g. gunicorn workers).
+
+    Point columns are published in shared memory segments, described by a versioned
+    manifest (a JSON file). Processes map the segments read-only, so memory does not
+    grow with the number of workers, and map the new segments when the version changes.
+    The first process that sees a new data version publishes it, reading only the dates
+    that changed; the others just map it.
+    Cluster results are published in shared memory too, and dropped when a date of
+    their window changes.
+    """
+
+    def __init__(self, dataset, directory, prefix):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            dataset : int
+                id of the dataset of the points
+            directory : str
+                directory of the manifests and of their lock files
+            prefix : str
+                prefix of the names of the segments
+        """
+        super().__init__(dataset)
+
+        # Each dataset has its own manifest and segments
+        self.directory = os.path.join(directory, str(dataset))
+        self.prefix = f"{prefix}-d{dataset}"
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+        self.lock_path = os.path.join(self.directory, "manifest.lock")
+
+        self.segments = []  # segments of self.columns
+        self.retired = []  # segments of previous versions, maybe still used by requests
+        self.manifest = (None, None)  # (file identity, content) of the last manifest read
+
+    @contextmanager
+    def locked(self):
+        """
+        Lock the manifest for the processes of the server
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def read_manifest(self):
+        """
+        Read the manifest, only if the file changed since the last read
+
+        Returns
+        -------
+            manifest : dict or None
+                None if nothing was published yet
+        """
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+
+        # The file is replaced at each write, so its inode changes
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if identity != self.manifest[0]:
+            with open(self.manifest_path) as f:
+                self.manifest = (identity, json.load(f))
+        return self.manifest[1]
+
+    def write_manifest(self, manifest):
+        """
+        Replace the manifest, so that readers never see a partial file
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def refresh(self):
+        """
+        Map the latest version of the points, publishing it first if needed
+        """
+        global_version = DataVersion.objects.global_version(self.dataset)
+        manifest = self.read_manifest()
+        if manifest is not None and manifest["version"] >= global_version \
+                and manifest["version"] == self.global_version:
+            return
+
+        with self.lock:
+            if manifest is not None and manifest["version"] >= global_version:
+                try:
+                    self.attach(manifest)
+                    return
+                except FileNotFoundError:
+                    # A newer version was published in the meantime, or the segments were lost
+                    pass
+
+            with self.locked():
+                manifest = self.read_manifest()
+                try:
+                    if manifest is None or manifest["version"] < global_version:
+                        manifest = self.publish(manifest)
+                    self.attach(manifest)
+                except FileNotFoundError:
+                    # Segments lost (e.g. after a reboot): publish every point again
+                    self.unlink_all(manifest)
+                    self.attach(self.publish(None))
+
+    def attach(self, manifest):
+        """
+        Map the points of a manifest, read-only
+        """
+        if manifest["version"] == self.global_version and self.columns is not None:
+            return
+
+        segments = []
+        try:
+            for name, dtype in COLUMNS:
+                segments.append(attach_segment(manifest["segments"][name]))
+        except FileNotFoundError:
+            for shm in segments:
+                shm.close()
+            raise
+
+        arrays = []
+        for shm, (name, dtype) in zip(segments, COLUMNS):
+            array = np.ndarray((manifest["length"],), dtype=dtype, buffer=shm.buf)
+            array.flags.writeable = False
+            arrays.append(array)
+
+        self.retired += self.segments
+        self.segments = segments
+        self.columns = PointColumns(*arrays)
+        self.versions = {datetime.date.fromisoformat(day): version for day, version in manifest["dates"].items()}
+        self.global_version = manifest["version"]
+
+        self.close_retired()
+
+    def close_retired(self):
+        """
+        Unmap the segments of previous versions that are not used anymore
+        """
+        used = []
+        for shm in self.retired:
+            try:
+                shm.close()
+            except BufferError:
+                # Columns of a request in progress still point to the segment
+                used.append(shm)
+        self.retired = used
+
+    def publish(self, manifest):
+        """
+        Publish the points of the current data version, reading only the dates
+        that changed since the given manifest. Must be called with the manifest locked
+
+        Returns
+        -------
+            manifest : dict
+                new manifest
+        """
+        if manifest is None:
+            with metrics.timer("store_refresh"):
+                columns, versions = self.read(None, {})
+            old_dates, clusters = {}, {}
+        else:
+            self.attach(manifest)
+            with metrics.timer("store_refresh"):
+                columns, versions = self.read(self.columns, self.versions)
+            old_dates, clusters = manifest["dates"], manifest["clusters"]
+
+        version = max(versions.values(), default=0)
+        dates = {str(day): day_version for day, day_version in versions.items()}
+
+        segments = {}
+        for name, dtype in COLUMNS:
+            array = getattr(columns, name)
+            segments[name] = f"{self.prefix}-p{version}-{name}"
+            shm = create_segment(segments[name], array.nbytes)
+            shared = np.ndarray(array.shape, dtype=dtype, buffer=shm.buf)
+            shared[:] = array
+            del shared
+            shm.close()
+
+        # Cluster results are dropped if a date of their window changed
+        changed = [day for day in set(old_dates) | set(dates) if old_dates.get(day) != dates.get(day)]
+        kept = {}
+        for key, entry in clusters.items():
+            if any(entry["first"] <= day <= entry["last"] for day in changed):
+                unlink_segment(entry["segment"])
+            else:
+                kept[key] = entry
+
+        new_manifest = {"version": version,
+                        "length": len(columns),
+                        "segments": segments,
+                        "dates": dates,
+                        "clusters": kept}
+        self.write_manifest(new_manifest)
+
+        if manifest is not None:
+            for name in manifest["segments"].values():
+                if name not in segments.values():
+                    unlink_segment(name)
+
+        return new_manifest
+
+    def segment_name(self, key):
+        """
+        Name of the segment of a cluster result
+        """
+        return f"{self.prefix}-c{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+    def get_clusters(self, keys):
+        manifest = self.read_manifest()
+        if manifest is None:
+            return {}
+
+        results = {}
+        for key in keys:
+            entry = manifest["clusters"].get(key)
+            if entry is None:
+                continue
+            try:
+                shm = attach_segment(entry["segment"])
+            except FileNotFoundError:
+                continue
+            try:
+                results[key] = pickle.loads(bytes(shm.buf[:entry["size"]]))
+            finally:
+                shm.close()
+
+        return results
+
+    def set_clusters(self, results):
+        with self.locked():
+            manifest = self.read_manifest()
+            if manifest is None:
+                return
+
+            clusters = dict(manifest["clusters"])
+            for key, (first, last, result) in results.items():
+                if key in clusters:
+                    continue
+
+                data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+                shm = create_segment(self.segment_name(key), len(data))
+                shm.buf[:len(data)] = data
+                shm.close()
+
+                clusters[key] = {"segment": self.segment_name(key), "size": len(data),
+                                 "first": str(first), "last": str(last)}
+
+            self.write_manifest(dict(manifest, clusters=clusters))
+
+    def clear(self):
+        """
+        Remove every published segment and the manifest
+        """
+        with self.locked():
+            manifest = self.read_manifest()
+            if manifest is None:
+                return
+
+            self.unlink_all(manifest)
+            os.remove(self.manifest_path)
+
+    def unlink_all(self, manifest):
+        """
+        Remove the segments of a manifest
+        """
+        for name in manifest["segments"].values():
+            unlink_segment(name)
+        for entry in manifest["clusters"].values():
+            unlink_segment(entry["segment"])
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from map.models import DataVersion, Point
+
+
+@receiver(pre_save, sender=Point)
+def remember_date(sender, instance, **kwargs):
+    """
+    Remember the previous dataset and date of an updated point, its old date changes too
+    """
+    instance._previous_date = None
+    if instance.pk is not None:
+        instance._previous_date = Point.objects.filter(pk=instance.pk).values_list('dataset', 'date').first()
+
+
+@receiver(post_save, sender=Point)
+def bump_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_date', None)
+    if previous is not None and previous[0] != instance.dataset_id:
+        DataVersion.objects.bump(previous[0], [previous[1]])
+        previous = None
+
+    dates = [instance.date]
+    if previous is not None:
+        dates.append(previous[1])
+    DataVersion.objects.bump(instance.dataset_id, dates)
+
+
+@receiver(post_delete, sender=Point)
+def bump_on_delete(sender, instance, **kwargs):
+    DataVersion.objects.bump(instance.dataset_id, [instance.date])
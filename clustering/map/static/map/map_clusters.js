@@ -2,7 +2,7 @@
 // Set up map
 const map = L.map('mapid',
 	{zoomSnap:0.5,
-	 zoomDelta:0.5}).setView([50.81301, 4.37613], 14);
+	 zoomDelta:0.5}).setView(dataset["center"], dataset["zoom"]);
 
 L.tileLayer('https://api.mapbox.com/styles/v1/{id}/tiles/{z}/{x}/{y}?access_token={accessToken}', {
     attribution: 'Map data &copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors, Imagery © <a href="https://www.mapbox.com/">Mapbox</a>',
@@ -46,8 +46,8 @@ function getColor(numPoints){
 }
 
 // Add the centroids and circles to the map
-if (centroidData){
-	L.geoJSON(centroidData, {
+function showCentroids(data){
+	return L.geoJSON(data, {
 		pointToLayer: function (feature, latlng) {
 			var size = parseFloat(feature.properties.size) * 1000;
 			return L.circle(latlng, {
@@ -62,3 +62,33 @@ if (centroidData){
 	}).addTo(map);
 }
 
+let centroidLayer = null;
+if (centroidData){
+	centroidLayer = showCentroids(centroidData);
+}
+
+
+// Heat layer (see HeatmapTileView): density of the points of the window, as PNG tiles
+function heatUrl(isoDate){
+	return "/heatmap/{z}/{x}/{y}?date=" + isoDate + "&" + mapQuery;
+}
+
+const heatDate = date["year"] + "-" + String(date["month"]).padStart(2, "0") + "-" + String(date["day"]).padStart(2, "0");
+const heatLayer = L.tileLayer(heatUrl(heatDate), {opacity: 0.7, maxZoom: 20});
+
+L.control.layers(null, {"Heatmap": heatLayer}).addTo(map);
+
+
+// Called by navigation.js when the date changes: replace the clusters without reloading the page
+function updateData(isoDate){
+	fetch("/api/clusters?date=" + isoDate + "&" + mapQuery)
+		.then(response => response.json())
+		.then(data => {
+			if (centroidLayer){
+				map.removeLayer(centroidLayer);
+			}
+			centroidLayer = showCentroids(data);
+		});
+	heatLayer.setUrl(heatUrl(isoDate));
+}
+
@@ -2,7 +2,7 @@
 // Set up map
 const map = L.map('mapid',
 	{zoomSnap:0.5,
-	 zoomDelta:0.5}).setView([50.81301, 4.37613], 14);
+	 zoomDelta:0.5}).setView(dataset["center"], dataset["zoom"]);
 
 L.tileLayer('https://api.mapbox.com/styles/v1/{id}/tiles/{z}/{x}/{y}?access_token={accessToken}', {
     attribution: 'Map data &copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors, Imagery © <a href="https://www.mapbox.com/">Mapbox</a>',
@@ -49,11 +49,126 @@ function onEachFeature(feature, layer) {
 
 
 // Add the points to the map
-L.geoJSON(pointData, {
-    pointToLayer: function (feature, latlng) {
-        return L.circleMarker(latlng, geojsonMarkerOptions(feature));
-    },
-	onEachFeature: onEachFeature
-}).addTo(map);
+function showPoints(data){
+	return L.geoJSON(data, {
+		pointToLayer: function (feature, latlng) {
+			return L.circleMarker(latlng, geojsonMarkerOptions(feature));
+		},
+		onEachFeature: onEachFeature
+	});
+}
+
+// The layer group stays the same, only its content changes with the date and the view
+const pointLayer = L.layerGroup([showPoints(pointData)]).addTo(map);
+
+
+// Aggregated tiles (see TileView): only the visible tiles are downloaded,
+// as grid counts at low zoom and as points at high zoom
+function pad(n){
+	return (n < 10 ? "0" : "") + n;
+}
+
+let tileDate = date["year"] + "-" + pad(date["month"]) + "-" + pad(date["day"]);
+
+const AggregateLayer = L.GridLayer.extend({
+	createTile: function(coords, done){
+		const tile = L.DomUtil.create("canvas", "leaflet-tile");
+		const size = this.getTileSize();
+		tile.width = size.x;
+		tile.height = size.y;
+
+		fetch("/tiles/" + coords.z + "/" + coords.x + "/" + coords.y + "?date=" + tileDate + "&" + mapQuery)
+			.then(response => response.json())
+			.then(data => {
+				const ctx = tile.getContext("2d");
+				const origin = coords.scaleBy(size);
+				ctx.fillStyle = "rgba(255, 0, 0, 0.6)";
+				ctx.strokeStyle = "#000";
+
+				const features = data.type === "grid" ? data.cells : data.points;
+				for (const feature of features){
+					let lat, lng, radius;
+					if (data.type === "grid"){
+						lat = feature[3];
+						lng = feature[4];
+						radius = Math.min(3 + 2*Math.sqrt(feature[2]), size.x/data.size);
+					}else{
+						lat = feature[0];
+						lng = feature[1];
+						radius = 5;
+					}
+					const p = map.project([lat, lng], coords.z).subtract(origin);
+					ctx.beginPath();
+					ctx.arc(p.x, p.y, radius, 0, 2*Math.PI);
+					ctx.fill();
+					ctx.stroke();
+				}
+				done(null, tile);
+			})
+			.catch(error => done(error, tile));
+
+		return tile;
+	}
+});
+
+const tileLayer = new AggregateLayer();
+
+L.control.layers(null, {"Points": pointLayer, "Aggregated tiles": tileLayer}).addTo(map);
 
 
+// Decode the compact binary format (see map/binary.py) into a layer of points
+const HEADER_SIZE = 28;
+
+function showBinaryPoints(buffer){
+	const view = new DataView(buffer);
+	const numPoints = view.getUint32(8, true);
+	const firstDay = view.getInt32(12, true);
+	const scale = view.getUint32(16, true);
+	let lat = view.getInt32(20, true);
+	let lng = view.getInt32(24, true);
+
+	// Typed arrays read the columns without copying them (little-endian, like the server)
+	let offset = HEADER_SIZE;
+	const dlat = new Int32Array(buffer, offset, numPoints);
+	offset += 4*numPoints;
+	const dlng = new Int32Array(buffer, offset, numPoints);
+	offset += 4*numPoints;
+	const days = new Uint16Array(buffer, offset, numPoints);
+	offset += 2*numPoints;
+	const states = new Uint8Array(buffer, offset, numPoints);
+
+	const layer = L.layerGroup();
+	for (let i = 0; i < numPoints; i++){
+		lat += dlat[i];
+		lng += dlng[i];
+
+		const feature = {properties: {state: states[i],
+		                              date: new Date((firstDay + days[i])*86400000).toISOString().slice(0, 10)}};
+		const marker = L.circleMarker([lat/scale, lng/scale], geojsonMarkerOptions(feature));
+		onEachFeature(feature, marker);
+		layer.addLayer(marker);
+	}
+	return layer;
+}
+
+
+// Load the points of the visible part of the map only
+function loadPoints(){
+	const url = "/api/points?format=bin&date=" + tileDate + "&bbox=" + map.getBounds().toBBoxString() + "&" + mapQuery;
+	fetch(url)
+		.then(response => response.arrayBuffer())
+		.then(buffer => {
+			pointLayer.clearLayers();
+			pointLayer.addLayer(showBinaryPoints(buffer));
+		});
+}
+
+map.on("moveend", loadPoints);
+
+
+// Called by navigation.js when the date changes: replace the points without reloading the page
+function updateData(isoDate){
+	tileDate = isoDate;
+	loadPoints();
+	tileLayer.redraw();
+}
@@ -2,6 +2,14 @@
 // Get JSON data
 const date = JSON.parse(document.getElementById('date').textContent);
 const mode = JSON.parse(document.getElementById('mode').textContent);
+const dataset = JSON.parse(document.getElementById('dataset').textContent);
+const states = JSON.parse(document.getElementById('states').textContent);
+
+// Every page and request of the map keeps the dataset, and the states of the points if they were given
+let mapQuery = "dataset=" + encodeURIComponent(dataset["slug"]);
+if (states){
+	mapQuery += "&states=" + encodeURIComponent(states);
+}
 
 const datepicker = $("#datepicker");
 
@@ -17,11 +25,18 @@ datepicker.datepicker().on("input change", function (e) {
 	let dateText = e.target.value;
 	dateText = dateText.replaceAll("/", "-");
 	if (mode === "point"){
-		url = "/points/date/" + dateText;
+		url = "/points/date/" + dateText + "?" + mapQuery;
 	}else{
-		url = "/clusters/date/" + dateText;
+		url = "/clusters/date/" + dateText + "?" + mapQuery;
+	}
+
+	// Only the data is fetched again (see updateData in map_points.js and map_clusters.js),
+	// the URL is updated so that the page can still be bookmarked
+	const parts = dateText.split("-");
+	if (parts.length === 3){
+		updateData(parts[2] + "-" + parts[0] + "-" + parts[1]);
+		window.history.replaceState(null, "", url);
 	}
-    window.location.replace(url);
 });
 
 
@@ -30,7 +45,7 @@ function changeMode(newMode){
 	if (mode !== newMode) {
 		let dateText = datepicker.val();
 		dateText = dateText.replaceAll("/", "-");
-		const url = "/" + newMode + "/date/" + dateText;
+		const url = "/" + newMode + "/date/" + dateText + "?" + mapQuery;
 		window.location.replace(url);
 	}
 }
@@ -12,8 +12,8 @@ function radioChange(e){
 	console.log("test");
 	switch(e.target.id){
 		case 'latlng':
-			window.location.replace("/new_coord"); break;
+			window.location.replace("/new_coord" + window.location.search); break;
 		case 'addr':
-			window.location.replace("/new_addr"); break;
+			window.location.replace("/new_addr" + window.location.search); break;
 	}
 }
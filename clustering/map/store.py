@@ -0,0 +1,223 @@
+import datetime
+import threading
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from map.algorithms.columns import EPOCH, PointColumns
+from map.models import DataVersion, Point
+from map import metrics
+
+
+class PointStore():
+    """
+    Every point of a dataset held in memory as columns sorted by date,
+    shared by the requests of the process.
+
+    Any window of days is two binary searches and a slice (a view, nothing is copied).
+    The store follows the data versions: when points are written (by this process
+    or another one), only the dates whose version changed are read again.
+    """
+
+    def __init__(self, dataset):
+        """
+        Constructor
+
+        Parameters
+        ----------
+            dataset : int
+                id of the dataset of the points
+        """
+        self.dataset = dataset
+        self.columns = None
+        self.versions = {}
+        self.global_version = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Bring the store up to date with the database
+        """
+        # Cheap check first: nothing to do if no point was written
+        global_version = DataVersion.objects.global_version(self.dataset)
+        if global_version == self.global_version and self.columns is not None:
+            return
+
+        with self.lock:
+            if global_version == self.global_version and self.columns is not None:
+                return
+
+            with metrics.timer("store_refresh"):
+                self.columns, self.versions = self.read(self.columns, self.versions)
+            self.global_version = max(self.versions.values(), default=0)
+
+    def read(self, columns, versions):
+        """
+        Read the points written since the given versions
+
+        Parameters
+        ----------
+            columns : PointColumns or None
+                points of the given versions, None to read every point
+            versions : dict
+                version of each date of the columns
+
+        Returns
+        -------
+            columns : PointColumns
+                up to date points, sorted by date
+            versions : dict
+                version of each date of the points
+        """
+        # Versions are read before the points, so that a concurrent write
+        # leaves an old version behind and is read again at the next refresh
+        new_versions = dict(DataVersion.objects.filter(dataset=self.dataset).values_list('date', 'version'))
+
+        if columns is None:
+            return Point.objects.filter(dataset=self.dataset).order_by('date').columns(), new_versions
+
+        changed = [day for day in set(versions) | set(new_versions)
+                   if versions.get(day) != new_versions.get(day)]
+        return self.replace_dates(columns, changed), new_versions
+
+    def replace_dates(self, columns, dates):
+        """
+        Read the points of the given dates again, and merge them with the other points
+        """
+        if len(dates) == 0:
+            return columns
+
+        days = np.asarray([(day - EPOCH).days for day in dates])
+        kept = columns.take(~np.isin(columns.day, days))
+        new = Point.objects.filter(dataset=self.dataset, date__in=dates).columns()
+
+        merged = PointColumns(np.concatenate([kept.latitude, new.latitude]),
+                              np.concatenate([kept.longitude, new.longitude]),
+                              np.concatenate([kept.day, new.day]),
+                              np.concatenate([kept.state, new.state]))
+
+        # Stable sort keeps the order of the points of the same date
+        return merged.take(np.argsort(merged.day, kind='stable'))
+
+    def window(self, start, end):
+        """
+        Points between start and end (included)
+
+        Parameters
+        ----------
+            start : date
+                first day of the window
+            end : date
+                last day of the window
+
+        Returns
+        -------
+            columns : PointColumns
+                points of the window, sorted by date
+        """
+        self.refresh()
+        columns = self.columns
+
+        with metrics.timer("window"):
+            first = np.searchsorted(columns.day, (start - EPOCH).days, side='left')
+            last = np.searchsorted(columns.day, (end - EPOCH).days, side='right')
+
+            return columns.take(slice(first, last))
+
+    def get_clusters(self, keys):
+        """
+        Cluster results already computed, from the cache
+
+        Parameters
+        ----------
+            keys : list
+                keys of the results. The cache is shared by the datasets, keys must contain the dataset id
+
+        Returns
+        -------
+            results : dict
+                results found, indexed by key
+        """
+        return cache.get_many(keys)
+
+    def set_clusters(self, results):
+        """
+        Store cluster results in the cache
+
+        Parameters
+        ----------
+            results : dict
+                (first date, last date, result) indexed by key. Dates are the window of the result
+        """
+        cache.set_many({key: result for key, (first, last, result) in results.items()},
+                       settings.CLUSTER_CACHE_TIMEOUT)
+
+
+def create_store(dataset):
+    """
+    Store of a dataset for the process, or shared by the processes of the server (see map/shared.py)
+    """
+    if settings.SHARED_MEMORY_STORE:
+        from map.shared import SharedPointStore
+        return SharedPointStore(dataset, settings.SHARED_MEMORY_DIR, settings.SHARED_MEMORY_PREFIX)
+    return PointStore(dataset)
+
+
+# Stores of the process, indexed by dataset id
+stores = {}
+stores_lock = threading.Lock()
+
+
+def for_dataset(dataset):
+    """
+    Store of the process for a dataset, created at its first use
+
+    Parameters
+    ----------
+        dataset : int
+            id of the dataset
+
+    Returns
+    -------
+        store : PointStore
+            store of the dataset
+    """
+    store = stores.get(dataset)
+    if store is None:
+        with stores_lock:
+            store = stores.get(dataset)
+            if store is None:
+                store = stores[dataset] = create_store(dataset)
+    return store
+
+
+def get_window(dataset, request_date, days, bbox=None, states=None):
+    """
+    Points of the window of a date, from the store of the process
+
+    Parameters
+    ----------
+        dataset : int
+            id of the dataset
+        request_date : date
+            last day of the window
+        days : int
+            length of the window, before request_date
+        bbox : list, optional
+            (min_lng, min_lat, max_lng, max_lat) of the points to keep
+        states : set, optional
+            states of the points to keep, all by default
+
+    Returns
+    -------
+        columns : PointColumns
+            points of the window
+    """
+    columns = for_dataset(dataset).window(request_date - datetime.timedelta(days=days), request_date)
+
+    if bbox is not None:
+        columns = columns.within(*bbox)
+
+    if states is not None:
+        columns = columns.with_states(states)
+
+    return columns
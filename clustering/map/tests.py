@@ -1,3 +1,1063 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import os
+import re
+import tempfile
+from unittest import mock
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
+from django.test import LiveServerTestCase, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from map import algorithms, async_views, binary, geocoding, geojson, heatmap, loadtest, metrics, store, upload
+from map.algorithms import order_selection
+from map.algorithms.columns import EPOCH, PointColumns
+from map.hotspots import observed_counts, point_counts
+from map.models import Dataset, DataVersion, Point
+from map.shared import SharedPointStore
+from map.tiles import tile_data
 
-# Create your tests here.
+
+def add_points(dataset, points):
+    """
+    Insert (state, lat, lng, municipality, date) points in a dataset
+    """
+    Point.objects.bulk_create_points([(state, lat, lng, "Unknown", municipality, date)
+                                      for state, lat, lng, municipality, date in points], dataset.pk)
+
+
+def streamed_json(response):
+    """
+    Content of a streamed JSON response
+    """
+    return json.loads(b"".join(response.streaming_content))
+
+
+class MapTestCase(TestCase):
+    """
+    Base class of the tests. Versions start again with every test,
+    so the point stores and the cached results of the previous tests are dropped
+    """
+
+    def setUp(self):
+        store.stores.clear()
+        cache.clear()
+
+
+class ObservedCountsTests(MapTestCase):
+    """
+    Points counted by the scan statistic
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = Dataset.objects.get_default()
+        self.locator = algorithms.MunicipalityLocator(self.dataset.municipality_data()[1])
+        self.start = datetime.date(2021, 1, 10)
+
+    def test_stored_municipalities(self):
+        day = [self.start + datetime.timedelta(days=i) for i in range(4)]
+        # Center of Bruxelles, inside the circles of some of its neighbours
+        lat, lng = 50.86506, 4.37802
+        add_points(self.dataset, [(Point.POSITIVE, lat, lng, "Bruxelles", day[0]),
+                                  (Point.POSITIVE, lat, lng, "Bruxelles", day[0]),
+                                  # Stored municipality wins over the circles
+                                  (Point.POSITIVE, lat, lng, "Schaerbeek", day[0]),
+                                  (Point.POSITIVE, lat, lng, "Ixelles", day[2]),
+                                  # Located with the circles
+                                  (Point.POSITIVE, lat, lng, "Unknown", day[1]),
+                                  (Point.POSITIVE, 51.5, 3.0, "Unknown", day[1]),
+                                  # Left out: other state, other dates
+                                  (Point.NEGATIVE, lat, lng, "Bruxelles", day[1]),
+                                  (Point.POSITIVE, lat, lng, "Bruxelles", day[3]),
+                                  (Point.POSITIVE, lat, lng, "Bruxelles", day[0] - datetime.timedelta(days=1))])
+
+        counts = observed_counts(*point_counts(self.dataset, day[0], day[2], {Point.POSITIVE},
+                                               list(self.locator.names)),
+                                 self.locator, day[0], 3)
+
+        names = list(self.locator.names)
+        expected = np.zeros((len(names), 3), dtype=np.int64)
+        expected[names.index("Bruxelles"), 0] = 2
+        expected[names.index("Schaerbeek"), 0] = 1
+        expected[names.index("Ixelles"), 2] = 1
+        expected[names.index("Bruxelles"), 1] = 1
+        np.testing.assert_array_equal(counts, expected)
+
+    def test_states(self):
+        add_points(self.dataset, [(Point.POSITIVE, 50.8, 4.3, "Anderlecht", self.start),
+                                  (Point.RECOVERED, 50.8, 4.3, "Anderlecht", self.start)])
+
+        counts = observed_counts(*point_counts(self.dataset, self.start, self.start,
+                                               {Point.POSITIVE, Point.RECOVERED}, list(self.locator.names)),
+                                 self.locator, self.start, 1)
+
+        self.assertEqual(counts[list(self.locator.names).index("Anderlecht"), 0], 2)
+        self.assertEqual(counts.sum(), 2)
+
+    def test_unmatched_names(self):
+        # Names of the geocoder that are not municipalities of the dataset are located like "Unknown"
+        add_points(self.dataset, [(Point.POSITIVE, 50.8, 4.3, "Gent", self.start),
+                                  (Point.POSITIVE, 50.8, 4.3, "Bruxelles-Capitale", self.start),
+                                  (Point.POSITIVE, 51.5, 3.0, "Gent", self.start)])
+
+        counts = observed_counts(*point_counts(self.dataset, self.start, self.start, {Point.POSITIVE},
+                                               list(self.locator.names)),
+                                 self.locator, self.start, 1)
+
+        located = self.locator.locate(np.asarray([50.8]), np.asarray([4.3]))[0]
+        self.assertEqual(counts[list(self.locator.names).index(located), 0], 2)
+        self.assertEqual(counts.sum(), 2)
+
+
+class UploadTests(MapTestCase):
+    """
+    Validation of uploaded CSV files, and upload endpoint
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = Dataset.objects.get_default()
+        add_points(self.dataset, [(Point.POSITIVE, 50.8596, 4.27701, "Anderlecht", datetime.date(2021, 1, 1))])
+
+    def validate(self, rows):
+        return upload.validate(upload.read_upload(("date,lat,lng,state\n" + "\n".join(rows)).encode()),
+                               self.dataset.pk)
+
+    def test_invalid_rows(self):
+        points, errors = self.validate(["2021-02-30,50.8,4.3,1",
+                                        "01/01/2021,50.8,4.3,1",
+                                        "2021-01-02,91,4.3,1",
+                                        "2021-01-02,50.8,-180.5,1",
+                                        "2021-01-02,abc,4.3,1",
+                                        "2021-01-02,50.8,4.3,4",
+                                        "2021-01-02,50.8,4.3,1.5",
+                                        "2021-01-02,50.8,4.3,"])
+
+        self.assertEqual(errors, {0: ["date must be in YYYY-MM-DD format"],
+                                  1: ["date must be in YYYY-MM-DD format"],
+                                  2: ["lat must be a number between -90 and 90"],
+                                  3: ["lng must be a number between -180 and 180"],
+                                  4: ["lat must be a number between -90 and 90"],
+                                  5: ["state must be one of 0, 1, 2, 3"],
+                                  6: ["state must be one of 0, 1, 2, 3"]})
+        self.assertEqual(points["state"][7], Point.POSITIVE)
+
+    def test_duplicates(self):
+        points, errors = self.validate(["2021-01-02,50.8,4.3,1",
+                                        "2021-01-02,50.800001,4.3,1",
+                                        "2021-01-02,50.8,4.3,2",
+                                        # Same point as in the database, with float and int states
+                                        "2021-01-01,50.8596,4.27701,1.0",
+                                        "2021-01-01,50.85960,4.27701,1",
+                                        "2021-01-01,50.8596,4.27701,0",
+                                        # Invalid rows are neither duplicates nor in the database
+                                        "2021-01-01,50.8596,4.27701,x",
+                                        "2021-01-01,50.8596,4.27701,x"])
+
+        self.assertEqual(errors, {1: ["duplicate of a previous row"],
+                                  3: ["point already in the database"],
+                                  4: ["duplicate of a previous row", "point already in the database"],
+                                  6: ["state must be one of 0, 1, 2, 3"],
+                                  7: ["state must be one of 0, 1, 2, 3"]})
+
+    def test_token(self):
+        data = b"date,lat,lng\n2021-01-02,50.8,4.3\n"
+
+        response = self.client.post("/api/points/upload", data, content_type="text/csv")
+        self.assertEqual(response.status_code, 401)
+
+        with override_settings(UPLOAD_TOKENS=["secret"]):
+            response = self.client.post("/api/points/upload", data, content_type="text/csv",
+                                        HTTP_AUTHORIZATION="Token wrong")
+            self.assertEqual(response.status_code, 401)
+
+            response = self.client.post("/api/points/upload", data, content_type="text/csv",
+                                        HTTP_AUTHORIZATION="Token secret")
+            self.assertEqual(response.json()["inserted"], 1)
+
+        self.assertEqual(Point.objects.filter(date=datetime.date(2021, 1, 2)).count(), 1)
+
+
+class AsyncViewTests(MapTestCase):
+    """
+    Database work of the async views runs in the threads of the server, not on the event loop
+    """
+
+    def test_form_validation(self):
+        request = RequestFactory().post("/new_point_coord", {"dataset": "brussels", "state": Point.POSITIVE,
+                                                            "latitude": "not a number", "longitude": 4.3,
+                                                            "date": "2021-01-01"})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = asyncio.run(async_views.point_coord_create(request))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 0)
+
+
+class AsyncGeocodingTests(TransactionTestCase):
+    """
+    Async views geocode with the Nominatim stub, within the limits of the geocoder.
+    The points are saved by the threads of the server, so the test commits them
+    """
+    serialized_rollback = True
+
+    def setUp(self):
+        store.stores.clear()
+        cache.clear()
+        self.dataset = Dataset.objects.get_default()
+        self.locator = algorithms.MunicipalityLocator(self.dataset.municipality_data()[1])
+
+        stub, address = loadtest.start_stub(self.locator, delay=0.1)
+        self.addCleanup(stub.shutdown)
+        geocoder_settings = override_settings(GEOCODER_DOMAIN=address, GEOCODER_SCHEME='http', GEOCODER_MIN_DELAY=0)
+        geocoder_settings.enable()
+        self.addCleanup(geocoder_settings.disable)
+
+    def post(self, view, data):
+        async def call():
+            try:
+                return await view(RequestFactory().post("/", dict(data, dataset=self.dataset.slug)))
+            finally:
+                await geocoding.close_async_geocoder()
+
+        return asyncio.run(call())
+
+    def municipality(self, point):
+        return self.locator.locate(np.asarray([point.latitude]), np.asarray([point.longitude]))[0]
+
+    def test_coord(self):
+        response = self.post(async_views.point_coord_create, {"state": Point.POSITIVE, "date": "2021-01-01",
+                                                              "latitude": 50.84, "longitude": 4.36})
+        self.assertEqual(response.status_code, 302)
+
+        point = Point.objects.get(dataset=self.dataset)
+        self.assertEqual(point.municipality, self.municipality(point))
+        self.assertEqual(point.address, f"1 Rue de la Charge, {point.municipality}, Belgique")
+
+    def test_addr(self):
+        response = self.post(async_views.point_addr_create, {"state": Point.POSITIVE, "date": "2021-01-01",
+                                                             "address": "16 Rue de la Loi, Bruxelles"})
+        self.assertEqual(response.status_code, 302)
+
+        point = Point.objects.get(dataset=self.dataset)
+        self.assertTrue(loadtest.MIN_LAT <= point.latitude <= loadtest.MAX_LAT)
+        self.assertTrue(loadtest.MIN_LNG <= point.longitude <= loadtest.MAX_LNG)
+        self.assertEqual(point.municipality, self.municipality(point))
+
+    def test_limits(self):
+        min_delay, max_concurrency = 0.02, 2
+
+        async def run():
+            geocoder = geocoding.AsyncGeocoder(min_delay=min_delay, max_concurrency=max_concurrency)
+            reverse = geocoder.geolocator.reverse
+            loop = asyncio.get_running_loop()
+            starts, in_progress, peak = [], 0, 0
+
+            async def measured(query):
+                nonlocal in_progress, peak
+                starts.append(loop.time())
+                in_progress += 1
+                peak = max(peak, in_progress)
+                try:
+                    return await reverse(query)
+                finally:
+                    in_progress -= 1
+
+            geocoder.geolocator.reverse = measured
+            try:
+                locations = await asyncio.gather(*[geocoder.reverse(f"50.8{i}, 4.35") for i in range(6)])
+            finally:
+                await geocoder.close()
+            return locations, starts, peak
+
+        locations, starts, peak = asyncio.run(run())
+
+        self.assertEqual(len(locations), 6)
+        # The stub answers after 0.1 s, so more requests would be in progress without the semaphore
+        self.assertEqual(peak, max_concurrency)
+        self.assertGreaterEqual(min(np.diff(starts)), min_delay*0.95)
+
+
+class DatasetETagTests(MapTestCase):
+    """
+    ETags of the map views change with the parameters of their dataset
+    """
+
+    def test_parameters(self):
+        url = "/api/clusters?date=2021-01-15"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        dataset = Dataset.objects.get_default()
+        dataset.cluster_eps = 0.02
+        dataset.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class BoundingBoxTests(MapTestCase):
+    """
+    Bounding box queries and clusters
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = Dataset.objects.get_default()
+        day = datetime.date(2021, 1, 15)
+        rng = np.random.default_rng(0)
+        # Two groups of points, one on each side of longitude 4.35
+        points = [(Point.POSITIVE, 50.85 + rng.normal(0, 0.001), lng + rng.normal(0, 0.001), "Bruxelles", day)
+                  for lng in (4.33, 4.37) for _ in range(20)]
+        add_points(self.dataset, points + [(Point.POSITIVE, 50.7, 4.5, "Auderghem", day)])
+
+    def test_in_bbox(self):
+        bbox = (4.35, 50.8, 4.4, 50.9)
+        expected = Point.objects.filter(latitude__gte=50.8, latitude__lte=50.9, longitude__gte=4.35,
+                                        longitude__lte=4.4)
+
+        self.assertEqual(Point.objects.in_bbox(*bbox).count(), 20)
+        self.assertEqual(set(Point.objects.in_bbox(*bbox).values_list('id', flat=True)),
+                         set(expected.values_list('id', flat=True)))
+
+    def test_clusters(self):
+        url = "/api/clusters?date=2021-01-15"
+        everywhere = streamed_json(self.client.get(url))["features"]
+        east = streamed_json(self.client.get(url + "&bbox=4.35,50.8,4.4,50.9"))["features"]
+
+        self.assertEqual(len(everywhere), 2)
+        self.assertEqual(east, [feature for feature in everywhere
+                                if float(feature["geometry"]["coordinates"][0]) >= 4.35])
+
+
+class ExportTests(MapTestCase):
+    """
+    Limits of the export views
+    """
+
+    @override_settings(EXPORT_CLUSTERS_MAX_DAYS=31)
+    def test_cluster_range(self):
+        response = self.client.get("/api/export/clusters?start=2021-01-01&end=2021-02-01")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get("/api/export/clusters?start=2021-01-01&end=2021-01-31")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content).splitlines()[0].split(b",")[0], b"date")
+
+
+class CacheControlTests(MapTestCase):
+    """
+    Shared caches may keep the APIs, not the pages (they carry the CSRF token of their user)
+    """
+
+    def test_pages(self):
+        for url in ["/clusters", "/points/date/01-15-2021"]:
+            cache_control = self.client.get(url)["Cache-Control"]
+            self.assertIn("private", cache_control)
+            self.assertNotIn("public", cache_control)
+
+    def test_apis(self):
+        for url in ["/api/clusters?date=2021-01-15", "/api/points?date=2021-01-15", "/tiles/10/524/342?date=2021-01-15"]:
+            cache_control = self.client.get(url)["Cache-Control"]
+            self.assertEqual(set(cache_control.split(", ")), {"max-age=0", "public"})
+
+
+class BinaryTests(MapTestCase):
+    """
+    Compact binary point payload
+    """
+
+    def test_round_trip(self):
+        columns = PointColumns([50.85, 50.84321, -33.5, 89.99999], [4.35, 4.40001, -70.12345, -179.99999],
+                               [18640, 18650, 18641, 18640], [1, 0, 2, 3])
+
+        latitude, longitude, day, state = binary.decode_points(binary.encode_points(columns))
+
+        np.testing.assert_allclose(latitude, columns.latitude, atol=1e-9)
+        np.testing.assert_allclose(longitude, columns.longitude, atol=1e-9)
+        np.testing.assert_array_equal(day, columns.day)
+        np.testing.assert_array_equal(state, columns.state)
+
+    def test_empty(self):
+        latitude, longitude, day, state = binary.decode_points(binary.encode_points(PointColumns([], [], [], [])))
+        self.assertEqual(len(latitude) + len(longitude) + len(day) + len(state), 0)
+
+    def test_magic(self):
+        with self.assertRaises(ValueError):
+            binary.decode_points(b"JSON" + binary.encode_points(PointColumns([1], [2], [3], [1]))[4:])
+
+    def test_view(self):
+        add_points(Dataset.objects.get_default(), [(Point.POSITIVE, 50.85123, 4.35456, "Bruxelles",
+                                                    datetime.date(2021, 1, 15))])
+
+        response = self.client.get("/api/points?date=2021-01-15", HTTP_ACCEPT=binary.CONTENT_TYPE)
+        data = b"".join(response.streaming_content) if response.streaming else response.content
+        latitude, longitude, day, state = binary.decode_points(data)
+
+        self.assertEqual(response["Content-Type"], binary.CONTENT_TYPE)
+        self.assertEqual((latitude.tolist(), longitude.tolist()), ([50.85123], [4.35456]))
+        self.assertEqual(day.tolist(), [(datetime.date(2021, 1, 15) - EPOCH).days])
+
+
+class LoadTests(LiveServerTestCase):
+    """
+    Virtual users of the load test store their new cases
+    """
+    serialized_rollback = True
+
+    def setUp(self):
+        store.stores.clear()
+        cache.clear()
+        self.dataset = Dataset.objects.get_default()
+        self.dates = [datetime.date(2021, 3, 1) + datetime.timedelta(days=i) for i in range(3)]
+        add_points(self.dataset, [(Point.POSITIVE, 50.85, 4.35, "Bruxelles", day) for day in self.dates])
+
+        self.stub, self.stub_address = loadtest.start_stub()
+        self.addCleanup(self.stub.shutdown)
+
+    def test_insert(self):
+        with self.settings(GEOCODER_DOMAIN=self.stub_address, GEOCODER_SCHEME='http', GEOCODER_MIN_DELAY=0):
+            report = loadtest.run_load(self.live_server_url, self.dataset.slug, self.dates, 1, 1,
+                                       {"scrub": 0, "popular": 0, "insert": 1}, think_time=0)
+
+        forms = [report[endpoint] for endpoint in ("new_coord", "new_addr") if endpoint in report]
+        inserted = sum(stats["count"] for stats in forms)
+        self.assertGreater(inserted, 0)
+        self.assertEqual(sum(stats["errors"] for stats in forms), 0)
+        self.assertEqual(Point.objects.filter(dataset=self.dataset).count(), len(self.dates) + inserted)
+
+
+class BulkGenerationTests(MapTestCase):
+    """
+    Points generated on a range of days
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.data = algorithms.load_municipality_data()
+        self.start = datetime.date(2021, 1, 10)
+        self.end = datetime.date(2021, 1, 14)
+        # Past points of Ixelles: before the window of the first day, in it, and on a day of the range
+        self.past_points = [("Ixelles", self.start - datetime.timedelta(days=days), 50.83 + days/1000, 4.37)
+                            for days in (4, 3, 2, 1)]
+        self.past_points += [("ixelles", self.start + datetime.timedelta(days=2), 50.82, 4.38)]
+
+    def generator(self, seed, window=10):
+        return algorithms.BulkPointGenerator(self.past_points, self.start, self.end, seed, window=window,
+                                             data=self.data)
+
+    def test_seed(self):
+        points = self.generator(3).generate()
+        self.assertGreater(len(points), 0)
+        self.assertEqual(points, self.generator(3).generate())
+        # Municipalities have their own generators, whatever the process that generates them
+        self.assertEqual(points, self.generator(3).generate(workers=2))
+        self.assertNotEqual(points, self.generator(4).generate())
+
+    def test_window(self):
+        window = 3
+        generator = self.generator(0, window=window)
+        calls = []
+        random_points = algorithms.PointGenerator.random_points
+
+        def record(point_generator, mun, mun_points):
+            calls.append((point_generator.date, mun, mun_points))
+            return random_points(point_generator, mun, mun_points)
+
+        with mock.patch.object(algorithms.PointGenerator, "random_points", record):
+            new_points = generator.generate_municipality("Ixelles")
+
+        # Points of the municipality between date - window and date, like the query of PointGenerator:
+        # the points generated on that date are not in it yet
+        past = [(date, [lat, lng]) for mun, date, lat, lng in self.past_points]
+        generated = [(date, [float(coords[0]), float(coords[1])]) for coords, mun, date in new_points]
+        self.assertEqual([date for date, mun, mun_points in calls], generator.dates)
+        for date, mun, mun_points in calls:
+            first = date - datetime.timedelta(days=window)
+            expected = ([coords for day, coords in past if first <= day <= date]
+                        + [coords for day, coords in generated if first <= day < date])
+            self.assertEqual(sorted(mun_points.tolist()), sorted(expected))
+
+
+class ForecastTests(MapTestCase):
+    """
+    SARIMA models of the series, fitted in parallel and cached by data version
+    """
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.series = {name: rng.poisson(10 + 5*np.sin(2*np.pi*np.arange(42)/7)) for name in ("Ixelles", "total")}
+
+    def test_version(self):
+        version = algorithms.series_version(self.series)
+        self.assertEqual(algorithms.series_version(dict(self.series)), version)
+
+        changed = dict(self.series, total=self.series["total"] + 1)
+        self.assertNotEqual(algorithms.series_version(changed), version)
+        orders = {"total": ((1, 0, 0), (0, 1, 0, 7))}
+        self.assertNotEqual(algorithms.series_version(self.series, orders), version)
+
+    def test_parallel_fits(self):
+        fits = algorithms.new_state(self.series)["fits"]
+        parallel = algorithms.new_state(self.series, workers=2)["fits"]
+
+        self.assertEqual(sorted(parallel), sorted(self.series))
+        for name in self.series:
+            np.testing.assert_allclose(parallel[name].params, fits[name].params)
+            self.assertTrue((algorithms.forecast(fits, 7)[name] >= 0).all())
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            forecast_cache = algorithms.ForecastCache(directory)
+            self.assertIsNone(forecast_cache.load_latest())
+
+            state = algorithms.new_state(self.series)
+            forecast_cache.save("a", state)
+            forecast_cache.save("b", state)
+
+            # Only the last version is kept
+            self.assertIsNone(forecast_cache.load("a"))
+            loaded = forecast_cache.load("b")
+            np.testing.assert_array_equal(loaded["series"]["total"], self.series["total"])
+            np.testing.assert_allclose(loaded["fits"]["total"].params, state["fits"]["total"].params)
+            self.assertEqual(os.listdir(directory), ["models-b.pickle"])
+            self.assertIsNotNone(forecast_cache.load_latest())
+
+class ForecastStateTests(MapTestCase):
+    """
+    New days are applied to the SARIMA models, which are only estimated again when needed
+    """
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.counts = rng.poisson(10 + 5*np.sin(2*np.pi*np.arange(60)/7))
+        self.state = algorithms.new_state({"city": self.counts[:42]})
+
+    def update(self, counts, refit_every=30, drift_threshold=10):
+        return algorithms.update_state(self.state, {"city": counts}, refit_every, drift_threshold)
+
+    def assertRefitted(self, state, refitted):
+        # An extended model filters the new days only, with the parameters of the previous one
+        fit = state["fits"]["city"]
+        self.assertEqual(fit.nobs, len(state["series"]["city"]) - (0 if refitted else 42))
+        self.assertEqual(np.array_equal(fit.params, self.state["fits"]["city"].params), not refitted)
+
+    def test_extend(self):
+        state = self.update(self.counts[:45])
+        self.assertRefitted(state, False)
+        self.assertEqual(state["days_since_fit"]["city"], 3)
+        np.testing.assert_array_equal(state["series"]["city"], self.counts[:45])
+
+        # Same days, same models
+        self.assertIs(algorithms.update_state(state, {"city": self.counts[:45]}, 30, 10)["fits"]["city"],
+                      state["fits"]["city"])
+
+    def test_drift(self):
+        outbreak = np.concatenate([self.counts[:42], 10*self.counts[42:45]])
+        state = self.update(outbreak, drift_threshold=3)
+        self.assertRefitted(state, True)
+        self.assertEqual(state["days_since_fit"]["city"], 0)
+
+        # Same days, with a threshold the outbreak does not reach
+        self.assertRefitted(self.update(outbreak, drift_threshold=np.inf), False)
+
+    def test_refit_schedule(self):
+        # Parameters older than refit_every days
+        state = self.update(self.counts[:45], refit_every=2)
+        self.assertRefitted(state, True)
+        self.assertEqual(state["days_since_fit"]["city"], 0)
+
+        # Past counts changed (e.g. a late point)
+        changed = self.counts[:45].copy()
+        changed[10] += 1
+        self.assertRefitted(self.update(changed), True)
+
+        # Another order
+        state = algorithms.update_state(self.state, {"city": self.counts[:45]}, 30, 10,
+                                        orders={"city": ((1, 0, 0), (0, 1, 0, 7))})
+        self.assertEqual(state["orders"]["city"], ((1, 0, 0), (0, 1, 0, 7)))
+        self.assertEqual(state["days_since_fit"]["city"], 0)
+
+
+class OrderSelectionTests(MapTestCase):
+    """
+    Orders of the SARIMA models selected by AIC, with a quick first pass
+    """
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        self.series = {"total": rng.poisson(10 + 5*np.sin(2*np.pi*np.arange(42)/7))}
+        self.candidates = order_selection.candidate_orders(1, 0, 1, 0, 1, 0)
+        self.keys = [order_selection.order_key(*candidate) for candidate in self.candidates]
+
+    def test_candidates(self):
+        self.assertEqual(len(self.candidates), 4)
+        self.assertEqual(order_selection.parse_order_key(self.keys[-1]), ((1, 0, 1), (0, 1, 0, 7)))
+
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                order_selection.select_orders(self.series, self.candidates + [((1, 1, 0), (0, 1, 0, 7))],
+                                              order_selection.OrderCache(directory))
+
+    def test_pruning(self):
+        with tempfile.TemporaryDirectory() as directory:
+            order_cache = order_selection.OrderCache(directory)
+            winner = order_selection.select_orders(self.series, self.candidates, order_cache, margin=0)["total"]
+
+            # Only the best quick candidates are fitted until convergence
+            results = order_cache.load(self.series["total"])
+            self.assertEqual(sorted(results["quick"]), sorted(self.keys))
+            best = min(results["quick"].values())
+            self.assertEqual(sorted(results["full"]),
+                             sorted(key for key, aic in results["quick"].items() if aic <= best))
+            self.assertEqual(winner[2], min(results["full"].values()))
+
+            # Without pruning, the winner is the best of every full fit
+            winner = order_selection.select_orders(self.series, self.candidates, order_cache,
+                                                   margin=np.inf)["total"]
+            results = order_cache.load(self.series["total"])
+            self.assertEqual(sorted(results["full"]), sorted(self.keys))
+            self.assertEqual(order_selection.order_key(*winner[:2]), min(results["full"], key=results["full"].get))
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            order_cache = order_selection.OrderCache(directory)
+            evaluate = order_selection.evaluate
+
+            with mock.patch.object(order_selection, "evaluate", side_effect=evaluate) as fits:
+                winner = order_selection.select_orders(self.series, self.candidates, order_cache, margin=np.inf)
+                self.assertEqual(fits.call_count, 2*len(self.candidates))
+
+                # Same series: every AIC is read from the cache
+                self.assertEqual(order_selection.select_orders(self.series, self.candidates, order_cache,
+                                                               margin=np.inf), winner)
+                self.assertEqual(fits.call_count, 2*len(self.candidates))
+
+                # Another series is evaluated again
+                order_selection.select_orders({"total": self.series["total"] + 1}, self.candidates, order_cache,
+                                              margin=np.inf)
+                self.assertEqual(fits.call_count, 4*len(self.candidates))
+
+
+class GeoJSONTests(MapTestCase):
+    """
+    Streamed GeoJSON documents, whatever the size of their chunks
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.columns = PointColumns.from_rows([(50.85 + i/1000, 4.35 - i/1000, datetime.date(2021, 3, 1 + i), i % 4)
+                                               for i in range(7)])
+        self.centroids = [(50.85, 4.35), (50.8123456, 4.4)]
+        self.num_points, self.sizes = [3, 12], [0.25, 1.5]
+
+    def collection(self, features):
+        return {"type": "FeatureCollection", "features": features}
+
+    def test_points(self):
+        expected = self.collection([{"type": "Feature", "properties": {"state": int(state), "date": str(date)},
+                                     "geometry": {"type": "Point", "coordinates": [round(lng, 5), round(lat, 5)]}}
+                                    for lat, lng, date, state in zip(self.columns.latitude.tolist(),
+                                                                     self.columns.longitude.tolist(),
+                                                                     self.columns.dates(), self.columns.state)])
+
+        # One chunk, like a response that is not streamed
+        document = b"".join(geojson.stream_points(self.columns, chunk_size=len(self.columns)))
+        self.assertEqual(json.loads(document), expected)
+
+        for chunk_size in (1, 2, 3, 6, 100):
+            chunks = list(geojson.stream_points(self.columns, chunk_size=chunk_size))
+            self.assertEqual(b"".join(chunks), document)
+
+        self.assertEqual(json.loads(b"".join(geojson.stream_points(PointColumns([], [], [], [])))),
+                         self.collection([]))
+
+    def test_centroids(self):
+        expected = self.collection([{"type": "Feature", "properties": {"size": size, "numPoints": num},
+                                     "geometry": {"type": "Point", "coordinates": [round(lng, 6), round(lat, 6)]}}
+                                    for (lat, lng), num, size in zip(self.centroids, self.num_points, self.sizes)])
+
+        document = b"".join(geojson.stream_centroids(self.centroids, self.num_points, self.sizes, chunk_size=2))
+        self.assertEqual(json.loads(document), expected)
+        self.assertEqual(b"".join(geojson.stream_centroids(self.centroids, self.num_points, self.sizes,
+                                                           chunk_size=1)), document)
+        self.assertEqual(json.loads(b"".join(geojson.stream_centroids([], [], []))), self.collection([]))
+
+    def test_view(self):
+        dataset = Dataset.objects.get_default()
+        add_points(dataset, [(Point.POSITIVE, 50.85, 4.35, "Bruxelles", datetime.date(2021, 3, 10)),
+                             (Point.RECOVERED, 50.86, 4.36, "Bruxelles", datetime.date(2021, 3, 9))])
+
+        response = self.client.get("/api/points?date=2021-03-10&states=positive,recovered")
+        self.assertEqual(response["Content-Type"], "application/geo+json")
+        features = streamed_json(response)["features"]
+        self.assertEqual(sorted((feature["properties"]["date"], feature["geometry"]["coordinates"])
+                                for feature in features),
+                         [("2021-03-09", [4.36, 50.86]), ("2021-03-10", [4.35, 50.85])])
+
+
+class TileTests(MapTestCase):
+    """
+    Points of map tiles, counted in a grid or sent one by one
+    """
+
+    def setUp(self):
+        super().setUp()
+        # Centers of the four tiles of zoom level 1, in degrees
+        self.columns = PointColumns([45, -45, -45, -40], [-90, 90, 90, 100], [0, 0, 1, 2], [1, 1, 1, 0])
+
+    def test_grid(self):
+        data = tile_data(self.columns, 0, 0, 0, 2, 16)
+
+        self.assertEqual(data["type"], "grid")
+        cells = {(col, row): (count, lat, lng) for col, row, count, lat, lng in data["cells"]}
+        self.assertEqual(set(cells), {(0, 0), (1, 1)})
+        self.assertEqual(cells[(0, 0)], (1, 45, -90))
+        self.assertEqual(cells[(1, 1)][0], 3)
+        self.assertAlmostEqual(cells[(1, 1)][1], -130/3)
+        self.assertAlmostEqual(cells[(1, 1)][2], 280/3)
+
+    def test_points(self):
+        data = tile_data(self.columns, 1, 0, 0, 2, 1)
+        self.assertEqual(data, {"type": "points", "points": [[45, -90, 1, "1970-01-01"]]})
+
+        self.assertEqual(len(tile_data(self.columns, 1, 1, 1, 2, 1)["points"]), 3)
+        self.assertEqual(tile_data(self.columns, 1, 1, 0, 2, 1)["points"], [])
+
+
+class DataVersionTests(MapTestCase):
+    """
+    Versions of the dates, bumped whenever their points change
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = Dataset.objects.get_default()
+        self.day = datetime.date(2021, 3, 1)
+        self.other_day = datetime.date(2021, 3, 5)
+
+    def version(self, day):
+        return DataVersion.objects.window_version(self.dataset.pk, day, day)[0]
+
+    def test_save(self):
+        point = Point.objects.create_point(Point.POSITIVE, 50.85, 4.35, "Address", "Bruxelles", self.day,
+                                           self.dataset.pk)
+        created = self.version(self.day)
+        self.assertGreater(created, 0)
+        self.assertEqual(self.version(self.other_day), 0)
+
+        # Both the old and the new dates of a moved point change
+        point.date = self.other_day
+        point.save()
+        self.assertGreater(self.version(self.day), created)
+        self.assertGreater(self.version(self.other_day), 0)
+
+        moved = self.version(self.other_day)
+        point.delete()
+        self.assertGreater(self.version(self.other_day), moved)
+
+    def test_bulk_create(self):
+        add_points(self.dataset, [(Point.POSITIVE, 50.85, 4.35, "Bruxelles", self.day),
+                                  (Point.POSITIVE, 50.85, 4.35, "Bruxelles", self.other_day)])
+
+        self.assertGreater(self.version(self.day), 0)
+        self.assertEqual(self.version(self.day), self.version(self.other_day))
+        self.assertEqual(self.version(self.day + datetime.timedelta(days=1)), 0)
+
+
+class ConditionalViewTests(MapTestCase):
+    """
+    Map views answer 304 Not Modified only while their window did not change
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = Dataset.objects.get_default()
+        add_points(self.dataset, [(Point.POSITIVE, 50.85, 4.35, "Bruxelles", datetime.date(2021, 3, 10))])
+
+    def test_etag(self):
+        url = "/api/points?date=2021-03-10"
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Points after the window do not change it
+        add_points(self.dataset, [(Point.POSITIVE, 50.85, 4.35, "Bruxelles", datetime.date(2021, 3, 11))])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Points of the window do
+        add_points(self.dataset, [(Point.POSITIVE, 50.86, 4.36, "Bruxelles", datetime.date(2021, 3, 9))])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        # The binary payload of the same URL has another ETag
+        self.assertNotEqual(self.client.get(url, HTTP_ACCEPT=binary.CONTENT_TYPE)["ETag"], response["ETag"])
+
+    def test_errors(self):
+        for url in ["/api/points?date=2021-03-10&bbox=1,2,3", "/api/clusters?date=2021-03-10&states=foo",
+                    "/api/points?date=2021-03-10&window=0", "/tiles/1/2/0?date=2021-03-10",
+                    "/api/clusters/timeline?start=2021-03-10&end=2021-03-11&states=foo"]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400)
+            self.assertNotIn("ETag", response)
+            self.assertNotIn("Last-Modified", response)
+
+
+class PointStoreTests(MapTestCase):
+    """
+    Point stores follow the changes of the points
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = Dataset.objects.get_default()
+        self.days = [datetime.date(2021, 3, 1) + datetime.timedelta(days=i) for i in range(3)]
+        add_points(self.dataset, [(Point.POSITIVE, 50.85, 4.35, "Bruxelles", day) for day in self.days])
+
+    def check_refresh(self, points_store):
+        window = points_store.window(self.days[0], self.days[-1])
+        self.assertEqual(window.day.tolist(), [(day - EPOCH).days for day in self.days])
+
+        # A point moved to another date, and a new point
+        point = Point.objects.get(date=self.days[0])
+        point.date = self.days[2]
+        point.save()
+        Point.objects.create_point(Point.RECOVERED, 50.9, 4.4, "Address", "Bruxelles", self.days[1], self.dataset.pk)
+
+        window = points_store.window(self.days[0], self.days[-1])
+        self.assertEqual(window.day.tolist(), [(day - EPOCH).days for day in self.days[1:2]*2 + self.days[2:]*2])
+        self.assertEqual(sorted(window.state.tolist()), [Point.POSITIVE]*3 + [Point.RECOVERED])
+
+    def test_process_store(self):
+        self.check_refresh(store.PointStore(self.dataset.pk))
+
+    def test_shared_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            prefix = f"stc-test-{os.getpid()}"
+            points_store = SharedPointStore(self.dataset.pk, directory, prefix)
+            try:
+                self.check_refresh(points_store)
+
+                # Another process maps the published points
+                window = SharedPointStore(self.dataset.pk, directory, prefix).window(self.days[0], self.days[-1])
+                self.assertEqual(len(window), 4)
+            finally:
+                points_store.clear()
+
+
+class TimelineTests(MapTestCase):
+    """
+    Clusters of every day of a range, in one request
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = Dataset.objects.get_default()
+        add_points(self.dataset, [(Point.POSITIVE, 50.85 + i/10000, 4.35, "Bruxelles", datetime.date(2021, 3, 9))
+                                  for i in range(6)])
+        add_points(self.dataset, [(Point.POSITIVE, 50.80 + i/10000, 4.30, "Anderlecht", datetime.date(2021, 3, 11))
+                                  for i in range(7)])
+        # Space distances are normalized by the largest one: a point far from the clusters every day
+        add_points(self.dataset, [(Point.POSITIVE, 50.90, 4.45, "Evere", datetime.date(2021, 3, day))
+                                  for day in range(9, 13)])
+
+    def test_days(self):
+        response = self.client.get("/api/clusters/timeline?start=2021-03-10&end=2021-03-12&window=1")
+        data = response.json()
+
+        self.assertEqual((data["start"], data["end"]), ("2021-03-10", "2021-03-12"))
+        self.assertEqual([day["date"] for day in data["days"]], ["2021-03-10", "2021-03-11", "2021-03-12"])
+        # Windows of 2 days: the cluster of the 9th, then the one of the 11th
+        self.assertEqual([day["numPoints"] for day in data["days"]], [[6], [7], [7]])
+        self.assertAlmostEqual(data["days"][0]["latitude"][0], 50.85025, places=5)
+        self.assertAlmostEqual(data["days"][1]["longitude"][0], 4.30, places=5)
+
+        # Same clusters as the view of each day
+        for day in data["days"]:
+            features = streamed_json(self.client.get(f"/api/clusters?date={day['date']}&window=1"))["features"]
+            self.assertEqual([feature["properties"]["numPoints"] for feature in features], day["numPoints"])
+
+    def test_invalid_range(self):
+        for query in ["start=2021-03-12&end=2021-03-10", "start=2021-03-10", "start=2021-03-10&end=2021-13-01",
+                      f"start=2021-01-01&end={datetime.date(2021, 1, 1) + datetime.timedelta(days=92)}"]:
+            self.assertEqual(self.client.get(f"/api/clusters/timeline?{query}").status_code, 400)
+
+
+class MetricsTests(MapTestCase):
+    """
+    Metrics in the Prometheus text format, and stages of the requests
+    """
+
+    # Sample line: name, optional labels, value
+    SAMPLE = re.compile(r'^([a-z_]+)(\{[a-z_]+="[^"]*"(,[a-z_]+="[^"]*")*\})? (\S+)$')
+
+    def samples(self, text):
+        """
+        Value of each sample of an exposition, checking the format of every line
+        """
+        samples = {}
+        for line in text.splitlines():
+            if line.startswith("# "):
+                self.assertRegex(line, r"^# (HELP [a-z_]+ .+|TYPE [a-z_]+ (counter|histogram))$")
+                continue
+            match = self.SAMPLE.match(line)
+            self.assertIsNotNone(match, line)
+            samples[match.group(1) + (match.group(2) or "")] = float(match.group(4))
+        return samples
+
+    def test_exposition(self):
+        registry = metrics.Registry()
+        registry.inc("stc_items_total", 3, kind="points")
+        registry.inc("stc_items_total", 2, kind="points")
+        for value in (0.003, 0.2, 20):
+            registry.observe("stc_stage_seconds", value, stage="dbscan")
+
+        text = registry.expose()
+        samples = self.samples(text)
+
+        for name, (kind, description) in metrics.METRICS.items():
+            self.assertIn(f"# TYPE {name} {kind}\n", text)
+        self.assertEqual(samples['stc_items_total{kind="points"}'], 5)
+
+        # Buckets are cumulative, the last one counts every observation
+        buckets = [samples[f'stc_stage_seconds_bucket{{stage="dbscan",le="{le}"}}']
+                   for le in ["0.001", "0.005", "0.5", "10", "+Inf"]]
+        self.assertEqual(buckets, [0, 1, 2, 2, 3])
+        self.assertEqual(samples['stc_stage_seconds_count{stage="dbscan"}'], 3)
+        self.assertAlmostEqual(samples['stc_stage_seconds_sum{stage="dbscan"}'], 20.203)
+
+    def test_stages(self):
+        day = datetime.date(2021, 3, 10)
+        add_points(Dataset.objects.get_default(), [(Point.POSITIVE, 50.85, 4.35, "Bruxelles", day),
+                                                   (Point.POSITIVE, 50.86, 4.36, "Bruxelles", day)])
+        before = self.samples(self.client.get("/metrics").content.decode())
+
+        with self.assertLogs("map.middleware", "INFO") as logs:
+            streamed_json(self.client.get("/api/clusters?date=2021-03-10"))
+
+        response = self.client.get("/metrics")
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        after = self.samples(response.content.decode())
+
+        def increase(sample):
+            return after.get(sample, 0) - before.get(sample, 0)
+
+        self.assertEqual(increase('stc_requests_total{status="200",view="api_clusters"}'), 1)
+        self.assertEqual(increase('stc_request_seconds_count{view="api_clusters"}'), 1)
+        for stage in ("transform_data", "haversine", "dbscan", "get_cluster_data", "stream"):
+            self.assertEqual(increase(f'stc_stage_seconds_count{{stage="{stage}"}}'), 1)
+
+        # The request is logged with its stages, once its stream is over
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("view=api_clusters status=200", logs.output[0])
+        self.assertIn("stage.dbscan=", logs.output[0])
+
+
+class HeatmapTests(MapTestCase):
+    """
+    Space-time density of the heat layer, and its tiles
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.bbox = (4.3, 50.8, 4.4, 50.9)
+        self.rows, self.cols = 8, 10
+        # (row, column, age in days) of the points, at the center of their cell
+        self.cells = [(0, 0, 0), (3, 4, 0), (3, 4, 2), (3, 5, 1), (7, 9, 5), (7, 9, 0)]
+
+    def columns(self, day):
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        return PointColumns([max_lat - (row + 0.5)*(max_lat - min_lat)/self.rows for row, col, age in self.cells],
+                            [min_lng + (col + 0.5)*(max_lng - min_lng)/self.cols for row, col, age in self.cells],
+                            [day - age for row, col, age in self.cells], [Point.POSITIVE]*len(self.cells))
+
+    def brute_force(self, kde):
+        """
+        Sum of the kernel exp(-d/bandwidth) of every point, on every cell
+        """
+        grid = np.zeros((self.rows, self.cols))
+        for row, col in np.ndindex(grid.shape):
+            for p_row, p_col, age in self.cells:
+                space = np.hypot((row - p_row)*kde.cell_lat, (col - p_col)*kde.cell_lng)
+                distance = kde.prop*space/kde.max_distance + (1 - kde.prop)*age/10
+                grid[row, col] += np.exp(-distance/kde.bandwidth)
+        return grid
+
+    def test_density(self):
+        day = 18700
+        for prop, bandwidth in [(0.98, 0.014), (0.5, 0.1)]:
+            # Kernel over the whole grid
+            kde = algorithms.SpaceTimeKDE(self.bbox, (self.rows, self.cols), prop, bandwidth, cutoff=1e-12)
+            expected = self.brute_force(kde)
+            np.testing.assert_allclose(kde.density(self.columns(day), day), expected, rtol=1e-6, atol=1e-9)
+
+            # Truncated kernel: each point misses at most cutoff of its weight on a cell
+            kde = algorithms.SpaceTimeKDE(self.bbox, (self.rows, self.cols), prop, bandwidth, cutoff=1e-3)
+            np.testing.assert_allclose(kde.density(self.columns(day), day), expected, atol=1e-3*len(self.cells))
+
+        # Points outside of the grid are not counted
+        kde = algorithms.SpaceTimeKDE(self.bbox, (self.rows, self.cols))
+        outside = PointColumns([51.5], [4.35], [day], [Point.POSITIVE])
+        np.testing.assert_array_equal(kde.density(outside, day), np.zeros((self.rows, self.cols)))
+
+    def test_tile_values(self):
+        grid = np.asarray([[1, 2], [3, 4]], dtype=np.float16)
+
+        # Pixels of the tile of zoom level 0 are split by the equator and the prime meridian
+        values = heatmap.tile_values(grid, (-180, -85, 180, 85), 0, 0, 0, 4)
+        np.testing.assert_array_equal(values, np.kron(grid, np.ones((2, 2))))
+
+        # Outside of the grid, values are 0
+        values = heatmap.tile_values(np.asarray([[7]], dtype=np.float16), (0, 0, 180, 85), 0, 0, 0, 4)
+        expected = np.zeros((4, 4))
+        expected[:2, 2:] = 7
+        np.testing.assert_array_equal(values, expected)
+
+
+class StatesTests(MapTestCase):
+    """
+    Points and clusters of the states given in the query string, positive cases by default
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = Dataset.objects.get_default()
+        self.day = datetime.date(2021, 3, 10)
+        # A group of negative tests, a group of positive cases, and one far point of each state
+        # (space distances are normalized by the largest one)
+        add_points(self.dataset, [(Point.NEGATIVE, 50.85 + i/10000, 4.35, "Bruxelles", self.day) for i in range(6)])
+        add_points(self.dataset, [(Point.POSITIVE, 50.80 + i/10000, 4.30, "Anderlecht", self.day) for i in range(6)])
+        add_points(self.dataset, [(state, 50.90, 4.45, "Evere", self.day) for state in Point.STATE_NAMES.values()])
+
+    def states(self, query):
+        features = streamed_json(self.client.get(f"/api/points?date={self.day}{query}"))["features"]
+        return sorted({feature["properties"]["state"] for feature in features})
+
+    def clusters(self, query):
+        features = streamed_json(self.client.get(f"/api/clusters?date={self.day}{query}"))["features"]
+        return sorted((round(feature["geometry"]["coordinates"][1], 2), feature["properties"]["numPoints"])
+                      for feature in features)
+
+    def test_points(self):
+        self.assertEqual(self.states(""), [Point.POSITIVE])
+        self.assertEqual(self.states("&states=positive,recovered"), [Point.POSITIVE, Point.RECOVERED])
+        self.assertEqual(self.states("&states=%20Negative"), [Point.NEGATIVE])
+        self.assertEqual(self.states("&states=all"), [Point.NEGATIVE, Point.POSITIVE, Point.RECOVERED, Point.UNKNOWN])
+
+        binary_points = binary.decode_points(self.client.get(f"/api/points?date={self.day}&states=negative",
+                                                             HTTP_ACCEPT=binary.CONTENT_TYPE).content)
+        self.assertEqual(set(binary_points[3].tolist()), {Point.NEGATIVE})
+
+    def test_clusters(self):
+        # Cached clusters of one set of states are not served for another
+        self.assertEqual(self.clusters(""), [(50.8, 6)])
+        self.assertEqual(self.clusters("&states=negative"), [(50.85, 6)])
+        self.assertEqual(self.clusters("&states=all"), [(50.8, 6), (50.85, 6)])
+        self.assertEqual(self.clusters(""), [(50.8, 6)])
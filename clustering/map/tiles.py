@@ -0,0 +1,82 @@
+import numpy as np
+
+
+def mercator(latitude, longitude):
+    """
+    Project coordinates on the Web Mercator plane, normalized to [0, 1)
+    (tile coordinates at zoom level 0)
+
+    Parameters
+    ----------
+        latitude : numpy array
+            latitudes of the points
+        longitude : numpy array
+            longitudes of the points
+
+    Returns
+    -------
+        x : numpy array
+            horizontal coordinates, from west to east
+        y : numpy array
+            vertical coordinates, from north to south
+    """
+    lat_rad = np.radians(latitude)
+    x = (longitude + 180)/360
+    y = (1 - np.log(np.tan(lat_rad) + 1/np.cos(lat_rad))/np.pi)/2
+    return x, y
+
+
+def tile_data(columns, z, x, y, grid_size, points_zoom):
+    """
+    Aggregate the points of a map tile.
+    Below points_zoom, points are counted in a grid_size x grid_size grid,
+    and each non-empty cell is returned with its count and the centroid of its points.
+    From points_zoom, the points themselves are returned.
+
+    Parameters
+    ----------
+        columns : PointColumns
+            points of the window
+        z : int
+            zoom level of the tile
+        x : int
+            column of the tile
+        y : int
+            row of the tile
+        grid_size : int
+            number of cells per tile side
+        points_zoom : int
+            first zoom level where raw points are returned
+
+    Returns
+    -------
+        data : dict
+            JSON serializable content of the tile
+    """
+    tile_x, tile_y = mercator(columns.latitude, columns.longitude)
+    tile_x *= 2**z
+    tile_y *= 2**z
+
+    in_tile = (tile_x >= x) & (tile_x < x + 1) & (tile_y >= y) & (tile_y < y + 1)
+    points = columns.take(in_tile)
+
+    if z >= points_zoom:
+        return {"type": "points",
+                "points": [[lat, lng, state, date] for lat, lng, state, date in
+                           zip(points.latitude.tolist(), points.longitude.tolist(),
+                               points.state.tolist(), points.dates().tolist())]}
+
+    # Cell of each point, from 0 to grid_size**2 - 1
+    col = np.minimum(((tile_x[in_tile] - x)*grid_size).astype(np.int64), grid_size - 1)
+    row = np.minimum(((tile_y[in_tile] - y)*grid_size).astype(np.int64), grid_size - 1)
+    cell = row*grid_size + col
+
+    counts = np.bincount(cell, minlength=grid_size**2)
+    lat_sums = np.bincount(cell, weights=points.latitude, minlength=grid_size**2)
+    lng_sums = np.bincount(cell, weights=points.longitude, minlength=grid_size**2)
+
+    cells = np.flatnonzero(counts)
+    return {"type": "grid",
+            "size": grid_size,
+            "cells": [[int(c % grid_size), int(c // grid_size), int(counts[c]),
+                       lat_sums[c]/counts[c], lng_sums[c]/counts[c]] for c in cells]}
@@ -0,0 +1,159 @@
+import io
+import numpy as np
+import pandas as pd
+from map.models import Point
+from map.algorithms.municipalities import MunicipalityLocator
+
+REQUIRED_COLUMNS = ["date", "lat", "lng"]
+
+STATES = sorted(state for state, name in Point.STATE_CHOICES)
+
+# Coordinates are stored with 5 decimals
+DECIMALS = 5
+
+
+class UploadError(ValueError):
+    """
+    The uploaded file can not be read at all
+    """
+
+
+def read_upload(data):
+    """
+    Read an uploaded CSV file, every value as a string
+
+    Parameters
+    ----------
+        data : bytes
+            content of the file, with a date,lat,lng[,state] header
+
+    Returns
+    -------
+        frame : DataFrame
+            rows of the file
+    """
+    try:
+        frame = pd.read_csv(io.BytesIO(data), dtype=str, keep_default_na=False, skipinitialspace=True)
+    except (ValueError, pd.errors.ParserError) as e:
+        raise UploadError(f"Invalid CSV file: {e}")
+
+    frame.columns = [column.strip().lower() for column in frame.columns]
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    if missing:
+        raise UploadError(f"Missing columns: {', '.join(missing)}")
+
+    return frame
+
+
+def validate(frame, dataset):
+    """
+    Check every row at once: dates, coordinate ranges, states, and duplicates
+    (in the file, and with the points of the dataset already in the database)
+
+    Parameters
+    ----------
+        frame : DataFrame
+            rows of the file, as returned by read_upload
+        dataset : int
+            id of the dataset of the points
+
+    Returns
+    -------
+        points : DataFrame
+            parsed date, lat, lng and state columns
+        errors : dict
+            list of error messages, indexed by row number (0 is the first row after the header)
+    """
+    points = pd.DataFrame({"date": pd.to_datetime(frame["date"], format="%Y-%m-%d", errors="coerce"),
+                           "lat": pd.to_numeric(frame["lat"], errors="coerce").round(DECIMALS),
+                           "lng": pd.to_numeric(frame["lng"], errors="coerce").round(DECIMALS)})
+
+    # States are floats (NaN when invalid), here and in existing_points, so that "1" and "1.0"
+    # both match the points in the database
+    if "state" in frame.columns:
+        states = frame["state"].replace("", str(Point.POSITIVE))
+        points["state"] = pd.to_numeric(states, errors="coerce").astype(float)
+    else:
+        points["state"] = float(Point.POSITIVE)
+
+    checks = [(points["date"].isna(), "date must be in YYYY-MM-DD format"),
+              (~points["lat"].between(-90, 90), "lat must be a number between -90 and 90"),
+              (~points["lng"].between(-180, 180), "lng must be a number between -180 and 180"),
+              (~points["state"].isin(STATES), f"state must be one of {', '.join(str(state) for state in STATES)}")]
+
+    invalid = np.zeros(len(points), dtype=bool)
+    for mask, message in checks:
+        invalid |= mask.to_numpy()
+
+    # Only valid rows can be duplicates
+    keys = ["date", "lat", "lng", "state"]
+    duplicated = points.duplicated(subset=keys) & ~invalid
+    checks.append((duplicated, "duplicate of a previous row"))
+
+    existing = existing_points(points[~invalid & ~duplicated.to_numpy()], dataset)
+    if len(existing) > 0:
+        merged = points.reset_index().merge(existing, on=keys, how="inner")
+        in_database = np.zeros(len(points), dtype=bool)
+        in_database[merged["index"].to_numpy()] = True
+        checks.append((pd.Series(in_database & ~invalid, index=points.index), "point already in the database"))
+
+    errors = {}
+    for mask, message in checks:
+        for row in np.flatnonzero(mask.to_numpy()):
+            errors.setdefault(int(row), []).append(message)
+
+    points["date"] = points["date"].dt.date
+    return points, errors
+
+
+def existing_points(points, dataset):
+    """
+    Points of the dataset on the dates of the given points
+    """
+    dates = set(points["date"].dt.date)
+    if not dates:
+        return pd.DataFrame(columns=["date", "lat", "lng", "state"])
+
+    rows = Point.objects.filter(dataset=dataset, date__in=dates).values_list('date', 'latitude', 'longitude', 'state')
+    existing = pd.DataFrame(list(rows), columns=["date", "lat", "lng", "state"])
+    existing["date"] = pd.to_datetime(existing["date"])
+    existing["lat"] = existing["lat"].astype(float).round(DECIMALS)
+    existing["lng"] = existing["lng"].astype(float).round(DECIMALS)
+    existing["state"] = existing["state"].astype(float)
+
+    return existing
+
+
+def insert_points(points, dataset, locator=None):
+    """
+    Insert valid points in one transaction, with their municipality found offline
+
+    Parameters
+    ----------
+        points : DataFrame
+            date, lat, lng and state of the points
+        dataset : Dataset
+            dataset of the points
+        locator : MunicipalityLocator, optional
+            locator of the municipalities of the dataset
+
+    Returns
+    -------
+        num_points : int
+            number of inserted points
+    """
+    if len(points) == 0:
+        return 0
+
+    if locator is None:
+        locator = MunicipalityLocator(dataset.municipality_data()[1])
+    municipalities = locator.locate(points["lat"].to_numpy(), points["lng"].to_numpy())
+
+    # Points are not geocoded: one request per second would take hours
+    rows = zip(points["state"].astype(int), points["lat"], points["lng"], ["Unknown"]*len(points),
+               municipalities, points["date"])
+
+    Point.objects.bulk_create_points(rows, dataset.pk)
+
+    return len(points)
+
@@ -38,4 +38,29 @@ urlpatterns = [
     # generate random points
     path('generate/', views.GeneratePointView.as_view(), name='generateView'),
     path('generate_new/', views.generate_points, name='generate'),
+
+    # data of given day, as GeoJSON
+    path('api/points', views.PointDataView.as_view(), name='api_points'),
+    path('api/points/upload', views.upload_points, name='api_points_upload'),
+    path('api/clusters', views.ClusterDataView.as_view(), name='api_clusters'),
+    path('api/clusters/timeline', views.ClusterTimelineView.as_view(), name='api_clusters_timeline'),
+
+    # significant space-time clusters of a date range
+    path('api/hotspots', views.hotspots, name='api_hotspots'),
+
+    # aggregated points of a map tile
+    path('tiles/<int:z>/<int:x>/<int:y>', views.TileView.as_view(), name='tiles'),
+
+    # density of the points of the window, as a heat layer
+    path('heatmap/<int:z>/<int:x>/<int:y>', views.HeatmapTileView.as_view(), name='heatmap'),
+
+    # export data of a date range, as CSV or Arrow
+    path('api/export/points', views.export_points, name='export_points'),
+    path('api/export/clusters', views.export_clusters, name='export_clusters'),
+
+    # metrics of the process, for Prometheus
+    path('metrics', views.metrics_view, name='metrics'),
+
+    # forecast number of cases
+    path('api/forecast', views.forecast, name='api_forecast'),
 ]
\ No newline at end of file
@@ -1,15 +1,130 @@
-from django.shortcuts import redirect
-from django.views.generic import TemplateView, CreateView
-from map.models import Point
+from django.views.generic import TemplateView, CreateView, View
+from map.models import Point, DataVersion, Dataset, default_states, parse_states, states_key
 from map.forms import PointFormCoord, PointFormAddr, GeneratePointsForm
-from map.algorithms.dbscan import DBSCANClustering
-import geopy as gp
 from random import randint
 import datetime
-from map.algorithms.generate_points import PointGenerator
-from geopy.extra.rate_limiter import RateLimiter
+from map import algorithms
+from map.datasets import get_dataset, dataset_context, dataset_redirect
+from map.generation import generate_range
+from map.geocoding import get_geolocator, get_municipality, rate_limited
 import csv
-from django.http import HttpResponse
+import hmac
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.http import HttpResponse, JsonResponse, HttpResponseBadRequest, StreamingHttpResponse
+from map.forecasts import get_forecasts
+from map.clusters import get_clusters_range
+from map import store
+from map.geojson import stream_points, stream_centroids
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from map import binary
+from map.tiles import tile_data
+from map import heatmap
+from map.hotspots import get_hotspots
+from django.core.cache import cache
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from map import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATES_ERROR = f"states must be a comma-separated list of {', '.join(Point.STATE_NAMES)}, or all"
+
+
+def get_window_date(request, kwargs):
+    """
+    Date requested from a map view: in the URL for pages, in the query string for APIs.
+    None if it is not valid
+    """
+    try:
+        if 'date' in kwargs:
+            return MapView().get_date(**kwargs)
+        return MapView().get_request_date(request)
+    except (ValueError, IndexError):
+        return None
+
+
+def valid_tile(z, x, y):
+    """
+    Check that a tile exists at a zoom level the map views serve
+    """
+    return 0 <= z <= settings.TILE_MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+def window_version(request, *args, **kwargs):
+    """
+    Version and last modification of the window requested from a map view.
+    Computed once per request, before any other query.
+    None if the request is not valid, so that error responses get no ETag
+    """
+    if not hasattr(request, 'window_version'):
+        request_date = get_window_date(request, kwargs)
+        try:
+            days = MapView().get_window_days(request)
+            MapView().get_bbox(request)
+            MapView().get_states(request)
+        except ValueError:
+            days = None
+
+        if 'z' in kwargs and not valid_tile(kwargs['z'], kwargs['x'], kwargs['y']):
+            request.window_version = None
+        elif request_date is None or days is None:
+            request.window_version = None
+        else:
+            request.window_version = DataVersion.objects.window_version(get_dataset(request).pk,
+                                                                        request_date - datetime.timedelta(days=days),
+                                                                        request_date)
+    return request.window_version
+
+
+def dataset_etag(request):
+    """
+    Part of the ETags that changes with the parameters of the dataset (clusters, initial view)
+    """
+    return f"{get_dataset(request).modified.timestamp():.6f}"
+
+
+def dataset_last_modified(request, modified):
+    """
+    Last modification of the points of a view or of the parameters of their dataset
+    """
+    return max(filter(None, [modified, get_dataset(request).modified]))
+
+
+def window_etag(request, *args, **kwargs):
+    """
+    ETag of a map view: the version of its window, the parameters of its dataset,
+    and the negotiated format (the rest of the request is in the URL)
+    """
+    version = window_version(request, *args, **kwargs)
+    if version is None:
+        return None
+
+    accept_binary = binary.CONTENT_TYPE in request.META.get('HTTP_ACCEPT', '')
+    return f"{version[0]}-{dataset_etag(request)}-{int(accept_binary)}"
+
+
+def window_last_modified(request, *args, **kwargs):
+    """
+    Last modification of the window of a map view, or of its dataset
+    """
+    version = window_version(request, *args, **kwargs)
+    if version is None:
+        return None
+    return dataset_last_modified(request, version[1])
+
+
+# Map views answer 304 Not Modified before any query on points or clustering,
+# if the window did not change since the client's last request.
+# APIs can be kept by shared caches; pages carry the CSRF token of their user, so only by the browser
+conditional_view = [condition(etag_func=window_etag, last_modified_func=window_last_modified),
+                    cache_control(public=True, max_age=0)]
+
+conditional_page = [condition(etag_func=window_etag, last_modified_func=window_last_modified),
+                    cache_control(private=True, max_age=0)]
 
 
 class AboutView(TemplateView):
@@ -30,16 +145,93 @@ class MapView(TemplateView):
 
     default_date = datetime.date(year=2021, month=1, day=1)  # default day is January first
 
-    def get_queryset(self, request_date=None):
+    def get_queryset(self, request_date=None, bbox=None, window=None, states=None):
         """ 
-        Get data from database. 
-        If request_date is specified, return only points of past 10 days
+        Get data of the dataset from database. 
+        If request_date is specified, return only points of past days (settings.WINDOW_DAYS by default).
+        If bbox is specified, return only points inside it.
+        If states is specified, return only points of these states
+        """
+        if window is None:
+            window = settings.WINDOW_DAYS
+
+        points = Point.objects.filter(dataset=self.get_dataset())
+        if request_date is not None:
+            points = points.filter(date__gte=request_date - datetime.timedelta(days=window),
+                                   date__lte=request_date)
+
+        if bbox is not None:
+            points = points.in_bbox(*bbox)
+
+        if states is not None:
+            points = points.with_states(states)
+
+        return points
+
+    def get_columns(self, request_date, bbox=None, window=None, states=None):
+        """
+        Get points of the past days as columns, from the in-memory point store
+        """
+        if window is None:
+            window = settings.WINDOW_DAYS
+
+        return store.get_window(self.get_dataset().pk, request_date, window, bbox, states)
+
+    def get_dataset(self):
+        """
+        Dataset of the request (see map/datasets.py)
+        """
+        return get_dataset(self.request)
+
+    def get_window_days(self, request):
+        """
+        Read the optional length of the window given in the query string (in days).
+        Raise ValueError if it is not valid
+        """
+        if 'window' not in request.GET:
+            return settings.WINDOW_DAYS
+
+        window = int(request.GET['window'])
+        if not 1 <= window <= settings.MAX_WINDOW_DAYS:
+            raise ValueError("Invalid window")
+
+        return window
+
+    def get_states(self, request):
+        """
+        Read the optional states of the points given in the query string
+        (see parse_states), settings.DEFAULT_STATES otherwise.
+        Raise ValueError if they are not valid
         """
-        if request_date is None:
-            return Point.objects.all()
+        if 'states' not in request.GET:
+            return default_states()
+
+        return parse_states(request.GET['states'])
+
+    def get_request_date(self, request):
+        """
+        Read the date given in the query string (YYYY-MM-DD), for the API views.
+        Raise ValueError if the date is not valid
+        """
+        if 'date' in request.GET:
+            return datetime.datetime.strptime(request.GET['date'], "%Y-%m-%d").date()
         else:
-            return Point.objects.filter(date__gte=request_date - datetime.timedelta(days=10),
-                                        date__lte=request_date)
+            return self.default_date
+
+    def get_bbox(self, request):
+        """
+        Read the optional bounding box given in the query string, as
+        "min_lng,min_lat,max_lng,max_lat" (the format of Leaflet's toBBoxString).
+        Raise ValueError if the box is not valid
+        """
+        if 'bbox' not in request.GET:
+            return None
+
+        bbox = [float(value) for value in request.GET['bbox'].split(',')]
+        if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+            raise ValueError("Invalid bounding box")
+
+        return bbox
 
     def get_date(self, **kwargs):
         """ 
@@ -58,6 +250,7 @@ class MapView(TemplateView):
             return self.default_date
 
 
+@method_decorator(conditional_page, name='dispatch')
 class PointView(MapView):
     """
     Display with all points
@@ -95,18 +288,200 @@ class PointView(MapView):
 
         request_date = self.get_date(**kwargs)
 
-        points = self.get_queryset(request_date)
+        try:
+            bbox = self.get_bbox(self.request)
+        except ValueError:
+            bbox = None
+
+        try:
+            window = self.get_window_days(self.request)
+        except ValueError:
+            window = None
+
+        try:
+            states = self.get_states(self.request)
+        except ValueError:
+            states = default_states()
+
+        points = self.get_queryset(request_date, bbox, window, states)
 
-        point_data_dict = self.format_point_data(points)
+        with metrics.timer("format"):
+            point_data_dict = self.format_point_data(points)
 
         data_dict["date"] = {"day": request_date.day, "month": request_date.month, "year": request_date.year}
         data_dict["mode"] = "point"
+        data_dict["dataset"] = dataset_context(self.get_dataset())
+        data_dict["states"] = self.request.GET.get('states')
         data_dict["point_data"] = point_data_dict
 
         return data_dict
 
 
-class ClusterView(MapView):
+@method_decorator(conditional_view, name='dispatch')
+class PointDataView(MapView):
+    """
+    Points of the past days for the date given in the query string.
+    As GeoJSON by default, or in the compact binary format of map/binary.py
+    if asked by the Accept header or with format=bin
+    """
+
+    def wants_binary(self, request):
+        """
+        Negotiate the format of the response
+        """
+        if 'format' in request.GET:
+            return request.GET['format'] == 'bin'
+        return binary.CONTENT_TYPE in request.META.get('HTTP_ACCEPT', '')
+
+    def get(self, request, *args, **kwargs):
+        try:
+            request_date = self.get_request_date(request)
+        except ValueError:
+            return HttpResponseBadRequest("date must be in YYYY-MM-DD format")
+
+        try:
+            bbox = self.get_bbox(request)
+        except ValueError:
+            return HttpResponseBadRequest("bbox must be min_lng,min_lat,max_lng,max_lat")
+
+        try:
+            window = self.get_window_days(request)
+        except ValueError:
+            return HttpResponseBadRequest(f"window must be a number of days between 1 and {settings.MAX_WINDOW_DAYS}")
+
+        try:
+            states = self.get_states(request)
+        except ValueError:
+            return HttpResponseBadRequest(STATES_ERROR)
+
+        columns = self.get_columns(request_date, bbox, window, states)
+        metrics.count("points", len(columns))
+
+        if self.wants_binary(request):
+            with metrics.timer("format"):
+                response = HttpResponse(binary.encode_points(columns), content_type=binary.CONTENT_TYPE)
+        else:
+            response = StreamingHttpResponse(stream_points(columns), content_type='application/geo+json')
+
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+@method_decorator(conditional_view, name='dispatch')
+class TileView(MapView):
+    """
+    Aggregated points of one map tile, for the date given in the query string.
+    Points are counted in a grid at low zoom, and sent one by one at high zoom
+    """
+
+    def get(self, request, z, x, y, *args, **kwargs):
+        try:
+            request_date = self.get_request_date(request)
+        except ValueError:
+            return HttpResponseBadRequest("date must be in YYYY-MM-DD format")
+
+        if not valid_tile(z, x, y):
+            return HttpResponseBadRequest("Invalid tile")
+
+        try:
+            window = self.get_window_days(request)
+        except ValueError:
+            return HttpResponseBadRequest(f"window must be a number of days between 1 and {settings.MAX_WINDOW_DAYS}")
+
+        try:
+            states = self.get_states(request)
+        except ValueError:
+            return HttpResponseBadRequest(STATES_ERROR)
+
+        version = window_version(request, *args, **kwargs)[0]
+        key = f"tile:{self.get_dataset().pk}:{request_date}:{window}:{version}:{states_key(states)}:{z}:{x}:{y}"
+        data = cache.get(key)
+        metrics.cache_lookup("tiles", int(data is not None), int(data is None))
+        if data is None:
+            data = tile_data(self.get_columns(request_date, window=window, states=states), z, x, y,
+                             settings.TILE_GRID_SIZE, settings.TILE_POINTS_ZOOM)
+            cache.set(key, data, settings.TILE_CACHE_TIMEOUT)
+
+        return JsonResponse(data)
+
+
+@method_decorator(conditional_view, name='dispatch')
+class HeatmapTileView(MapView):
+    """
+    Heat layer of one map tile, for the date given in the query string:
+    the density grid of the window, cut to the tile, as a PNG image
+    or as float16 values with format=array
+    """
+
+    def get(self, request, z, x, y, *args, **kwargs):
+        try:
+            request_date = self.get_request_date(request)
+        except ValueError:
+            return HttpResponseBadRequest("date must be in YYYY-MM-DD format")
+
+        if not valid_tile(z, x, y):
+            return HttpResponseBadRequest("Invalid tile")
+
+        try:
+            window = self.get_window_days(request)
+        except ValueError:
+            return HttpResponseBadRequest(f"window must be a number of days between 1 and {settings.MAX_WINDOW_DAYS}")
+
+        try:
+            states = self.get_states(request)
+        except ValueError:
+            return HttpResponseBadRequest(STATES_ERROR)
+
+        version = window_version(request, *args, **kwargs)[0]
+        dataset = self.get_dataset()
+        grid = heatmap.get_grid(dataset, request_date, window, version, states)
+
+        with metrics.timer("format"):
+            values = heatmap.tile_values(grid, heatmap.get_bbox(dataset), z, x, y, settings.HEATMAP_TILE_SIZE)
+            scale = float(grid.max())
+
+            if request.GET.get('format') == 'array':
+                response = HttpResponse(values.astype('<f2').tobytes(), content_type='application/octet-stream')
+            else:
+                response = HttpResponse(heatmap.encode_png(heatmap.colorize(values, scale)),
+                                        content_type='image/png')
+
+        # Maximum of the whole grid, so that tiles of the same date share their colors
+        response['X-Heatmap-Scale'] = repr(scale)
+        return response
+
+
+class ClusterMapView(MapView):
+    """
+    Clusters of the past days. Mother class for ClusterView and ClusterDataView,
+    so that each of them is decorated once, with its own cache headers
+    """
+
+    def get_window_clusters(self, request_date, bbox=None, window=None, states=None):
+        """
+        Clusters of the past days. Clusters are computed on the whole map, shared
+        with the timeline, and cached per window version and states. With a bounding box,
+        only the clusters whose centroid is inside are kept, so that they do not change
+        with the zoom level or the position of the map
+        """
+        if states is None:
+            states = default_states()
+
+        centroids, num_points, sizes = get_clusters_range(self.get_dataset(), request_date, request_date,
+                                                          window=window, states=states)[request_date]
+
+        if bbox is not None:
+            min_lng, min_lat, max_lng, max_lat = bbox
+            inside = [min_lat <= centroid[0] <= max_lat and min_lng <= centroid[1] <= max_lng
+                      for centroid in centroids]
+            centroids, num_points, sizes = ([value for value, keep in zip(values, inside) if keep]
+                                            for values in (centroids, num_points, sizes))
+
+        return centroids, num_points, sizes
+
+
+@method_decorator(conditional_page, name='dispatch')
+class ClusterView(ClusterMapView):
     """ 
     Display points with cluster colors, and centroids
     """
@@ -141,28 +516,153 @@ class ClusterView(MapView):
 
         request_date = self.get_date(**kwargs)
 
-        points = self.get_queryset(request_date)
+        try:
+            bbox = self.get_bbox(self.request)
+        except ValueError:
+            bbox = None
 
-        if len(points) == 0:  # Can't cluster if there are no points
-            point_clusters, centroids = [], []
-            num_points, sizes = [], []
-        else:
+        try:
+            window = self.get_window_days(self.request)
+        except ValueError:
+            window = None
 
-            DBSCAN = DBSCANClustering(points)
+        try:
+            states = self.get_states(self.request)
+        except ValueError:
+            states = default_states()
 
-            centroids, num_points, sizes = DBSCAN.compute_clusters()
-
-            print(centroids)
-            print(num_points)
-            print(sizes)
+        centroids, num_points, sizes = self.get_window_clusters(request_date, bbox, window, states)
 
         data_dict["date"] = {"day": request_date.day, "month": request_date.month, "year": request_date.year}
         data_dict["mode"] = "cluster"
-        data_dict["centroids"] = self.format_centroids(centroids, num_points, sizes)
+        data_dict["dataset"] = dataset_context(self.get_dataset())
+        data_dict["states"] = self.request.GET.get('states')
+        with metrics.timer("format"):
+            data_dict["centroids"] = self.format_centroids(centroids, num_points, sizes)
 
         return data_dict
 
 
+@method_decorator(conditional_view, name='dispatch')
+class ClusterDataView(ClusterMapView):
+    """
+    Clusters of the past days as GeoJSON, for the date given in the query string
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            request_date = self.get_request_date(request)
+        except ValueError:
+            return HttpResponseBadRequest("date must be in YYYY-MM-DD format")
+
+        try:
+            bbox = self.get_bbox(request)
+        except ValueError:
+            return HttpResponseBadRequest("bbox must be min_lng,min_lat,max_lng,max_lat")
+
+        try:
+            window = self.get_window_days(request)
+        except ValueError:
+            return HttpResponseBadRequest(f"window must be a number of days between 1 and {settings.MAX_WINDOW_DAYS}")
+
+        try:
+            states = self.get_states(request)
+        except ValueError:
+            return HttpResponseBadRequest(STATES_ERROR)
+
+        centroids, num_points, sizes = self.get_window_clusters(request_date, bbox, window, states)
+
+        return StreamingHttpResponse(stream_centroids(centroids, num_points, sizes),
+                                     content_type='application/geo+json')
+
+
+def get_date_range(request, max_days=None):
+    """
+    First and last days given in the query string (YYYY-MM-DD), at most max_days apart.
+    Raise KeyError if they are missing, ValueError if they are not valid
+    """
+    start = datetime.datetime.strptime(request.GET['start'], "%Y-%m-%d").date()
+    end = datetime.datetime.strptime(request.GET['end'], "%Y-%m-%d").date()
+
+    if end < start or (max_days is not None and (end - start).days >= max_days):
+        raise ValueError("Invalid range")
+
+    return start, end
+
+
+def timeline_version(request, *args, **kwargs):
+    """
+    Version and last modification of every window of the timeline.
+    None if the request is not valid, so that error responses get no ETag
+    """
+    if not hasattr(request, 'window_version'):
+        try:
+            start, end = get_date_range(request, settings.TIMELINE_MAX_DAYS)
+            days = MapView().get_window_days(request)
+            MapView().get_states(request)
+        except (KeyError, ValueError):
+            request.window_version = None
+        else:
+            request.window_version = DataVersion.objects.window_version(get_dataset(request).pk,
+                                                                        start - datetime.timedelta(days=days), end)
+    return request.window_version
+
+
+def timeline_etag(request, *args, **kwargs):
+    version = timeline_version(request, *args, **kwargs)
+    if version is None:
+        return None
+    return f"{version[0]}-{dataset_etag(request)}"
+
+
+def timeline_last_modified(request, *args, **kwargs):
+    version = timeline_version(request, *args, **kwargs)
+    if version is None:
+        return None
+    return dataset_last_modified(request, version[1])
+
+
+@method_decorator([condition(etag_func=timeline_etag, last_modified_func=timeline_last_modified),
+                   cache_control(public=True, max_age=0)], name='dispatch')
+class ClusterTimelineView(View):
+    """
+    Clusters of every day between start and end (included), given in the query string.
+    Days are clustered in one batch: points are read once, days already in the
+    cache are reused, and the others are clustered in parallel.
+    Each day is a compact set of columns instead of a GeoJSON document
+    """
+
+    def get(self, request, *args, **kwargs):
+        try:
+            start, end = get_date_range(request, settings.TIMELINE_MAX_DAYS)
+        except (KeyError, ValueError):
+            return HttpResponseBadRequest(f"start and end must be in YYYY-MM-DD format, "
+                                          f"at most {settings.TIMELINE_MAX_DAYS} days apart")
+
+        try:
+            window = MapView().get_window_days(request)
+        except ValueError:
+            return HttpResponseBadRequest(f"window must be a number of days between 1 and {settings.MAX_WINDOW_DAYS}")
+
+        try:
+            states = MapView().get_states(request)
+        except ValueError:
+            return HttpResponseBadRequest(STATES_ERROR)
+
+        clusters = get_clusters_range(get_dataset(request), start, end, settings.CLUSTER_WORKERS, window, states)
+
+        days = []
+        for day in sorted(clusters):
+            centroids, num_points, sizes = clusters[day]
+            days.append({"date": str(day),
+                         "latitude": [centroid[0] for centroid in centroids],
+                         "longitude": [centroid[1] for centroid in centroids],
+                         "numPoints": num_points,
+                         "size": sizes})
+
+        return JsonResponse({"start": str(start), "end": str(end), "days": days})
+
+
 class PointCoordCreateView(CreateView):
     """ 
     Create a new point in the dataset, with given coordinates
@@ -172,6 +672,9 @@ class PointCoordCreateView(CreateView):
     form_class = PointFormCoord
     model = Point
 
+    def get_initial(self):
+        return {'dataset': get_dataset(self.request).slug}
+
     def form_valid(self, form):
         """
         Verify form and save object
@@ -182,24 +685,17 @@ class PointCoordCreateView(CreateView):
         lng = self.object.longitude
 
         # Use Geocoding to find address
-        geolocator = gp.Nominatim(user_agent='CovidClusteringLocator')
+        geolocator = get_geolocator()
 
         address = geolocator.reverse(str(lat) + ", " + str(lng))
         self.object.address = address.address
-        raw_dict = address.raw
 
         # Try to find the name of the municipality in the address
-        possible_names = ["town", "village", "municipality"]
-        for name in possible_names:
-            if name in raw_dict["address"]:
-                self.object.municipality = raw_dict["address"][name]
-                break
-        else:
-            self.object.municipality = "Unknown"
+        self.object.municipality = get_municipality(address.raw)
 
         self.object.save()
 
-        return redirect('map_clusters')
+        return dataset_redirect('map_clusters', self.object.dataset)
 
 
 class PointAddrCreateView(CreateView):
@@ -211,6 +707,9 @@ class PointAddrCreateView(CreateView):
     form_class = PointFormAddr
     model = Point
 
+    def get_initial(self):
+        return {'dataset': get_dataset(self.request).slug}
+
     def form_valid(self, form):
         """
         Verify form and save object
@@ -220,18 +719,18 @@ class PointAddrCreateView(CreateView):
         addr = self.object.address
 
         # Use Geocoding to find coordinates
-        geolocator = gp.Nominatim(user_agent='CovidClusteringLocator')
+        geolocator = get_geolocator()
 
         coords = geolocator.geocode(addr)
         self.object.latitude = coords.latitude
         self.object.longitude = coords.longitude
 
         raw_dict = geolocator.reverse(str(coords.latitude) + ", " + str(coords.longitude)).raw
-        self.object.municipality = raw_dict["address"]["town"]
+        self.object.municipality = get_municipality(raw_dict)
 
         self.object.save()
 
-        return redirect('map_clusters')
+        return dataset_redirect('map_clusters', self.object.dataset)
 
 
 class GeneratePointView(TemplateView):
@@ -242,12 +741,21 @@ class GeneratePointView(TemplateView):
     redirect_field_name = 'map/map_clusters.html'
     model = Point
 
+    def get_context_data(self, **kwargs):
+        data_dict = super().get_context_data(**kwargs)
+        data_dict["datasets"] = Dataset.objects.order_by('name')
+        data_dict["dataset"] = get_dataset(self.request)
+        return data_dict
+
 
 def generate_points(request):
     """
     Use the PointGenerator to generate points on a given day,
-    using available data
+    using available data of the dataset.
+    If an end date is given, generate every day of the range at once
     """
+    dataset = get_dataset(request)
+
     if request.method == "POST":
 
         # Get date
@@ -255,14 +763,27 @@ def generate_points(request):
 
         date_lst = date_str.split("-")
         date = datetime.date(year=int(date_lst[0]), month=int(date_lst[1]), day=int(date_lst[2]))
-        print(date)
+        logger.debug("generate date=%s", date)
+
+        end_str = request.POST.get('end_date')
+        if end_str:
+            end_lst = end_str.split("-")
+            end = datetime.date(year=int(end_lst[0]), month=int(end_lst[1]), day=int(end_lst[2]))
+
+            seed_str = request.POST.get('seed')
+            seed = int(seed_str) if seed_str else randint(0, 2**32 - 1)
+
+            generate_range(dataset, date, end, seed, window=settings.WINDOW_DAYS)
+
+            return dataset_redirect('generateView', dataset)
 
-        # Get points of the past 10 days
-        past_points = Point.objects.filter(date__gte=date - datetime.timedelta(days=10),
+        # Get points of the past days
+        past_points = Point.objects.filter(dataset=dataset,
+                                           date__gte=date - datetime.timedelta(days=settings.WINDOW_DAYS),
                                            date__lte=date)
 
         # Generate points
-        pg = PointGenerator(past_points, date)
+        pg = algorithms.PointGenerator(past_points, date, data=dataset.municipality_data())
         new_points = pg.generate()
 
         # Add points to database
@@ -271,14 +792,194 @@ def generate_points(request):
             lng = point[0][1]
             municipality = point[1]
 
-            geolocator = gp.Nominatim(user_agent='CovidClusteringLocator')
+            geolocator = get_geolocator()
 
             # Use a rate limiter so as not to overflow the geocoding server
-            reverse_geocoder = RateLimiter(geolocator.reverse, min_delay_seconds=1)
+            reverse_geocoder = rate_limited(geolocator.reverse)
 
             address = reverse_geocoder(str(lat) + ", " + str(lng)).address
 
-            p = Point.objects.create_point(1, lat, lng, address, municipality, date)
+            p = Point.objects.create_point(1, lat, lng, address, municipality, date, dataset.pk)
             p.save()
 
-    return redirect('generateView')
+    return dataset_redirect('generateView', dataset)
+
+
+def has_upload_token(request):
+    """
+    Whether the request carries one of settings.UPLOAD_TOKENS, in an "Authorization: Token <token>" header
+    """
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return (scheme.lower() == 'token'
+            and any(hmac.compare_digest(token.strip().encode(), allowed.encode()) for allowed in settings.UPLOAD_TOKENS))
+
+
+# Clients authenticate with a token instead of a session, so there is no CSRF to protect against
+@csrf_exempt
+@require_POST
+def upload_points(request):
+    """
+    Add many points to a dataset at once, from a CSV file with a date,lat,lng[,state] header,
+    sent as the "file" field of a form or as the body of the request.
+    Valid rows are inserted, invalid rows are reported with their errors.
+    Only clients with an upload token can upload points
+    """
+    if not has_upload_token(request):
+        response = HttpResponse("An upload token is required", status=401)
+        response['WWW-Authenticate'] = 'Token'
+        return response
+
+    # pandas is only loaded by the views that need it
+    from map import upload
+
+    data = request.FILES['file'].read() if 'file' in request.FILES else request.body
+
+    try:
+        frame = upload.read_upload(data)
+    except upload.UploadError as e:
+        return HttpResponseBadRequest(str(e))
+
+    if len(frame) > settings.UPLOAD_MAX_ROWS:
+        return HttpResponseBadRequest(f"At most {settings.UPLOAD_MAX_ROWS} rows can be uploaded at once")
+
+    dataset = get_dataset(request)
+    points, errors = upload.validate(frame, dataset.pk)
+    valid = [row not in errors for row in range(len(points))]
+    num_points = upload.insert_points(points[valid], dataset)
+
+    # Row numbers are line numbers in the file, the header being line 1
+    return JsonResponse({"inserted": num_points,
+                         "rejected": len(errors),
+                         "errors": [{"line": row + 2, "errors": messages} for row, messages in sorted(errors.items())]})
+
+
+def metrics_view(request):
+    """
+    Metrics of this process, in the Prometheus text format
+    """
+    return HttpResponse(metrics.registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def forecast(request):
+    """
+    Forecast the number of cases per day, for each municipality and for
+    the whole city ("total"). Models are fitted once per data version.
+    """
+    try:
+        days = int(request.GET.get('days', 14))
+    except ValueError:
+        return HttpResponseBadRequest("days must be an integer")
+
+    if not 1 <= days <= settings.FORECAST_MAX_DAYS:
+        return HttpResponseBadRequest(f"days must be between 1 and {settings.FORECAST_MAX_DAYS}")
+
+    forecasts, first_date, version = get_forecasts(get_dataset(request), days)
+
+    municipality = request.GET.get('municipality')
+    if municipality is not None:
+        if municipality not in forecasts:
+            return HttpResponseBadRequest("Unknown municipality")
+        forecasts = {municipality: forecasts[municipality]}
+
+    return JsonResponse({"version": version,
+                         "start": str(first_date) if first_date else None,
+                         "forecasts": {name: [float(value) for value in values]
+                                       for name, values in forecasts.items()}})
+
+
+def hotspots(request):
+    """
+    Space-time clusters of the cases between start and end (included), given in the query string,
+    with their significance against the official figures per municipality.
+    With prospective=1, only clusters still going on at the end of the range are looked for
+    """
+    try:
+        start, end = get_date_range(request, settings.HOTSPOT_MAX_RANGE)
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest(f"start and end must be in YYYY-MM-DD format, "
+                                      f"at most {settings.HOTSPOT_MAX_RANGE} days apart")
+
+    prospective = request.GET.get('prospective') == '1'
+
+    try:
+        states = MapView().get_states(request)
+    except ValueError:
+        return HttpResponseBadRequest(STATES_ERROR)
+
+    try:
+        clusters = get_hotspots(get_dataset(request), start, end, settings.HOTSPOT_REPLICATES,
+                                settings.HOTSPOT_WORKERS, prospective, states=states)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    return JsonResponse({"start": str(start), "end": str(end), "prospective": prospective,
+                         "replicates": settings.HOTSPOT_REPLICATES, "hotspots": clusters})
+
+
+def export_response(request, name, header, schema, rows):
+    """
+    Stream rows as CSV, or as an Arrow IPC stream with format=arrow
+    """
+    from map import export
+
+    if request.GET.get('format', 'csv') == 'arrow':
+        if export.pa is None:
+            return HttpResponseBadRequest("pyarrow is required for the arrow format")
+        response = StreamingHttpResponse(export.stream_arrow(schema, rows),
+                                         content_type='application/vnd.apache.arrow.stream')
+        response['Content-Disposition'] = f'attachment; filename="{name}.arrows"'
+    else:
+        response = StreamingHttpResponse(export.stream_csv(header, rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{name}.csv"'
+
+    return response
+
+
+def export_points(request):
+    """
+    Export the points between start and end (included), without loading them all in memory
+    """
+    # pyarrow is only loaded by the export views
+    from map import export
+
+    try:
+        start, end = get_date_range(request)
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest("start and end must be in YYYY-MM-DD format")
+
+    try:
+        states = MapView().get_states(request)
+    except ValueError:
+        return HttpResponseBadRequest(STATES_ERROR)
+
+    return export_response(request, f"points-{start}-{end}", export.POINT_FIELDS,
+                           export.POINT_SCHEMA, export.point_rows(get_dataset(request), start, end, states))
+
+
+def export_clusters(request):
+    """
+    Export the clusters of every day between start and end (included), one row per cluster
+    """
+    from map import export
+
+    try:
+        start, end = get_date_range(request, settings.EXPORT_CLUSTERS_MAX_DAYS)
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest(f"start and end must be in YYYY-MM-DD format, "
+                                      f"at most {settings.EXPORT_CLUSTERS_MAX_DAYS} days apart "
+                                      f"(use the export_data command for longer ranges)")
+
+    try:
+        window = MapView().get_window_days(request)
+    except ValueError:
+        return HttpResponseBadRequest(f"window must be a number of days between 1 and {settings.MAX_WINDOW_DAYS}")
+
+    try:
+        states = MapView().get_states(request)
+    except ValueError:
+        return HttpResponseBadRequest(STATES_ERROR)
+
+    return export_response(request, f"clusters-{start}-{end}", export.CLUSTER_FIELDS,
+                           export.CLUSTER_SCHEMA,
+                           export.cluster_rows(get_dataset(request), start, end, window, settings.CLUSTER_WORKERS,
+                                               states))